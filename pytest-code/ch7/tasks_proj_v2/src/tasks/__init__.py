@@ -1,18 +1,70 @@
-"""Minimal Project Task Management."""
-
-from .api import (  # noqa: F401
-    Task,
-    TasksException,
-    add,
-    get,
-    list_tasks,
-    count,
-    update,
-    delete,
-    delete_all,
-    unique_id,
-    start_tasks_db,
-    stop_tasks_db
-)
+"""Minimal Project Task Management.
+
+The API is imported the first time one of its names is used, so
+``import tasks``, and ``tasks --help`` with it, stay cheap. Before
+Python 3.7 modules can't have a __getattr__, there it is imported
+with the package.
+"""
+
+import sys
 
 __version__ = '0.1.1'
+
+# name -> submodule it comes from
+_EXPORTS = dict.fromkeys([
+    'Task',
+    'Changes',
+    'TasksException',
+    'TasksClient',
+    'add',
+    'add_many',
+    'get',
+    'list_tasks',
+    'iter_tasks',
+    'query',
+    'search',
+    'changes_since',
+    'count',
+    'stats',
+    'check_counts',
+    'update',
+    'update_many',
+    'delete',
+    'delete_many',
+    'delete_all',
+    'unique_id',
+    'reserve_ids',
+    'batch',
+    'flush',
+    'export_snapshot',
+    'export_stream',
+    'import_stream',
+    'start_tasks_db',
+    'stop_tasks_db'], 'api')
+_EXPORTS['Where'] = 'planner'
+_EXPORTS['TaskTable'] = 'table'
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    """Import name from its submodule on first use."""
+    try:
+        module = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    # __import__ rather than importlib, so -X importtime reports it
+    module = __import__(__name__ + '.' + module, fromlist=[name])
+    value = getattr(module, name)
+    globals()[name] = value  # later lookups don't come back here
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+if sys.version_info < (3, 7):
+    for _name in _EXPORTS:
+        __getattr__(_name)
@@ -0,0 +1,159 @@
+"""Coroutine versions of the tasks API, for asyncio programs.
+
+Each call runs the matching tasks.api function in a bounded thread
+pool, so file and network I/O never block the event loop.
+
+    await tasks.aio.start_tasks_db(db_path, 'tiny')
+    task_id = await tasks.aio.add(Task('do something'))
+    found = await tasks.aio.get_many([1, 2, 3])
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from tasks import api
+
+_MAX_WORKERS = 4
+
+_executor = None
+
+
+async def start_tasks_db(db_path, db_type, max_workers=_MAX_WORKERS,
+                         **db_options):
+    # type: (str, str, int, ...) -> None
+    """Connect to a db, see tasks.start_tasks_db().
+
+    Up to max_workers db calls run at once.
+    """
+    _stop_executor()
+    _start_executor(max_workers)
+    await _run(api.start_tasks_db, db_path, db_type, **db_options)
+
+
+async def stop_tasks_db():  # type: () -> None
+    """Disconnect from the db and stop the thread pool."""
+    await _run(api.stop_tasks_db)
+    _stop_executor()
+
+
+async def add(task):  # type: (Task) -> int
+    """Add a task (a Task object) to the tasks database."""
+    return await _run(api.add, task)
+
+
+async def add_many(task_list):  # type: (iterable of Task) -> list of int
+    """Add many tasks at once, see tasks.add_many()."""
+    return await _run(api.add_many, task_list)
+
+
+async def get(task_id):  # type: (int) -> Task
+    """Return a Task object with matching task_id."""
+    return await _run(api.get, task_id)
+
+
+async def get_many(task_ids):  # type: (iterable of int) -> list of Task
+    """Return the Tasks with task_ids, fetched concurrently."""
+    return list(await asyncio.gather(*(get(i) for i in task_ids)))
+
+
+async def list_tasks(owner=None, as_table=False):
+    # type: (str|None, bool) -> list of Task | TaskTable
+    """Return a list of Task objects, see tasks.list_tasks()."""
+    return await _run(api.list_tasks, owner, as_table)
+
+
+async def query(where=None, limit=None, offset=0, **fields):
+    # type: (Where|None, int|None, int, ...) -> list of Task
+    """Return the matching Task objects as a list, see tasks.query()."""
+    task_query = api.query(where, limit, offset, **fields)
+    return await _run(task_query.all)
+
+
+async def search(text, owner=None, limit=None):
+    # type: (str, str|None, int|None) -> list of Task
+    """Return tasks matching every word in text, see tasks.search()."""
+    return await _run(api.search, text, owner, limit)
+
+
+async def changes_since(version=0):  # type: (int) -> Changes
+    """Return what changed after version, see tasks.changes_since()."""
+    return await _run(api.changes_since, version)
+
+
+async def count(owner=None, done=None):  # type: (str|None, bool|None) -> int
+    """Return the number of tasks in db, see tasks.count()."""
+    return await _run(api.count, owner, done)
+
+
+async def stats():  # type: () -> dict
+    """Return task counts for every owner, see tasks.stats()."""
+    return await _run(api.stats)
+
+
+async def update(task_id, task):  # type: (int, Task) -> None
+    """Modify task in db with given task_id."""
+    await _run(api.update, task_id, task)
+
+
+async def update_many(ids_or_filter, changes):
+    # type: (Where|iterable of int, dict) -> int
+    """Change fields of many tasks, see tasks.update_many()."""
+    return await _run(api.update_many, ids_or_filter, changes)
+
+
+async def delete(task_id):  # type: (int) -> None
+    """Remove a task from db with given task_id."""
+    await _run(api.delete, task_id)
+
+
+async def delete_many(ids_or_filter):  # type: (Where|iterable of int) -> int
+    """Remove many tasks, see tasks.delete_many()."""
+    return await _run(api.delete_many, ids_or_filter)
+
+
+async def delete_all():  # type: () -> None
+    """Remove all tasks from db."""
+    await _run(api.delete_all)
+
+
+async def unique_id():  # type: () -> int
+    """Return an integer that does not exist in the db."""
+    return await _run(api.unique_id)
+
+
+async def reserve_ids(n):  # type: (int) -> list of int
+    """Reserve n consecutive ids, see tasks.reserve_ids()."""
+    return await _run(api.reserve_ids, n)
+
+
+async def flush():  # type: () -> None
+    """Write any changes the db is still holding in memory."""
+    await _run(api.flush)
+
+
+def _start_executor(max_workers):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers)
+    return _executor
+
+
+def _stop_executor():
+    # doesn't wait for the threads to finish, that would block the loop;
+    # calls already handed to the pool still run
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _run(func, *args, **kwargs):
+    """Return a future for func(*args, **kwargs) run in the pool.
+
+    tasks.api locks around the db, so calls are safe to run at once.
+    """
+    # the pool starts on first use, so tasks.start_tasks_db() works too
+    executor = _start_executor(_MAX_WORKERS)
+    call = functools.partial(func, *args, **kwargs)
+    return asyncio.get_event_loop().run_in_executor(executor, call)
@@ -1,13 +1,24 @@
 """Main API for tasks project."""
 
 from collections import namedtuple
+from contextlib import contextmanager
 from six import string_types
 
+from tasks import planner, textindex
+from tasks.planner import Where
+from tasks.rwlock import ReadWriteLock
+
 
 # Task element types : [summary: str, owner: str, done: bool, id: int]
 Task = namedtuple('Task', ['summary', 'owner', 'done', 'id'])
 Task.__new__.__defaults__ = (None, None, False, None)
 
+# What changes_since() returns: the Tasks added or changed, the ids
+# deleted, the db version to ask from next time, and whether tasks is
+# every task, to start over with.
+Changes = namedtuple('Changes', ['tasks', 'deleted', 'version', 'resync'])
+Changes.__new__.__defaults__ = (False,)
+
 
 # custom exceptions
 class TasksException(Exception):
@@ -20,6 +31,609 @@ class UninitializedDatabase(TasksException):
 
 def add(task):  # type: (Task) -> int
     """Add a task (a Task object) to the tasks database."""
+    return _client.add(task)
+
+
+def add_many(task_list):  # type: (iterable of Task) -> list of int
+    """Add several Task objects to the db, return their ids in order.
+
+    The whole batch is validated before anything is written,
+    so a bad task leaves the db untouched.
+    """
+    return _client.add_many(task_list)
+
+
+def get(task_id):  # type: (int) -> Task
+    """Return a Task object with matching task_id."""
+    return _client.get(task_id)
+
+
+def list_tasks(owner=None, as_table=False):
+    # type: (str|None, bool) -> list of Task | TaskTable
+    """Return a list of Task objects.
+
+    With as_table=True, return a tasks.TaskTable instead, which stores
+    the tasks column by column and makes no Task objects up front.
+    """
+    return _client.list_tasks(owner, as_table)
+
+
+def iter_tasks(owner=None, page_size=100, after_id=None):
+    # type: (str|None, int, int|None) -> TaskCursor
+    """Return a TaskCursor yielding Task objects in id order.
+
+    Tasks are read from the db page_size at a time, so only one page
+    is in memory. Only tasks with an id above after_id are returned,
+    pass a cursor's after_id to pick up where it left off.
+    """
+    return _client.iter_tasks(owner, page_size, after_id)
+
+
+def query(where=None, limit=None, offset=0, **fields):
+    # type: (Where|None, int|None, int, ...) -> TaskQuery
+    """Return a TaskQuery for the tasks matching where and fields.
+
+    fields are tasks.Where() arguments, and narrow where further:
+
+        tasks.query(owner='brian', done=False, limit=10)
+        tasks.query(tasks.Where(summary_prefix='Fix') &
+                    tasks.Where(max_id=100))
+
+    Iterate the TaskQuery for Task objects in id order, offset matches
+    skipped and at most limit returned. Its explain() shows how the db
+    will find them.
+    """
+    return _client.query(where, limit, offset, **fields)
+
+
+def search(text, owner=None, limit=None):
+    # type: (str, str|None, int|None) -> list of Task
+    """Return Task objects whose summaries have every word in text.
+
+    Words match case-insensitively and by prefix, so 'fix bri' finds
+    'Fix what Brian did'. Tasks come in id order, at most limit of them,
+    only owner's if owner is given.
+    """
+    return _client.search(text, owner, limit)
+
+
+def changes_since(version=0):  # type: (int) -> Changes
+    """Return what changed in the db after version, as a Changes.
+
+    Every write raises the db's version. tasks are the Task objects
+    added or changed since version, oldest change first, deleted the
+    ids deleted since, and version the db's version now, to pass next
+    time. Syncing this way costs what changed, not what is in the db;
+    start from 0 to get every task. Raise ValueError if version is
+    ahead of the db, as it is after the db is replaced by an older one.
+
+    The TinyDB, log and mmap dbs keep only the newest tombstones. From
+    a version older than those, resync is True and tasks is every task
+    there is: replace what you have with them, and deleted is empty.
+    """
+    return _client.changes_since(version)
+
+
+def count(owner=None, done=None):  # type: (str|None, bool|None) -> int
+    """Return the number of tasks in db, or of those with owner and done.
+
+    Counts are kept as tasks change, so no task is read to count them.
+    """
+    return _client.count(owner, done)
+
+
+def stats():  # type: () -> dict
+    """Return task counts for every owner, in one call.
+
+    Keys are owners, None for tasks without one, and values are dicts
+    of 'done', 'not_done' and 'total' counts.
+    """
+    return _client.stats()
+
+
+def check_counts():  # type: () -> list of tuple
+    """Count the tasks from scratch and fix the kept counts.
+
+    Return (owner, done, counted, actual) for every count that was
+    wrong, an empty list when all were right.
+    """
+    return _client.check_counts()
+
+
+def update(task_id, task):  # type: (int, Task) -> None
+    """Modify task in db with given task_id.
+
+    The fields of task that aren't None are set, the rest are left as
+    they are. Raise ValueError if there is no task with task_id.
+
+    done defaults to False in a Task, pass done=None to leave it be:
+
+        tasks.update(task_id, Task(owner='okken', done=None))
+    """
+    _client.update(task_id, task)
+
+
+def update_many(ids_or_filter, changes):
+    # type: (Where|iterable of int, dict) -> int
+    """Change fields of many tasks at once, return how many were changed.
+
+    ids_or_filter is a tasks.Where, or task ids; ids not in the db are
+    skipped. changes maps 'summary', 'owner' or 'done' to new values:
+
+        tasks.update_many(tasks.Where(owner='brian'), {'done': True})
+
+    The db finds and changes the tasks in one write.
+    """
+    return _client.update_many(ids_or_filter, changes)
+
+
+def delete(task_id):  # type: (int) -> None
+    """Remove a task from db with given task_id."""
+    _client.delete(task_id)
+
+
+def delete_many(ids_or_filter):  # type: (Where|iterable of int) -> int
+    """Remove many tasks at once, return how many were removed.
+
+    ids_or_filter is a tasks.Where, or task ids; ids not in the db are
+    skipped. The db finds and removes the tasks in one write.
+    """
+    return _client.delete_many(ids_or_filter)
+
+
+def delete_all():  # type: () -> None
+    """Remove all tasks from db."""
+    _client.delete_all()
+
+
+def unique_id():  # type: () -> int
+    """Return an integer that does not exist in the db."""
+    return _client.unique_id()
+
+
+def reserve_ids(n):  # type: (int) -> list of int
+    """Reserve n consecutive ids that tasks.add() will never return."""
+    return _client.reserve_ids(n)
+
+
+def batch():  # type: () -> None
+    """Group API calls so their changes are written to the db once.
+
+    Changes made inside ``with tasks.batch():`` are written when the
+    block exits, so a crash inside the block loses all of them.
+    """
+    return _client.batch()
+
+
+def flush():  # type: () -> None
+    """Write any changes the db is still holding in memory."""
+    _client.flush()
+
+
+def export_snapshot(snapshot_path):  # type: (str) -> int
+    """Write every task to a memory-mapped snapshot, return the count.
+
+    Open the snapshot with
+    ``start_tasks_db(snapshot_path, 'mmap', read_only=True)``.
+    """
+    return _client.export_snapshot(snapshot_path)
+
+
+def export_stream(out, format=None, owner=None, compress=None,
+                  chunk_size=1000):
+    # type: (str|file, str|None, str|None, bool|None, int) -> int
+    """Write tasks to out, a path or binary file, return how many.
+
+    format is 'jsonl', 'csv' or 'bin', by default the one out's
+    extension names, else 'jsonl'. compress gzips the output, by
+    default when out ends in .gz. Tasks are read chunk_size at a time,
+    only owner's if owner is given.
+    """
+    return _client.export_stream(out, format, owner, compress, chunk_size)
+
+
+def import_stream(source, format=None, chunk_size=1000, skip=0,
+                  progress=None):
+    # type: (str|file, str|None, int, int, callable|None) -> int
+    """Add the tasks in source, a path or binary file, return how many.
+
+    format is found from source's first bytes unless given, and gzipped
+    input is read as is. Tasks are added chunk_size at a time, each
+    chunk in one write, and the first skip tasks are passed over.
+    After each chunk progress(n) is called with the number of tasks in
+    source done so far; pass that n as skip to pick up after a failure.
+    """
+    return _client.import_stream(source, format, chunk_size, skip, progress)
+
+
+def start_tasks_db(db_path, db_type, **db_options):
+    # type: (str, str, ...) -> None
+    """Connect API functions to a db.
+
+    db_options are passed on to the db, for example
+    ``flush_every`` and ``flush_ms`` turn on write-behind for 'tiny',
+    ``reuse_ids`` hands out ids of deleted tasks again,
+    and ``read_only`` opens an 'mmap' snapshot.
+    'remote' talks to the ``tasks serve`` server for db_path.
+    """
+    _client.open(db_path, db_type, **db_options)
+
+
+def stop_tasks_db():  # type: () -> None
+    """Write any held changes and disconnect API functions from db."""
+    _client.close()
+
+
+class TasksClient(object):
+    """A connection to a tasks db, safe to share between threads.
+
+    The API functions use one TasksClient for the whole process,
+    make more to hold connections to other dbs:
+
+        with TasksClient(db_path, 'sqlite') as client:
+            client.add(Task('do something'))
+
+    Methods match the API functions of the same name.
+    Reads run side by side, each write runs alone, so update()'s read
+    and write of a task can't interleave with another thread's.
+    """
+
+    def __init__(self, db_path=None, db_type=None, **db_options):
+        # type: (str|None, str|None, ...) -> None
+        """Connect to a db, or make an unconnected client for open()."""
+        self._lock = ReadWriteLock()
+        self._db = None
+        if db_path is not None:
+            self.open(db_path, db_type, **db_options)
+
+    def open(self, db_path, db_type, **db_options):
+        # type: (str, str, ...) -> None
+        """Connect to a db, see tasks.start_tasks_db()."""
+        if not isinstance(db_path, string_types):
+            raise TypeError('db_path must be a string')
+        db = _open_db(db_path, db_type, **db_options)
+        with self._lock.write():
+            self._db = db
+
+    def close(self):  # type: () -> None
+        """Write any held changes and disconnect from the db."""
+        with self._lock.write():
+            self._check_open()
+            self._db.stop_tasks_db()
+            self._db = None
+
+    def add(self, task):  # type: (Task) -> int
+        """Add a task (a Task object) to the tasks database."""
+        _check_new_task(task)
+        with self._lock.write():
+            self._check_open()
+            return self._db.add(task._asdict())
+
+    def add_many(self, task_list):  # type: (iterable of Task) -> list of int
+        """Add several Task objects to the db, return their ids in order."""
+        task_list = list(task_list)
+        for task in task_list:
+            _check_new_task(task)
+        with self._lock.write():
+            self._check_open()
+            if not task_list:
+                return []
+            return self._db.add_many([t._asdict() for t in task_list])
+
+    def get(self, task_id):  # type: (int) -> Task
+        """Return a Task object with matching task_id."""
+        if not isinstance(task_id, int):
+            raise TypeError('task_id must be an int')
+        with self._lock.read():
+            self._check_open()
+            task_dict = self._db.get(task_id)
+        return Task(**task_dict)
+
+    def list_tasks(self, owner=None, as_table=False):
+        # type: (str|None, bool) -> list of Task | TaskTable
+        """Return a list of Task objects, or a TaskTable."""
+        if owner and not isinstance(owner, string_types):
+            raise TypeError('owner must be a string')
+        with self._lock.read():
+            self._check_open()
+            if as_table:
+                from tasks.table import TaskTable
+                pages = self._db.iter_tasks(owner, 1000, None)
+                return TaskTable.from_dicts(t for page in pages for t in page)
+            return [Task(**t) for t in self._db.list_tasks(owner)]
+
+    def iter_tasks(self, owner=None, page_size=100, after_id=None):
+        # type: (str|None, int, int|None) -> TaskCursor
+        """Return a TaskCursor yielding Task objects in id order."""
+        if owner and not isinstance(owner, string_types):
+            raise TypeError('owner must be a string')
+        if not isinstance(page_size, int):
+            raise TypeError('page_size must be an int')
+        if page_size < 1:
+            raise ValueError('page_size must be 1 or more')
+        if not (after_id is None or isinstance(after_id, int)):
+            raise TypeError('after_id must be an int or None')
+        with self._lock.read():
+            self._check_open()
+            pages = self._db.iter_tasks(owner, page_size, after_id)
+        return TaskCursor(self._read_pages(pages), after_id)
+
+    def query(self, where=None, limit=None, offset=0, **fields):
+        # type: (Where|None, int|None, int, ...) -> TaskQuery
+        """Return a TaskQuery for the tasks matching where and fields."""
+        if not (where is None or isinstance(where, Where)):
+            raise TypeError('where must be a Where or None')
+        if not (limit is None or isinstance(limit, int)):
+            raise TypeError('limit must be an int or None')
+        if not isinstance(offset, int):
+            raise TypeError('offset must be an int')
+        if (limit is not None and limit < 0) or offset < 0:
+            raise ValueError('limit and offset must be 0 or more')
+        if fields:
+            narrow = Where(**fields)
+            where = narrow if where is None else where & narrow
+        return TaskQuery(self, where or Where(), limit, offset)
+
+    def search(self, text, owner=None, limit=None):
+        # type: (str, str|None, int|None) -> list of Task
+        """Return Task objects whose summaries have every word in text."""
+        if not isinstance(text, string_types):
+            raise TypeError('text must be a string')
+        if owner and not isinstance(owner, string_types):
+            raise TypeError('owner must be a string')
+        if not (limit is None or isinstance(limit, int)):
+            raise TypeError('limit must be an int or None')
+        if limit is not None and limit < 0:
+            raise ValueError('limit must be 0 or more')
+        terms = textindex.words(text)
+        if not terms:
+            raise ValueError('text must have a word to search for')
+        with self._lock.read():
+            self._check_open()
+            found = self._db.search(terms, owner, limit)
+        return [Task(**t) for t in found]
+
+    def changes_since(self, version=0):  # type: (int) -> Changes
+        """Return what changed in the db after version."""
+        if not isinstance(version, int):
+            raise TypeError('version must be an int')
+        if version < 0:
+            raise ValueError('version must be 0 or more')
+        with self._lock.read():
+            self._check_open()
+            tasks, deleted, current = self._db.changes_since(version)
+        if version > current:
+            raise ValueError('version {} is ahead of the db, at {}'.format(
+                version, current))
+        # deleted is None when the db no longer has tombstones that old
+        return Changes([Task(**t) for t in tasks], list(deleted or ()),
+                       current, deleted is None)
+
+    def count(self, owner=None, done=None):
+        # type: (str|None, bool|None) -> int
+        """Return the number of tasks in db, or of those matching."""
+        if owner and not isinstance(owner, string_types):
+            raise TypeError('owner must be a string')
+        if not (done is None or isinstance(done, bool)):
+            raise TypeError('done must be True, False or None')
+        with self._lock.read():
+            self._check_open()
+            return self._db.count(owner, done)
+
+    def stats(self):  # type: () -> dict
+        """Return task counts for every owner, in one call."""
+        with self._lock.read():
+            self._check_open()
+            rows = self._db.counts()
+        owners = {}
+        for owner, done, n in rows:
+            counts = owners.setdefault(
+                owner, {'done': 0, 'not_done': 0, 'total': 0})
+            counts['done' if done else 'not_done'] += n
+            counts['total'] += n
+        return owners
+
+    def check_counts(self):  # type: () -> list of tuple
+        """Count the tasks from scratch and fix the kept counts."""
+        with self._lock.write():
+            self._check_open()
+            return [tuple(row) for row in self._db.rebuild_counts()]
+
+    def update(self, task_id, task):  # type: (int, Task) -> None
+        """Modify task in db with given task_id."""
+        if not isinstance(task_id, int):
+            raise TypeError('task_id must be an int')
+        if not isinstance(task, Task):
+            raise TypeError('task must be Task object')
+        # only the fields being set go to the db, nothing is read first
+        fields = dict((field, value) for field, value in task._asdict().items()
+                      if field != 'id' and value is not None)
+        with self._lock.write():
+            self._check_open()
+            self._db.update(task_id, fields)
+
+    def update_many(self, ids_or_filter, changes):
+        # type: (Where|iterable of int, dict) -> int
+        """Change fields of many tasks at once, return how many."""
+        task_ids, where = _ids_or_where(ids_or_filter)
+        _check_changes(changes)
+        with self._lock.write():
+            self._check_open()
+            if task_ids == [] or (where is not None and where.impossible):
+                return 0
+            return self._db.update_many(task_ids, dict(changes), where)
+
+    def delete(self, task_id):  # type: (int) -> None
+        """Remove a task from db with given task_id."""
+        if not isinstance(task_id, int):
+            raise TypeError('task_id must be an int')
+        with self._lock.write():
+            self._check_open()
+            self._db.delete(task_id)
+
+    def delete_many(self, ids_or_filter):
+        # type: (Where|iterable of int) -> int
+        """Remove many tasks at once, return how many."""
+        task_ids, where = _ids_or_where(ids_or_filter)
+        with self._lock.write():
+            self._check_open()
+            if task_ids == [] or (where is not None and where.impossible):
+                return 0
+            return self._db.delete_many(task_ids, where)
+
+    def delete_all(self):  # type: () -> None
+        """Remove all tasks from db."""
+        with self._lock.write():
+            self._check_open()
+            self._db.delete_all()
+
+    def unique_id(self):  # type: () -> int
+        """Return an integer that does not exist in the db."""
+        with self._lock.read():
+            self._check_open()
+            return self._db.unique_id()
+
+    def reserve_ids(self, n):  # type: (int) -> list of int
+        """Reserve n consecutive ids that add() will never return."""
+        if not isinstance(n, int):
+            raise TypeError('n must be an int')
+        if n < 1:
+            raise ValueError('n must be 1 or more')
+        with self._lock.write():
+            self._check_open()
+            return self._db.reserve_ids(n)
+
+    @contextmanager
+    def batch(self):  # type: () -> None
+        """Group calls so their changes are written to the db once.
+
+        The block holds the write lock, so other threads wait for it.
+        """
+        with self._lock.write():
+            self._check_open()
+            with self._db.batch():
+                yield
+
+    def flush(self):  # type: () -> None
+        """Write any changes the db is still holding in memory."""
+        with self._lock.write():
+            self._check_open()
+            self._db.flush()
+
+    def export_snapshot(self, snapshot_path):  # type: (str) -> int
+        """Write every task to a memory-mapped snapshot, return the count."""
+        if not isinstance(snapshot_path, string_types):
+            raise TypeError('snapshot_path must be a string')
+        with self._lock.read():
+            self._check_open()
+            import tasks.tasksdb_mmap
+            return tasks.tasksdb_mmap.write_snapshot(
+                snapshot_path, self._db.iter_tasks(None, 1000, None))
+
+    def export_stream(self, out, format=None, owner=None, compress=None,
+                      chunk_size=1000):
+        # type: (str|file, str|None, str|None, bool|None, int) -> int
+        """Write tasks to out, a path or binary file, return how many."""
+        import tasks.transfer
+        format = format or tasks.transfer.format_for(out)
+        tasks.transfer.check_format(format)
+        if owner and not isinstance(owner, string_types):
+            raise TypeError('owner must be a string')
+        _check_chunk_size(chunk_size)
+        encoder = tasks.transfer.encoder(format)
+        with self._lock.read():
+            self._check_open()
+            pages = self._db.iter_tasks(owner, chunk_size, None)
+        n = 0
+        with tasks.transfer.open_out(out, compress) as stream:
+            stream.write(encoder.start)
+            for page in self._read_pages(pages):
+                stream.write(encoder.encode(page))
+                n += len(page)
+        return n
+
+    def import_stream(self, source, format=None, chunk_size=1000, skip=0,
+                      progress=None):
+        # type: (str|file, str|None, int, int, callable|None) -> int
+        """Add the tasks in source, a path or binary file, return how many."""
+        import tasks.transfer
+        if format is not None:
+            tasks.transfer.check_format(format)
+        _check_chunk_size(chunk_size)
+        if not isinstance(skip, int):
+            raise TypeError('skip must be an int')
+        if skip < 0:
+            raise ValueError('skip must be 0 or more')
+        self._check_open()
+        done = added = 0
+        chunk = []
+        with tasks.transfer.open_in(source) as stream:
+            records = tasks.transfer.decode(
+                stream, format or tasks.transfer.sniff(stream))
+            for summary, owner, is_done in records:
+                done += 1
+                if done <= skip:
+                    continue
+                chunk.append({'summary': summary, 'owner': owner,
+                              'done': is_done, 'id': None})
+                if len(chunk) == chunk_size:
+                    added += self._add_chunk(chunk, done, progress)
+                    chunk = []
+        if chunk:
+            added += self._add_chunk(chunk, done, progress)
+        return added
+
+    def _add_chunk(self, chunk, done, progress):
+        # type: (list of dict, int, callable|None) -> int
+        """Add one import_stream() chunk in one write, then report it."""
+        with self._lock.write():
+            self._check_open()
+            self._db.add_many(chunk)
+        if progress is not None:
+            progress(done)
+        return len(chunk)
+
+    def _check_open(self):
+        if self._db is None:
+            raise UninitializedDatabase()
+
+    def _plan(self, task_query):  # type: (TaskQuery) -> planner.Plan
+        """Return the plan for task_query, call with the lock held."""
+        self._check_open()
+        total = self._db.count()
+        # with reuse_ids unique_id() can be a freed id, below the largest
+        high_id = max(self._db.unique_id() - 1, total)
+        return planner.plan(task_query.where, self._db.indexes, total,
+                            high_id, task_query.limit, task_query.offset)
+
+    def _run_query(self, task_query):  # type: (TaskQuery) -> list of Task
+        with self._lock.read():
+            plan = self._plan(task_query)
+            task_dicts = self._db.query(plan)
+        return [Task(**t) for t in task_dicts]
+
+    def _explain(self, task_query):  # type: (TaskQuery) -> planner.Plan
+        with self._lock.read():
+            return self._plan(task_query)
+
+    def _read_pages(self, pages):
+        """Yield from pages, reading each one under the read lock."""
+        while True:
+            with self._lock.read():
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_new_task(task):  # type: (Task) -> None
+    """Raise an exception if task can't be added to the db."""
     if not isinstance(task, Task):
         raise TypeError('task must be Task object')
     if not isinstance(task.summary, string_types):
@@ -31,97 +645,131 @@ def add(task):  # type: (Task) -> int
         raise ValueError('task.done must be True or False')
     if task.id is not None:
         raise ValueError('task.id must None')
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    task_id = _tasksdb.add(task._asdict())
-    return task_id
 
 
-def get(task_id):  # type: (int) -> Task
-    """Return a Task object with matching task_id."""
-    if not isinstance(task_id, int):
-        raise TypeError('task_id must be an int')
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    task_dict = _tasksdb.get(task_id)
-    return Task(**task_dict)
+def _check_chunk_size(chunk_size):  # type: (int) -> None
+    if not isinstance(chunk_size, int):
+        raise TypeError('chunk_size must be an int')
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be 1 or more')
 
 
-def list_tasks(owner=None):  # type: (str|None) -> list of Task
-    """Return a list of Task objects."""
-    if owner and not isinstance(owner, string_types):
-        raise TypeError('owner must be a string')
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    return [Task(**t) for t in _tasksdb.list_tasks(owner)]
+def _check_changes(changes):  # type: (dict) -> None
+    """Raise an exception if changes can't be applied to tasks."""
+    if not isinstance(changes, dict):
+        raise TypeError('changes must be a dict')
+    if not changes:
+        raise ValueError('changes must have a field to change')
+    for field in changes:
+        if field not in ('summary', 'owner', 'done'):
+            raise ValueError("can't change {!r}, only 'summary', "
+                             "'owner' and 'done'".format(field))
+    if ('summary' in changes and
+            not isinstance(changes['summary'], string_types)):
+        raise ValueError('summary must be string')
+    if not (changes.get('owner') is None or
+            isinstance(changes['owner'], string_types)):
+        raise ValueError('owner must be string or None')
+    if 'done' in changes and not isinstance(changes['done'], bool):
+        raise ValueError('done must be True or False')
 
 
-def count():  # type: (None) -> int
-    """Return the number of tasks in db."""
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    return _tasksdb.count()
+def _ids_or_where(ids_or_filter):
+    # type: (Where|iterable of int) -> (list of int|None, Where|None)
+    """Return (task ids, None) or (None, where) for ids_or_filter."""
+    if isinstance(ids_or_filter, Where):
+        return None, ids_or_filter
+    if isinstance(ids_or_filter, string_types):
+        raise TypeError('ids_or_filter must be a Where or task ids')
+    try:
+        task_ids = list(ids_or_filter)
+    except TypeError:
+        raise TypeError('ids_or_filter must be a Where or task ids')
+    if not all(isinstance(i, int) for i in task_ids):
+        raise TypeError('task ids must be ints')
+    return task_ids, None
 
 
-def update(task_id, task):  # type: (int, Task) -> None
-    """Modify task in db with given task_id."""
-    if not isinstance(task_id, int):
-        raise TypeError('task_id must be an int')
-    if not isinstance(task, Task):
-        raise TypeError('task must be Task object')
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    current_task = _tasksdb.get(task_id)
-    updates = task._asdict()
-    for field in task._fields:
-        if field != 'id' and updates[field] is not None:
-            current_task[field] = updates[field]
-    _tasksdb.update(task_id, current_task)
+class TaskCursor(object):
+    """Iterator over Task objects from tasks.iter_tasks().
 
+    after_id is the id of the last task returned, or the starting
+    after_id if none have been returned yet.
+    """
 
-def delete(task_id):  # type: (int) -> None
-    """Remove a task from db with given task_id."""
-    if not isinstance(task_id, int):
-        raise TypeError('task_id must be an int')
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    _tasksdb.delete(task_id)
+    def __init__(self, pages, after_id=None):
+        # type: (iterator of list of dict, int|None) -> None
+        self.after_id = after_id
+        self._pages = pages
+        self._page = iter(())
 
+    def __iter__(self):
+        return self
 
-def delete_all():  # type: () -> None
-    """Remove all tasks from db."""
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    _tasksdb.delete_all()
+    def __next__(self):  # type: () -> Task
+        task_dict = next(self._page, None)
+        while task_dict is None:
+            self._page = iter(next(self._pages))
+            task_dict = next(self._page, None)
+        task = Task(**task_dict)
+        self.after_id = task.id
+        return task
 
+    next = __next__
 
-def unique_id():  # type: () -> int
-    """Return an integer that does not exist in the db."""
-    if _tasksdb is None:
-        raise UninitializedDatabase()
-    return _tasksdb.unique_id()
 
+class TaskQuery(object):
+    """Tasks from tasks.query(), read from the db when iterated.
+
+    Nothing is read until then, and every iteration asks the db again.
+    """
+
+    def __init__(self, client, where, limit=None, offset=0):
+        # type: (TasksClient, Where, int|None, int) -> None
+        self.where = where
+        self.limit = limit
+        self.offset = offset
+        self._client = client
 
-_tasksdb = None
+    def __iter__(self):  # type: () -> iterator of Task
+        return iter(self._client._run_query(self))
 
+    def all(self):  # type: () -> list of Task
+        """Return the matching tasks as a list."""
+        return self._client._run_query(self)
 
-def start_tasks_db(db_path, db_type):  # type: (str, str) -> None
-    """Connect API functions to a db."""
-    if not isinstance(db_path, string_types):
-        raise TypeError('db_path must be a string')
-    global _tasksdb
+    def explain(self):  # type: () -> tasks.planner.Plan
+        """Return the plan the db would run now, print it to read it."""
+        return self._client._explain(self)
+
+    def __repr__(self):
+        return '<TaskQuery {!r} limit={} offset={}>'.format(
+            self.where, self.limit, self.offset)
+
+
+def _open_db(db_path, db_type, **db_options):
+    """Return a new db object of db_type, see start_tasks_db()."""
     if db_type == 'tiny':
         import tasks.tasksdb_tinydb
-        _tasksdb = tasks.tasksdb_tinydb.start_tasks_db(db_path)
+        return tasks.tasksdb_tinydb.start_tasks_db(db_path, **db_options)
     elif db_type == 'mongo':
         import tasks.tasksdb_pymongo
-        _tasksdb = tasks.tasksdb_pymongo.start_tasks_db(db_path)
+        return tasks.tasksdb_pymongo.start_tasks_db(db_path, **db_options)
+    elif db_type == 'log':
+        import tasks.tasksdb_log
+        return tasks.tasksdb_log.start_tasks_db(db_path, **db_options)
+    elif db_type == 'sqlite':
+        import tasks.tasksdb_sqlite
+        return tasks.tasksdb_sqlite.start_tasks_db(db_path, **db_options)
+    elif db_type == 'mmap':
+        import tasks.tasksdb_mmap
+        return tasks.tasksdb_mmap.start_tasks_db(db_path, **db_options)
+    elif db_type == 'remote':
+        import tasks.tasksdb_remote
+        return tasks.tasksdb_remote.start_tasks_db(db_path, **db_options)
     else:
-        raise ValueError("db_type must be a 'tiny' or 'mongo'")
+        raise ValueError("db_type must be 'tiny', 'mongo', 'log', "
+                         "'sqlite', 'mmap' or 'remote'")
 
 
-def stop_tasks_db():  # type: () -> None
-    """Disconnect API functions from db."""
-    global _tasksdb
-    _tasksdb.stop_tasks_db()
-    _tasksdb = None
+_client = TasksClient()
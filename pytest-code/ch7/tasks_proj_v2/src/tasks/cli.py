@@ -1,15 +1,19 @@
 """Command Line Interface (CLI) for tasks project."""
 
 from __future__ import print_function
+import os
 import click
-import tasks.config
+import tasks
 from contextlib import contextmanager
-from tasks.api import Task
+
+# Only click, os and the tasks package are imported up front, --help and
+# --version never load the API, the config reader or a db module.
+# Commands import what they use when they run.
 
 
 # The main entry point for tasks.
 @click.group(context_settings={'help_option_names': ['-h', '--help']})
-@click.version_option(version='0.1.1')
+@click.version_option(version=tasks.__version__)
 def tasks_cli():
     """Run the tasks application."""
     pass
@@ -22,7 +26,7 @@ def tasks_cli():
 def add(summary, owner):
     """Add a task to db."""
     with _tasks_db():
-        tasks.add(Task(summary, owner))
+        tasks.add(tasks.Task(summary, owner))
 
 
 @tasks_cli.command(help="delete a task")
@@ -46,7 +50,31 @@ def list_tasks(owner):
     print(formatstr.format('ID', 'owner', 'done', 'summary'))
     print(formatstr.format('--', '-----', '----', '-------'))
     with _tasks_db():
-        for t in tasks.list_tasks(owner):
+        for t in tasks.iter_tasks(owner):
+            done = 'True' if t.done else 'False'
+            owner = '' if t.owner is None else t.owner
+            print(formatstr.format(
+                  t.id, owner, done, t.summary))
+
+
+@tasks_cli.command(help="search task summaries")
+@click.argument('text')
+@click.option('-o', '--owner', default=None,
+              help='only search tasks with this owner')
+@click.option('-n', '--limit', default=None, type=int,
+              help='list at most this many tasks')
+def search(text, owner, limit):
+    """
+    List tasks whose summaries have every word in text.
+
+    Words match by prefix and ignore case, 'fix bri' finds
+    'Fix what Brian did'.
+    """
+    formatstr = "{: >4} {: >10} {: >5} {}"
+    print(formatstr.format('ID', 'owner', 'done', 'summary'))
+    print(formatstr.format('--', '-----', '----', '-------'))
+    with _tasks_db():
+        for t in tasks.search(text, owner, limit):
             done = 'True' if t.done else 'False'
             owner = '' if t.owner is None else t.owner
             print(formatstr.format(
@@ -65,21 +93,102 @@ def list_tasks(owner):
 def update(task_id, owner, summary, done):
     """Modify a task in db with given id with new info."""
     with _tasks_db():
-        tasks.update(task_id, Task(summary, owner, done))
+        tasks.update(task_id, tasks.Task(summary, owner, done))
 
 
 @tasks_cli.command(help="list count")
-def count():
-    """Return number of tasks in db."""
+@click.option('-o', '--owner', default=None,
+              help='count tasks with this owner')
+@click.option('-d', '--done', default=None,
+              type=bool,
+              help='count tasks in this done state (True or False)')
+def count(owner, done):
+    """Return number of tasks in db, or of those with owner and done."""
     with _tasks_db():
-        c = tasks.count()
+        c = tasks.count(owner, done)
         print(c)
 
 
+@tasks_cli.command(name="export", help="write tasks to a file")
+@click.argument('path')
+@click.option('-f', '--format', default=None,
+              type=click.Choice(['jsonl', 'csv', 'bin']),
+              help="file format, by default from the path's extension")
+@click.option('-o', '--owner', default=None,
+              help='export tasks with this owner')
+@click.option('-z', '--gzip', 'compress', is_flag=True, default=None,
+              help='gzip the file, the default for paths ending in .gz')
+def export_tasks(path, format, owner, compress):
+    """
+    Write tasks to a jsonl, csv or bin file, '-' for stdout.
+
+    Tasks are read and written a page at a time.
+    """
+    out = click.get_binary_stream('stdout') if path == '-' else path
+    with _tasks_db():
+        n = tasks.export_stream(out, format, owner, compress)
+    if path != '-':
+        print('exported {} tasks'.format(n))
+
+
+@tasks_cli.command(name="import", help="add tasks from a file")
+@click.argument('path')
+@click.option('-f', '--format', default=None,
+              type=click.Choice(['jsonl', 'csv', 'bin']),
+              help='file format, by default read from the file')
+@click.option('-n', '--chunk-size', default=1000, type=int,
+              help='tasks to add in each write')
+@click.option('-r', '--resume', is_flag=True,
+              help='skip the tasks an interrupted import already added')
+def import_tasks(path, format, chunk_size, resume):
+    """
+    Add the tasks in a jsonl, csv or bin file, gzipped or not.
+
+    The number of tasks done is kept in PATH.progress after each write,
+    so --resume carries on from there after a failure.
+    """
+    from tasks.compat import replace
+    progress_path = path + '.progress'
+    skip = 0
+    if resume and os.path.exists(progress_path):
+        with open(progress_path) as f:
+            skip = int(f.read())
+
+    def save_progress(done):
+        with open(progress_path + '.tmp', 'w') as f:
+            f.write(str(done))
+        replace(progress_path + '.tmp', progress_path)
+
+    with _tasks_db():
+        n = tasks.import_stream(path, format, chunk_size, skip,
+                                save_progress)
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    print('imported {} tasks'.format(n))
+
+
+@tasks_cli.command(help="keep the db open for other tasks commands")
+def serve():
+    """Serve the db until Ctrl-C, other commands then go through it."""
+    import tasks.config
+    import tasks.server
+    config = tasks.config.get_config()
+    print('serving {} db at {}, Ctrl-C to stop'.format(config.db_type,
+                                                       config.db_path))
+    tasks.server.serve(config.db_path, config.db_type,
+                       **tasks.config.db_options(config))
+
+
 @contextmanager
 def _tasks_db():
+    import tasks.config
     config = tasks.config.get_config()
-    tasks.start_tasks_db(config.db_path, config.db_type)
+    try:
+        # a running ``tasks serve`` already has the db open
+        tasks.start_tasks_db(config.db_path, 'remote')
+    except EnvironmentError:
+        tasks.start_tasks_db(config.db_path, config.db_type,
+                             **tasks.config.db_options(config))
     yield
     tasks.stop_tasks_db()
 
@@ -0,0 +1,8 @@
+"""What the standard library lacks on Python 2."""
+
+import os
+
+try:
+    replace = os.replace
+except AttributeError:  # Python 2, where rename replaces on POSIX
+    replace = os.rename
@@ -8,13 +8,28 @@ except ImportError:
 
 import os
 
-TasksConfig = namedtuple('TasksConfig', ['db_path', 'db_type'])
+TasksConfig = namedtuple('TasksConfig', ['db_path', 'db_type', 'db_uri'])
+TasksConfig.__new__.__defaults__ = (None,)
 
 
 def get_config():
-    """Return TasksConfig object after reading config file."""
+    """Return TasksConfig object after reading config file.
+
+    ~/.tasks.config looks like this:
+
+    [TASKS]
+    tasks_db_path = ~/tasks_db/
+    tasks_db_type = sqlite
+
+    tasks_db_type is any db_type tasks.start_tasks_db() accepts:
+    tiny, mongo, log, sqlite or mmap.
+
+    For mongo, an optional tasks_db_uri, like mongodb://localhost:27017/,
+    attaches to a running server instead of starting mongod.
+    """
     parser = ConfigParser()
     config_file = os.path.expanduser('~/.tasks.config')
+    tasks_db_uri = None
     if not os.path.exists(config_file):
         tasks_db_path = '~/tasks_db/'
         tasks_db_type = 'tiny'
@@ -22,5 +37,14 @@ def get_config():
         parser.read(config_file)
         tasks_db_path = parser.get('TASKS', 'tasks_db_path')
         tasks_db_type = parser.get('TASKS', 'tasks_db_type')
+        if parser.has_option('TASKS', 'tasks_db_uri'):
+            tasks_db_uri = parser.get('TASKS', 'tasks_db_uri')
     tasks_db_path = os.path.expanduser(tasks_db_path)
-    return TasksConfig(tasks_db_path, tasks_db_type)
+    return TasksConfig(tasks_db_path, tasks_db_type, tasks_db_uri)
+
+
+def db_options(config):  # type: (TasksConfig) -> dict
+    """Return the start_tasks_db() options the config asks for."""
+    if config.db_uri is None:
+        return {}
+    return {'uri': config.db_uri}
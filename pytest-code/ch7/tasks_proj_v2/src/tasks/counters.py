@@ -0,0 +1,67 @@
+"""Task counts by owner and done state for tasks project."""
+
+
+class TaskCounts(object):
+    """Number of tasks for each (owner, done) pair, kept as tasks change.
+
+    The dbs that keep tasks in memory hold one, and call add() and
+    remove() under the same lock as the change they count, so count()
+    never has to look at a task. Totals per done state are kept too,
+    making every count() a dict lookup or two.
+    """
+
+    def __init__(self):
+        self._pairs = {}  # (owner, done) -> number of tasks
+        self._done = {True: 0, False: 0}
+
+    @classmethod
+    def of(cls, tasks):  # type: (iterable of dict) -> TaskCounts
+        """Return the counts for task dicts, counted from scratch."""
+        counts = cls()
+        for task in tasks:
+            counts.add(task.get('owner'), task['done'])
+        return counts
+
+    def add(self, owner, done, n=1):  # type: (str|None, bool, int) -> None
+        key = (owner, bool(done))
+        count = self._pairs.get(key, 0) + n
+        if count:
+            self._pairs[key] = count
+        else:
+            del self._pairs[key]
+        self._done[bool(done)] += n
+
+    def remove(self, owner, done):  # type: (str|None, bool) -> None
+        self.add(owner, done, -1)
+
+    def count(self, owner=None, done=None):
+        # type: (str|None, bool|None) -> int
+        """Return the number of tasks with owner and done, None for any."""
+        if owner is None:
+            if done is None:
+                return self._done[True] + self._done[False]
+            return self._done[done]
+        if done is None:
+            return (self._pairs.get((owner, True), 0) +
+                    self._pairs.get((owner, False), 0))
+        return self._pairs.get((owner, done), 0)
+
+    def rows(self):  # type: () -> list of [owner, done, n]
+        """Return [owner, done, n] for every pair with tasks."""
+        return [[owner, done, n] for (owner, done), n in self._pairs.items()]
+
+    def differences(self, actual):
+        # type: (TaskCounts) -> list of [owner, done, counted, actual]
+        """Return [owner, done, counted, actual] where actual differs."""
+        return differences(self.rows(), actual.rows())
+
+
+def differences(counted, actual):
+    # type: (list of [owner, done, n], ...) -> list of [owner, done, n, n]
+    """Return [owner, done, counted, actual] for rows that don't agree."""
+    counted = dict(((owner, bool(done)), n) for owner, done, n in counted)
+    actual = dict(((owner, bool(done)), n) for owner, done, n in actual)
+    return [[owner, done, counted.get((owner, done), 0),
+             actual.get((owner, done), 0)]
+            for owner, done in set(counted) | set(actual)
+            if counted.get((owner, done), 0) != actual.get((owner, done), 0)]
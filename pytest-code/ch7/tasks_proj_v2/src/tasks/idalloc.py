@@ -0,0 +1,78 @@
+"""Task id allocation shared by the db wrappers for tasks project."""
+
+
+class IdAllocator(object):
+    """Hand out task ids in O(1).
+
+    Ids come from a high-water mark, the largest id ever handed out.
+    With reuse_ids, ids of deleted tasks go on a free list and are
+    handed out again before the high-water mark moves.
+
+    This class keeps its state in memory and calls save(state) after
+    every change, so the db wrapper can persist it.
+    Wrappers with a shared store (MongoDB) subclass it instead,
+    overriding the methods that touch the state.
+    """
+
+    def __init__(self, high_water=0, free=(), reuse_ids=False, save=None):
+        # type (int, list[int], bool, callable) -> ()
+        self.reuse_ids = reuse_ids
+        self._high_water = high_water
+        self._free = list(free)
+        self._save = save
+
+    def peek(self):  # type () -> int
+        """Return the id allocate() would return, without reserving it."""
+        if self.reuse_ids and self._free:
+            return self._free[-1]
+        return self._high_water + 1
+
+    def allocate(self):  # type () -> int
+        """Reserve and return one id."""
+        if self.reuse_ids and self._free:
+            task_id = self._free.pop()
+            self._changed()
+            return task_id
+        return self._advance(1)
+
+    def reserve(self, n):  # type (int) -> list[int]
+        """Reserve n consecutive ids, return them in order."""
+        if n < 1:
+            return []
+        first = self._advance(n)
+        return list(range(first, first + n))
+
+    def release(self, task_ids):  # type (list[int]) -> ()
+        """Hand ids of deleted tasks back, for reuse if reuse_ids is set."""
+        if self.reuse_ids and task_ids:
+            self._free.extend(sorted(task_ids, reverse=True))
+            self._changed()
+
+    def claim(self, task_id):  # type (int) -> ()
+        """Mark task_id as used, for rebuilding state from a log."""
+        if task_id in self._free:
+            self._free.remove(task_id)
+        if task_id > self._high_water:
+            self._high_water = task_id
+        self._changed()
+
+    def reset(self):  # type () -> ()
+        """Start over from id 1, for when all tasks are deleted."""
+        self._high_water = 0
+        self._free = []
+        self._changed()
+
+    def state(self):  # type () -> dict
+        """Return the state to persist, as keyword args for __init__."""
+        return {'high_water': self._high_water, 'free': list(self._free)}
+
+    def _advance(self, n):  # type (int) -> int
+        """Move the high-water mark up by n, return the first new id."""
+        first = self._high_water + 1
+        self._high_water += n
+        self._changed()
+        return first
+
+    def _changed(self):
+        if self._save is not None:
+            self._save(self.state())
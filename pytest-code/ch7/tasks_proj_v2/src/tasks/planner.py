@@ -0,0 +1,240 @@
+"""Query filters and index planning for tasks project.
+
+A Where says which tasks a query wants, plan() picks how a db
+should find them:
+
+    Where(owner='brian', done=False) & Where(summary_prefix='Fix')
+
+Each db lists the indexes it has ('id' is the task id order every db
+keeps), and plan() picks the one expected to leave the fewest tasks
+to check; the rest of the Where is checked task by task.
+Estimates use the task count and highest id, plus the fractions below
+for owner and done.
+"""
+
+from six import string_types
+
+# fraction of tasks expected to match an equality test on the column
+OWNER_SELECTIVITY = 0.1
+DONE_SELECTIVITY = 0.5
+
+_FIELDS = ('owner', 'done', 'min_id', 'max_id',
+           'summary_prefix', 'summary_contains')
+
+
+class Where(object):
+    """Which tasks a query wants, every given field must match.
+
+    owner            - owner equal to this
+    done             - done equal to this
+    min_id, max_id   - id in this range, both ends included
+    summary_prefix   - summary starts with this
+    summary_contains - summary contains this, or all of a tuple of these
+
+    Combine with &, a Where that can't match anything has
+    ``impossible`` set.
+    """
+
+    def __init__(self, owner=None, done=None, min_id=None, max_id=None,
+                 summary_prefix=None, summary_contains=None):
+        if not (owner is None or isinstance(owner, string_types)):
+            raise TypeError('owner must be a string')
+        if not (done is None or isinstance(done, bool)):
+            raise TypeError('done must be True or False')
+        for name, value in (('min_id', min_id), ('max_id', max_id)):
+            if not (value is None or isinstance(value, int)):
+                raise TypeError('{} must be an int'.format(name))
+        if not (summary_prefix is None or
+                isinstance(summary_prefix, string_types)):
+            raise TypeError('summary_prefix must be a string')
+        if isinstance(summary_contains, string_types):
+            summary_contains = (summary_contains,)
+        summary_contains = tuple(summary_contains or ())
+        if not all(isinstance(s, string_types) for s in summary_contains):
+            raise TypeError('summary_contains must be strings')
+        self.owner = owner
+        self.done = done
+        self.min_id = min_id
+        self.max_id = max_id
+        self.summary_prefix = summary_prefix
+        self.summary_contains = summary_contains
+        self.impossible = (min_id is not None and max_id is not None and
+                           min_id > max_id)
+
+    def __and__(self, other):  # type: (Where) -> Where
+        combined = Where(**self.as_dict())
+        combined.impossible = self.impossible or other.impossible
+        for name in ('owner', 'done'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if mine is None:
+                setattr(combined, name, theirs)
+            elif theirs is not None and theirs != mine:
+                combined.impossible = True
+        if other.min_id is not None:
+            combined.min_id = max(other.min_id, combined.min_id
+                                  if combined.min_id is not None
+                                  else other.min_id)
+        if other.max_id is not None:
+            combined.max_id = min(other.max_id, combined.max_id
+                                  if combined.max_id is not None
+                                  else other.max_id)
+        if (combined.min_id is not None and combined.max_id is not None and
+                combined.min_id > combined.max_id):
+            combined.impossible = True
+        prefixes = sorted(p for p in (self.summary_prefix,
+                                      other.summary_prefix) if p is not None)
+        if prefixes:
+            # keep the longer prefix, the shorter one must start it
+            if not prefixes[-1].startswith(prefixes[0]) and \
+                    not prefixes[0].startswith(prefixes[-1]):
+                combined.impossible = True
+            combined.summary_prefix = max(prefixes, key=len)
+        combined.summary_contains = tuple(sorted(
+            set(self.summary_contains) | set(other.summary_contains)))
+        return combined
+
+    def matches(self, task):  # type: (dict) -> bool
+        """Return True if a task dict passes every test."""
+        if self.impossible:
+            return False
+        if self.owner is not None and task['owner'] != self.owner:
+            return False
+        if self.done is not None and task['done'] != self.done:
+            return False
+        if not self.has_id(task['id']):
+            return False
+        summary = task['summary']
+        if (self.summary_prefix is not None and
+                not summary.startswith(self.summary_prefix)):
+            return False
+        return all(s in summary for s in self.summary_contains)
+
+    def has_id(self, task_id):  # type: (int) -> bool
+        """Return True if task_id is in the id range."""
+        return ((self.min_id is None or task_id >= self.min_id) and
+                (self.max_id is None or task_id <= self.max_id))
+
+    def as_dict(self):  # type: () -> dict
+        """Return the fields that are set, as keyword args for Where()."""
+        fields = dict((name, getattr(self, name)) for name in _FIELDS)
+        fields['summary_contains'] = fields['summary_contains'] or None
+        return dict((k, v) for k, v in fields.items() if v is not None)
+
+    def __eq__(self, other):
+        return (isinstance(other, Where) and
+                self.impossible == other.impossible and
+                self.as_dict() == other.as_dict())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        fields = ', '.join('{}={!r}'.format(k, v)
+                           for k, v in sorted(self.as_dict().items()))
+        return 'Where({})'.format(fields)
+
+
+class Plan(object):
+    """How a db should run a query, see plan().
+
+    index     - 'id', 'owner', 'done', or None for a full scan
+    where     - every test, the db checks those the index doesn't
+    limit     - most tasks to return, or None for all
+    offset    - matching tasks to skip first
+    estimate  - tasks the index is expected to leave to check
+    """
+
+    def __init__(self, index, where, limit=None, offset=0, estimate=0):
+        self.index = index
+        self.where = where
+        self.limit = limit
+        self.offset = offset
+        self.estimate = estimate
+
+    def as_dict(self):  # type: () -> dict
+        """Return the plan as plain data, for sending to a server."""
+        return {'index': self.index, 'where': self.where.as_dict(),
+                'impossible': self.where.impossible, 'limit': self.limit,
+                'offset': self.offset, 'estimate': self.estimate}
+
+    @classmethod
+    def from_dict(cls, data):  # type: (dict) -> Plan
+        where = Where(**data['where'])
+        where.impossible = data['impossible']
+        return cls(data['index'], where, data['limit'], data['offset'],
+                   data['estimate'])
+
+    def __str__(self):
+        if self.where.impossible:
+            access = 'nothing can match'
+        elif self.index is None:
+            access = 'full scan'
+        elif self.index == 'id':
+            access = 'id range {}..{}'.format(
+                '' if self.where.min_id is None else self.where.min_id,
+                '' if self.where.max_id is None else self.where.max_id)
+        else:
+            access = 'index {}={!r}'.format(self.index,
+                                            getattr(self.where, self.index))
+        parts = ['{} (~{} tasks)'.format(access, self.estimate)]
+        tests = self.where.as_dict()
+        if tests:
+            parts.append('filter ' + ', '.join(
+                '{}={!r}'.format(k, v) for k, v in sorted(tests.items())))
+        if self.offset:
+            parts.append('offset {}'.format(self.offset))
+        if self.limit is not None:
+            parts.append('limit {}'.format(self.limit))
+        return '; '.join(parts)
+
+    def __repr__(self):
+        return '<Plan {}>'.format(self)
+
+
+def plan(where, indexes, total, high_id, limit=None, offset=0):
+    # type: (Where, tuple, int, int, int|None, int) -> Plan
+    """Return the Plan for where on a db with these indexes.
+
+    total is the number of tasks in the db and high_id the largest id
+    handed out, they scale the estimate for each index.
+    """
+    if where.impossible:
+        return Plan(None, where, limit, offset, 0)
+    candidates = [(total, 1, None)]
+    if 'id' in indexes and (where.min_id is not None or
+                            where.max_id is not None):
+        low = max(where.min_id or 1, 1)
+        high = min(where.max_id if where.max_id is not None else high_id,
+                   high_id)
+        span = max(high - low + 1, 0)
+        # tasks are spread over the ids handed out, deleted ones leave gaps
+        estimate = span if high_id <= total else (
+            int(round(total * span / float(max(high_id, 1)))))
+        candidates.append((min(estimate, span, total), 0, 'id'))
+    if 'owner' in indexes and where.owner is not None:
+        candidates.append((int(round(total * OWNER_SELECTIVITY)), 2, 'owner'))
+    if 'done' in indexes and where.done is not None:
+        candidates.append((int(round(total * DONE_SELECTIVITY)), 3, 'done'))
+    # ties go to id, the order results come back in anyway
+    estimate, _, index = min(candidates)
+    return Plan(index, where, limit, offset, estimate)
+
+
+def ids_in_range(task_ids, min_id=None, max_id=None):
+    # type: (set|dict of int, int|None, int|None) -> list of int
+    """Return the ids in task_ids between min_id and max_id, unsorted.
+
+    Walks the id range when that's shorter than task_ids.
+    """
+    low = 1 if min_id is None else min_id
+    high = max_id
+    if high is not None and high - low < len(task_ids):
+        return [i for i in range(low, high + 1) if i in task_ids]
+    return [i for i in task_ids if i >= low and (high is None or i <= high)]
+
+
+def page(tasks, plan):  # type: (iterable of dict, Plan) -> list of dict
+    """Return tasks, in id order, cut down to the plan's offset and limit."""
+    tasks = list(tasks)
+    end = None if plan.limit is None else plan.offset + plan.limit
+    return tasks[plan.offset:end]
@@ -0,0 +1,62 @@
+"""Reader/writer lock for tasks project."""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock(object):
+    """Let any number of readers in at once, or one writer alone.
+
+    Waiting writers go before new readers, so a steady stream of
+    reads can't starve a write.
+    The writing thread may take the lock again, to read or write,
+    but reads don't nest: a reader waiting behind a writer that waits
+    on the outer read would never get in.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # thread holding the write lock
+        self._writes = 0  # nesting depth of the writer
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the block."""
+        me = threading.current_thread()
+        with self._cond:
+            nested = self._writer is me
+            if not nested:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusive for the block."""
+        me = threading.current_thread()
+        with self._cond:
+            if self._writer is not me:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+            self._writes += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writes -= 1
+                if not self._writes:
+                    self._writer = None
+                    self._cond.notify_all()
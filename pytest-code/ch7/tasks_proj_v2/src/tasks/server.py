@@ -0,0 +1,166 @@
+"""Server keeping one tasks db open for many clients, for tasks project.
+
+``tasks serve`` runs it, and tasks.tasksdb_remote is the client.
+Clients send one JSON line per call, {"method": ..., "args": [...]},
+and get back {"result": ...} or {"error": <type>, "message": ...}.
+
+Calls are run one at a time on the event loop, so the db never sees
+two at once, however many clients are connected.
+"""
+
+import asyncio
+import json
+import os
+import signal
+import socket
+
+from tasks.api import TasksException, _open_db
+from tasks.planner import Plan, Where
+from tasks.tasksdb_remote import socket_path
+
+# the db methods clients may call, 'page' is one page of iter_tasks()
+# and 'indexes' reads the db's indexes
+_METHODS = frozenset(['add', 'add_many', 'get', 'count', 'update', 'delete',
+                      'delete_all', 'unique_id', 'reserve_ids', 'flush',
+                      'page', 'query', 'indexes', 'search', 'counts',
+                      'rebuild_counts', 'update_many', 'delete_many',
+                      'changes_since'])
+# longest request line, add_many() sends a whole list in one
+_LINE_LIMIT = 1 << 26
+
+
+class TasksServer(object):
+    """Answer calls from clients on a Unix socket, with an open db."""
+
+    def __init__(self, db, path):  # type (object, str) -> ()
+        self.db = db
+        self.path = path
+        self._server = None
+
+    async def start(self):
+        """Start listening on path, replacing a stale socket file."""
+        if os.path.exists(self.path):
+            if _listening(self.path):
+                raise TasksException(
+                    'a tasks server is already running on ' + self.path)
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=self.path, limit=_LINE_LIMIT)
+
+    async def stop(self):
+        """Stop listening, and remove the socket file."""
+        self._server.close()
+        await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def call(self, request, cursor=None):  # type (dict, dict) -> dict
+        """Run one request against the db, return the reply.
+
+        cursor is the calling connection's paging state, see _page().
+        """
+        method = request.get('method')
+        if method not in _METHODS:
+            return {'error': 'ValueError',
+                    'message': 'unknown method {!r}'.format(method)}
+        args = request.get('args', [])
+        try:
+            if method == 'page':
+                result = self._page({} if cursor is None else cursor,
+                                    *args)
+            elif method == 'indexes':
+                result = list(self.db.indexes)
+            elif method == 'query':
+                result = self.db.query(Plan.from_dict(*args))
+            elif method in ('update_many', 'delete_many'):
+                # the last argument is a Where as a dict, or None
+                args = list(args)
+                if args[-1] is not None:
+                    args[-1] = Where(**args[-1])
+                result = getattr(self.db, method)(*args)
+            else:
+                result = getattr(self.db, method)(*args)
+        except Exception as e:
+            return {'error': type(e).__name__, 'message': str(e)}
+        return {'result': result}
+
+    def _page(self, cursor, owner=None, page_size=100, after_id=None):
+        # type (dict, str, int, int) -> list[dict]
+        """Return the page of iter_tasks() after after_id.
+
+        The iterator is kept in cursor after each page, and the next
+        request for the page after it carries on with it, so paging
+        through n tasks sorts their ids once, not once per page.
+        """
+        key = (owner, page_size, after_id)
+        pages = cursor.pop(key, None)
+        if pages is None:
+            cursor.clear()
+            pages = self.db.iter_tasks(owner, page_size, after_id)
+        page = next(pages, [])
+        if page:
+            cursor[(owner, page_size, page[-1]['id'])] = pages
+        return page
+
+    async def _handle(self, reader, writer):
+        cursor = {}
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # longer than _LINE_LIMIT, the rest of it can't be
+                    # told apart from the next request, so say so and hang up
+                    reply = {'error': 'ValueError',
+                             'message': 'request line too long'}
+                    writer.write((json.dumps(reply) + '\n').encode('utf-8'))
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    reply = self.call(json.loads(line.decode('utf-8')),
+                                      cursor)
+                except ValueError as e:
+                    reply = {'error': 'ValueError', 'message': str(e)}
+                writer.write((json.dumps(reply) + '\n').encode('utf-8'))
+                await writer.drain()
+        except ConnectionError:
+            pass  # the client went away mid-reply
+        finally:
+            writer.close()
+
+
+def _listening(path):  # type (str) -> bool
+    """Return True if something accepts connections on path."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def serve(db_path, db_type, **db_options):  # type (str, str, ...) -> ()
+    """Serve the db until SIGINT or SIGTERM, then close it."""
+    db = _open_db(db_path, db_type, **db_options)
+    server = TasksServer(db, socket_path(db_path))
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+        await server.start()
+        try:
+            await stopping.wait()
+        finally:
+            await server.stop()
+
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+        db.stop_tasks_db()
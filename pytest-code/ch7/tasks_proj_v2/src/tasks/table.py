@@ -0,0 +1,101 @@
+"""Columnar task storage for large listings in tasks project."""
+
+from array import array
+from itertools import chain, compress
+
+from six.moves import intern
+
+from tasks.api import Task
+
+# _BITS[b] is the 8 bits of byte b, lowest first, for itertools.compress
+_BITS = [tuple((b >> k) & 1 for k in range(8)) for b in range(256)]
+
+
+class TaskTable(object):
+    """Tasks stored as columns instead of one Task per row.
+
+    Columns:
+    ids       - array('q')
+    summaries - list of interned strings
+    owners    - list of interned strings (or None)
+    done      - bit array, one bit per row
+
+    Repeated owners and summaries share one string object,
+    and Task objects are only made when a row is looked at.
+    Filters return a new TaskTable and never make Task objects.
+    """
+
+    def __init__(self):  # type: () -> None
+        """Make an empty table, see from_dicts() to fill one."""
+        self.ids = array('q')
+        self.summaries = []
+        self.owners = []
+        self._done = bytearray()
+
+    @classmethod
+    def from_dicts(cls, task_dicts):  # type: (iterable of dict) -> TaskTable
+        """Return a TaskTable built from task dicts as the db returns."""
+        table = cls()
+        for t in task_dicts:
+            table.append(t['summary'], t['owner'], t['done'], t['id'])
+        return table
+
+    def append(self, summary, owner, done, task_id):
+        # type: (str, str|None, bool, int) -> None
+        """Add one row to the end of the table."""
+        row = len(self.ids)
+        self.ids.append(task_id)
+        self.summaries.append(intern(summary))
+        self.owners.append(None if owner is None else intern(owner))
+        if row % 8 == 0:
+            self._done.append(0)
+        if done:
+            self._done[row >> 3] |= 1 << (row & 7)
+
+    @property
+    def done(self):  # type: () -> iterator of bool
+        """Iterate over the done column as bools."""
+        bits = chain.from_iterable(_BITS[b] for b in self._done)
+        return (bit == 1 for bit, _ in zip(bits, self.ids))
+
+    def where_done(self, done=True):  # type: (bool) -> TaskTable
+        """Return the rows whose done state matches done."""
+        bits = chain.from_iterable(_BITS[b] for b in self._done)
+        if not done:
+            bits = (1 - bit for bit in bits)
+        return self._take(compress(range(len(self)), bits))
+
+    def where_owner_in(self, owners):  # type: (iterable of str) -> TaskTable
+        """Return the rows whose owner is one of owners."""
+        wanted = frozenset(owners)
+        selectors = map(wanted.__contains__, self.owners)
+        return self._take(compress(range(len(self)), selectors))
+
+    def _take(self, rows):  # type: (iterable of int) -> TaskTable
+        """Return a new table with just the given rows."""
+        table = TaskTable()
+        for row in rows:
+            table.append(self.summaries[row], self.owners[row],
+                         self._done_at(row), self.ids[row])
+        return table
+
+    def _done_at(self, row):  # type: (int) -> bool
+        return bool(self._done[row >> 3] >> (row & 7) & 1)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):  # type: (int) -> Task
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('TaskTable row out of range')
+        return Task(self.summaries[row], self.owners[row],
+                    self._done_at(row), self.ids[row])
+
+    def __iter__(self):  # type: () -> iterator of Task
+        for row in range(len(self)):
+            yield self[row]
+
+    def __repr__(self):
+        return '<TaskTable rows={}>'.format(len(self))
@@ -0,0 +1,519 @@
+"""Database wrapper for an append-only log for tasks project.
+
+Every change is appended to a segment file as one JSON line,
+so writes cost the same no matter how big the db is.
+All tasks are kept in memory and rebuilt on open from the last
+checkpoint plus the segments written after it.
+
+Files in db_path:
+tasks_log.checkpoint.json - every live task, the task versions, and the
+                            first segment to replay
+tasks_log.<n>.jsonl       - changes since the checkpoint, oldest first
+
+When enough of the records replayed on open are dead (overwritten or
+deleted), a background thread writes a new checkpoint and drops the
+segments it covers.
+"""
+
+import glob
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+from tasks import planner
+from tasks.compat import replace
+from tasks.counters import TaskCounts
+from tasks.idalloc import IdAllocator
+from tasks.textindex import TextIndex
+from tasks.versions import TaskVersions
+
+_CHECKPOINT = 'tasks_log.checkpoint.json'
+_SEGMENT = 'tasks_log.{}.jsonl'
+_SEGMENT_RE = re.compile(r'tasks_log\.(\d+)\.jsonl$')
+
+
+class TasksDB_Log():  # noqa : E801
+    """Wrapper class for an append-only log.
+
+    The methods in this class need to match
+    all database interaction classes.
+
+    So far, this is:
+    TasksDB_MongoDB found in tasksdb_pymongo.py.
+    TasksDB_TinyDB found in tasksdb_tinydb.py.
+    TasksDB_Log found in tasksdb_log.py.
+    TasksDB_SQLite found in tasksdb_sqlite.py.
+    TasksDB_Mmap found in tasksdb_mmap.py.
+    TasksDB_Remote found in tasksdb_remote.py.
+    """
+
+    indexes = ('id', 'owner')  # what query() can narrow tasks down by
+
+    def __init__(self, db_path, reuse_ids=False, fsync=False,
+                 compact_ratio=0.5, compact_min=1000):
+        # type (str, bool, bool, float, int) -> ()
+        """Open the log in db_path, replaying it into memory.
+
+        With fsync, every append is synced to disk, otherwise only
+        flush(), the end of a batch and stop_tasks_db() sync.
+        Compaction starts once compact_min records would be replayed
+        on open and at least compact_ratio of them are dead.
+        """
+        self._path = db_path
+        self._fsync = fsync
+        self._compact_ratio = compact_ratio
+        self._compact_min = compact_min
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        self._pending = None  # records held by batch()
+        self._tasks = {}  # id -> task dict without id
+        self._owners = {}  # owner -> set of ids
+        self._counts = TaskCounts()
+        self._text = None  # TextIndex, built on first use by search()
+        self._ids = IdAllocator(reuse_ids=reuse_ids)
+        self._versions = TaskVersions()
+        self._replayed = 0  # records replay would process on open
+        self._segment = self._load()
+        self._log = open(self._segment_path(self._segment), 'a')
+
+    def add(self, task):  # type (dict) -> int
+        """Add a task dict to db."""
+        with self._lock:
+            task_id = self._ids.allocate()
+            self._put(task_id, _without_id(task))
+            return task_id
+
+    def add_many(self, tasks):  # type (list[dict]) -> list[int]
+        """Add a list of task dicts to db with a single append."""
+        with self.batch():
+            task_ids = self._ids.reserve(len(tasks))
+            for task_id, task in zip(task_ids, tasks):
+                self._put(task_id, _without_id(task))
+            return task_ids
+
+    def changes_since(self, version):
+        # type (int) -> (list[dict], list[int]|None, int)
+        """Return the tasks added or changed after version, the ids
+        deleted after it, and the current version.
+
+        If the tombstones after version were pruned, every task comes
+        back and the deleted ids are None, see TaskVersions.
+        """
+        with self._lock:
+            changed, deleted, current = self._versions.since(version)
+            return ([_task_dict(i, self._tasks[i]) for i in changed],
+                    deleted, current)
+
+    def get(self, task_id):  # type (int) -> dict
+        """Return a task dict with matching id."""
+        doc = self._tasks.get(task_id)
+        return None if doc is None else _task_dict(task_id, doc)
+
+    def list_tasks(self, owner=None):  # type (str) -> list[dict]
+        """Return list of tasks."""
+        with self._lock:
+            if owner is None:
+                task_ids = sorted(self._tasks)
+            else:
+                task_ids = sorted(self._owners.get(owner, ()))
+            return [_task_dict(i, self._tasks[i]) for i in task_ids]
+
+    def iter_tasks(self, owner=None, page_size=100, after_id=None):
+        # type (str, int, int) -> iterator of list[dict]
+        """Yield lists of up to page_size task dicts, in id order."""
+        with self._lock:
+            if owner is None:
+                task_ids = list(self._tasks)
+            else:
+                task_ids = list(self._owners.get(owner, ()))
+        if after_id is not None:
+            task_ids = [i for i in task_ids if i > after_id]
+        task_ids.sort()
+        for start in range(0, len(task_ids), page_size):
+            page = [self.get(i) for i in task_ids[start:start + page_size]]
+            page = [t for t in page if t is not None]
+            if page:
+                yield page
+
+    def query(self, plan):  # type (Plan) -> list[dict]
+        """Return the task dicts plan asks for, in id order.
+
+        The owner index or the id range picks the tasks to check,
+        see tasks.planner.
+        """
+        where = plan.where
+        if where.impossible:
+            return []
+        with self._lock:
+            if plan.index == 'owner':
+                task_ids = self._owners.get(where.owner, ())
+            elif plan.index == 'id':
+                task_ids = planner.ids_in_range(
+                    self._tasks, where.min_id, where.max_id)
+            else:
+                task_ids = self._tasks
+            found = [t for t in (_task_dict(i, self._tasks[i])
+                                 for i in sorted(task_ids))
+                     if where.matches(t)]
+        return planner.page(found, plan)
+
+    def search(self, terms, owner=None, limit=None):
+        # type (list[str], str, int) -> list[dict]
+        """Return tasks with a word starting with each term, in id order.
+
+        The text index is built on the first search, then kept current.
+        """
+        with self._lock:
+            if self._text is None:
+                self._text = TextIndex.build(
+                    (task_id, doc['summary'])
+                    for task_id, doc in self._tasks.items())
+            found = (_task_dict(task_id, self._tasks[task_id])
+                     for task_id in sorted(self._text.search(terms))
+                     if owner is None or
+                     self._tasks[task_id].get('owner') == owner)
+            return list(islice(found, limit))
+
+    def count(self, owner=None, done=None):  # type (str, bool) -> int
+        """Return number of tasks in db, or of those matching owner/done."""
+        return self._counts.count(owner, done)
+
+    def counts(self):  # type () -> list[list]
+        """Return [owner, done, number of tasks] for each pair in use."""
+        with self._lock:
+            return self._counts.rows()
+
+    def rebuild_counts(self):  # type () -> list[list]
+        """Count the tasks from scratch, return [owner, done, counted,
+        actual] for each count that was wrong."""
+        with self._lock:
+            actual = TaskCounts.of(self._tasks.values())
+            wrong = self._counts.differences(actual)
+            self._counts = actual
+            return wrong
+
+    def update(self, task_id, task):  # type (int, dict) -> ()
+        """Modify task in db with given task_id."""
+        with self._lock:
+            self._check_exists(task_id)
+            fields = _without_id(task)
+            self._append({'op': 'set', 'id': task_id, 'fields': fields})
+            self._apply_set(task_id, fields)
+            self._versions.changed([task_id])
+
+    def update_many(self, task_ids, fields, where=None):
+        # type (list[int]|None, dict, Where|None) -> int
+        """Set fields on the tasks in task_ids, or on every task, that
+        match where, with one record. Return how many there were."""
+        with self._lock:
+            found = self._matching(task_ids, where)
+            if found:
+                fields = _without_id(fields)
+                self._append({'op': 'set_many', 'ids': found,
+                              'fields': fields})
+                for task_id in found:
+                    self._apply_set(task_id, fields)
+                self._versions.changed(found)
+            return len(found)
+
+    def delete(self, task_id):  # type (int) -> ()
+        """Remove a task from db with given task_id."""
+        with self._lock:
+            self._check_exists(task_id)
+            self._append({'op': 'del', 'id': task_id})
+            self._apply_del(task_id)
+            self._versions.deleted([task_id])
+
+    def delete_many(self, task_ids, where=None):
+        # type (list[int]|None, Where|None) -> int
+        """Remove the tasks in task_ids, or every task, that match where,
+        with one record. Return how many there were."""
+        with self._lock:
+            found = self._matching(task_ids, where)
+            if found:
+                self._append({'op': 'del_many', 'ids': found})
+                for task_id in found:
+                    self._apply_del(task_id)
+                self._versions.deleted(found)
+            return len(found)
+
+    def delete_all(self):
+        """Remove all tasks from db."""
+        with self._lock:
+            self._append({'op': 'clear'})
+            self._apply_clear()
+
+    def unique_id(self):  # type () -> int
+        """Return an integer that does not exist in the db."""
+        return self._ids.peek()
+
+    def reserve_ids(self, n):  # type (int) -> list[int]
+        """Reserve n consecutive ids that add() won't hand out."""
+        with self._lock:
+            task_ids = self._ids.reserve(n)
+            self._append({'op': 'ids', 'high_water': task_ids[-1]})
+            return task_ids
+
+    @contextmanager
+    def batch(self):
+        """Hold appends until the outermost batch exits, then write once."""
+        with self._lock:
+            outermost = self._pending is None
+            if outermost:
+                self._pending = []
+            try:
+                yield
+            finally:
+                if outermost:
+                    records, self._pending = self._pending, None
+                    self._write(records, sync=True)
+
+    def flush(self):
+        """Make sure every append is on disk."""
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+    def compact(self):
+        """Write a new checkpoint and drop the segments it replaces."""
+        with self._compact_lock:
+            with self._lock:
+                tasks = dict(self._tasks)
+                ids = self._ids.state()
+                versions = self._versions.state()
+                # new changes go to a fresh segment, the checkpoint
+                # covers everything before it
+                self.flush()
+                self._log.close()
+                self._segment += 1
+                self._log = open(self._segment_path(self._segment), 'a')
+                self._replayed = len(tasks)
+                segment = self._segment
+            _write_checkpoint(self._path, tasks, ids, versions, segment)
+            _remove_segments_before(self._path, segment)
+
+    def stop_tasks_db(self):
+        """Sync and close the log."""
+        while True:
+            with self._lock:
+                compactor = self._compactor
+                if compactor is None:
+                    self.flush()
+                    self._log.close()
+                    return
+            # a finished compaction can start the next one, wait again
+            compactor.join()
+
+    def _check_exists(self, task_id):
+        if task_id not in self._tasks:
+            raise ValueError('id {} not in task database'.format(task_id))
+
+    def _matching(self, task_ids, where):
+        # type (list[int]|None, Where|None) -> list[int]
+        """Return the ids in task_ids, or of every task, whose tasks
+        match where, in order. Without ids, the owner index or the id
+        range picks the tasks."""
+        if task_ids is None:
+            if where is None:
+                task_ids = self._tasks
+            elif where.owner is not None:
+                task_ids = self._owners.get(where.owner, ())
+            else:
+                task_ids = planner.ids_in_range(self._tasks, where.min_id,
+                                                where.max_id)
+        return [i for i in sorted(set(task_ids)) if i in self._tasks and
+                (where is None or
+                 where.matches(_task_dict(i, self._tasks[i])))]
+
+    def _put(self, task_id, doc):
+        self._append({'op': 'put', 'id': task_id, 'task': doc})
+        self._apply_put(task_id, doc)
+        self._versions.changed([task_id])
+
+    def _append(self, record):
+        """Append record to the log, or hold it if in a batch."""
+        if self._pending is not None:
+            self._pending.append(record)
+        else:
+            self._write([record], sync=self._fsync)
+
+    def _write(self, records, sync):
+        if not records:
+            return
+        self._log.write(''.join(json.dumps(r) + '\n' for r in records))
+        self._log.flush()
+        if sync:
+            os.fsync(self._log.fileno())
+        self._replayed += len(records)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """Start compacting in the background if enough records are dead."""
+        total = self._replayed
+        dead = total - len(self._tasks)
+        if (total >= self._compact_min and
+                dead >= total * self._compact_ratio and
+                self._compactor is None):
+            self._compactor = threading.Thread(target=self._compact_async)
+            self._compactor.daemon = True
+            self._compactor.start()
+
+    def _compact_async(self):
+        try:
+            self.compact()
+        finally:
+            with self._lock:
+                self._compactor = None
+                # writes during the compaction may have crossed the
+                # threshold again, _maybe_compact() skipped them
+                self._maybe_compact()
+
+    def _apply_put(self, task_id, doc):
+        old = self._tasks.get(task_id)
+        if old is not None:
+            self._unindex(task_id, old)
+        self._tasks[task_id] = doc
+        self._owners.setdefault(doc.get('owner'), set()).add(task_id)
+        self._counts.add(doc.get('owner'), doc['done'])
+        if self._text is not None:
+            self._text.add(task_id, doc['summary'])
+
+    def _apply_set(self, task_id, fields):
+        doc = dict(self._tasks[task_id])
+        doc.update(fields)
+        self._apply_put(task_id, doc)
+
+    def _apply_del(self, task_id):
+        self._unindex(task_id, self._tasks.pop(task_id))
+        self._ids.release([task_id])
+
+    def _apply_clear(self):
+        if self._tasks:
+            self._versions.deleted(list(self._tasks))
+        self._tasks = {}
+        self._owners = {}
+        self._counts = TaskCounts()
+        self._text = None
+        self._ids.reset()
+
+    def _unindex(self, task_id, doc):
+        task_ids = self._owners[doc.get('owner')]
+        task_ids.discard(task_id)
+        if not task_ids:
+            del self._owners[doc.get('owner')]
+        self._counts.remove(doc.get('owner'), doc['done'])
+        if self._text is not None:
+            self._text.remove(task_id, doc['summary'])
+
+    def _replay(self, record):
+        """Apply one record read back from a segment."""
+        op = record['op']
+        if op == 'put':
+            self._ids.claim(record['id'])
+            self._apply_put(record['id'], record['task'])
+            self._versions.changed([record['id']])
+        elif op == 'set':
+            self._apply_set(record['id'], record['fields'])
+            self._versions.changed([record['id']])
+        elif op == 'set_many':
+            for task_id in record['ids']:
+                self._apply_set(task_id, record['fields'])
+            self._versions.changed(record['ids'])
+        elif op == 'del':
+            self._apply_del(record['id'])
+            self._versions.deleted([record['id']])
+        elif op == 'del_many':
+            for task_id in record['ids']:
+                self._apply_del(task_id)
+            self._versions.deleted(record['ids'])
+        elif op == 'clear':
+            self._apply_clear()
+        elif op == 'ids':
+            self._ids.claim(record['high_water'])
+
+    def _load(self):  # type () -> int
+        """Rebuild memory from checkpoint and segments, return the segment
+        to append to."""
+        segment = 0
+        checkpoint = os.path.join(self._path, _CHECKPOINT)
+        if os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                saved = json.load(f)
+            segment = saved['segment']
+            self._ids = IdAllocator(reuse_ids=self._ids.reuse_ids,
+                                    **saved['ids'])
+            for task_id, doc in saved['tasks'].items():
+                self._apply_put(int(task_id), doc)
+            if 'versions' in saved:
+                self._versions = TaskVersions(**saved['versions'])
+            else:
+                # checkpointed before versions were kept
+                self._versions = TaskVersions.of(self._tasks)
+            self._replayed = len(self._tasks)
+        _remove_segments_before(self._path, segment)
+        for n in _segment_numbers(self._path):
+            with open(self._segment_path(n), 'rb+') as f:
+                for line in iter(f.readline, b''):
+                    if not line.endswith(b'\n'):
+                        # torn write from a crash, drop it so new
+                        # appends start on a fresh line
+                        f.truncate(f.tell() - len(line))
+                        break
+                    self._replay(json.loads(line.decode('utf-8')))
+                    self._replayed += 1
+            segment = n
+        return segment
+
+    def _segment_path(self, n):
+        return os.path.join(self._path, _SEGMENT.format(n))
+
+
+def _segment_numbers(db_path):  # type (str) -> list[int]
+    """Return the numbers of the segments in db_path, in order."""
+    numbers = []
+    for name in glob.glob(os.path.join(db_path, 'tasks_log.*.jsonl')):
+        match = _SEGMENT_RE.search(name)
+        if match:
+            numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+def _remove_segments_before(db_path, segment):
+    for n in _segment_numbers(db_path):
+        if n < segment:
+            os.remove(os.path.join(db_path, _SEGMENT.format(n)))
+
+
+def _write_checkpoint(db_path, tasks, ids, versions, segment):
+    """Atomically replace the checkpoint."""
+    path = os.path.join(db_path, _CHECKPOINT)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'segment': segment, 'ids': ids, 'versions': versions,
+                   'tasks': tasks}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    replace(tmp_path, path)
+
+
+def _without_id(task):  # type (dict) -> dict
+    """Return a copy of task without the id, the log keys tasks by id."""
+    doc = dict(task)
+    doc.pop('id', None)
+    return doc
+
+
+def _task_dict(task_id, doc):  # type (int, dict) -> dict
+    """Return a copy of a stored doc with its id filled in."""
+    task = dict(doc)
+    task['id'] = task_id
+    return task
+
+
+def start_tasks_db(db_path, **options):  # type (str) -> TasksDB_Log
+    """Connect to db, options are passed on to TasksDB_Log."""
+    return TasksDB_Log(db_path, **options)
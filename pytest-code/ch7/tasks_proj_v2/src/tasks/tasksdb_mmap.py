@@ -0,0 +1,633 @@
+"""Database wrapper for a memory-mapped record store for tasks project.
+
+Built for read-heavy use: get() and count() parse nothing.
+
+Files in db_path:
+tasks_db.idx  - a header, then one fixed-size record per id,
+                record n at offset _HEADER_SIZE + (n - 1) * _RECORD.size
+tasks_db.heap - the summary and owner strings the records point into
+
+A deleted task's record keeps the version it was deleted at, as its
+tombstone for changes_since().
+
+Opening maps both files and reads the header, whatever the db size.
+Changed strings are appended to the heap and the old copies stay behind
+as garbage; write_snapshot() writes a fresh, compact copy.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+from tasks import planner
+from tasks.compat import replace
+from tasks.api import TasksException
+from tasks.counters import TaskCounts
+from tasks.idalloc import IdAllocator
+from tasks.textindex import TextIndex
+from tasks.versions import TaskVersions
+
+_IDX = 'tasks_db.idx'
+_HEAP = 'tasks_db.heap'
+_IDX_MAGIC = b'TASKIDX1'
+_HEAP_MAGIC = b'TASKHEAP'
+
+# magic, count of live tasks, id high-water mark, db version
+_HEADER = struct.Struct('<8sQQQ')
+_HEADER_SIZE = 64
+# flags, version, summary offset, summary length, owner offset,
+# owner length; files from before versions have zeros for them
+_RECORD = struct.Struct('<B3xIQIQI')
+_STAMP = struct.Struct('<B3xI')  # the flags and version alone
+_LIVE = 1
+_DONE = 2
+_NO_OWNER = 4
+
+
+class TasksDB_Mmap():  # noqa : E801
+    """Wrapper class for a memory-mapped record store.
+
+    The methods in this class need to match
+    all database interaction classes.
+
+    So far, this is:
+    TasksDB_MongoDB found in tasksdb_pymongo.py.
+    TasksDB_TinyDB found in tasksdb_tinydb.py.
+    TasksDB_Log found in tasksdb_log.py.
+    TasksDB_SQLite found in tasksdb_sqlite.py.
+    TasksDB_Mmap found in tasksdb_mmap.py.
+    TasksDB_Remote found in tasksdb_remote.py.
+    """
+
+    indexes = ('id',)  # what query() can narrow tasks down by
+
+    def __init__(self, db_path, read_only=False):  # type (str, bool) -> ()
+        """Map the db files in db_path, creating them if needed.
+
+        With read_only, the files must exist (see write_snapshot())
+        and every change raises TasksException.
+        """
+        idx_path = os.path.join(db_path, _IDX)
+        heap_path = os.path.join(db_path, _HEAP)
+        if not os.path.exists(idx_path):
+            if read_only:
+                raise TasksException('no snapshot in {}'.format(db_path))
+            _create(idx_path, heap_path)
+        self._read_only = read_only
+        mode = 'rb' if read_only else 'r+b'
+        self._idx_file = open(idx_path, mode)
+        self._heap_file = open(heap_path, mode)
+        self._idx = self._map(self._idx_file, writable=not read_only)
+        self._heap = self._map(self._heap_file, writable=False)
+        self._heap_lock = threading.Lock()  # readers remap the heap
+        self._build_lock = threading.Lock()  # readers build the indexes
+        self._heap_end = os.path.getsize(heap_path)
+        magic, self._count, high_water, self._version = _HEADER.unpack_from(
+            self._idx, 0)
+        if magic != _IDX_MAGIC:
+            raise TasksException('{} is not a tasks index'.format(idx_path))
+        if not self._version and self._count:
+            # a db from before versions, its tasks are at version 1
+            self._version = 1
+        self._ids = IdAllocator(high_water=high_water, save=self._save_ids)
+        self._text = None  # TextIndex, built on first use by search()
+        self._counts = None  # TaskCounts, built on first use by count()
+        # TaskVersions, built on first use by changes_since()
+        self._versions = None
+
+    def add(self, task):  # type (dict) -> int
+        """Add a task dict to db."""
+        self._check_writable()
+        task_id = self._ids.allocate()
+        version = self._stamp([task_id])
+        self._write_task(task_id, task['summary'], task['owner'],
+                         task['done'], version)
+        self._index_text(task_id, None, task['summary'])
+        self._recount(None, task)
+        self._count += 1
+        self._save_header()
+        return task_id
+
+    def add_many(self, tasks):  # type (list[dict]) -> list[int]
+        """Add a list of task dicts to db."""
+        self._check_writable()
+        task_ids = self._ids.reserve(len(tasks))
+        version = self._stamp(task_ids)
+        for task_id, task in zip(task_ids, tasks):
+            self._write_task(task_id, task['summary'], task['owner'],
+                             task['done'], version)
+            self._index_text(task_id, None, task['summary'])
+            self._recount(None, task)
+        self._count += len(tasks)
+        self._save_header()
+        return task_ids
+
+    def changes_since(self, version):
+        # type (int) -> (list[dict], list[int]|None, int)
+        """Return the tasks added or changed after version, the ids
+        deleted after it, and the current version.
+
+        If the tombstones after version were pruned, every task comes
+        back and the deleted ids are None, see TaskVersions.
+
+        The versions are read from every record on first use, then kept
+        current by this process's changes.
+        """
+        changed, deleted, current = self._task_versions().since(version)
+        return [self.get(i) for i in changed], deleted, current
+
+    def get(self, task_id):  # type (int) -> dict
+        """Return a task dict with matching id."""
+        record = self._record(task_id)
+        return None if record is None else self._task_dict(task_id, record)
+
+    def list_tasks(self, owner=None):  # type (str) -> list[dict]
+        """Return list of tasks."""
+        return [t for page in self.iter_tasks(owner, 1000) for t in page]
+
+    def iter_tasks(self, owner=None, page_size=100, after_id=None):
+        # type (str, int, int) -> iterator of list[dict]
+        """Yield lists of up to page_size task dicts, in id order.
+
+        Records are stored in id order, so this is a sequential scan.
+        """
+        want_owner = None if owner is None else owner.encode('utf-8')
+        task_id = 0 if after_id is None else after_id
+        page = []
+        while task_id < self._ids.peek() - 1:
+            task_id += 1
+            record = self._record(task_id)
+            if record is None:
+                continue
+            if (want_owner is not None and
+                    self._owner_bytes(record) != want_owner):
+                continue
+            page.append(self._task_dict(task_id, record))
+            if len(page) == page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def query(self, plan):  # type (Plan) -> list[dict]
+        """Return the task dicts plan asks for, in id order.
+
+        Records sit at fixed offsets by id, so an id range reads only
+        the records in it. done and owner are checked on the record
+        before a summary is decoded, and the scan stops at the limit.
+        """
+        where = plan.where
+        if where.impossible:
+            return []
+        want_owner = (None if where.owner is None
+                      else where.owner.encode('utf-8'))
+        last = self._ids.peek() - 1
+        if where.max_id is not None:
+            last = min(last, where.max_id)
+        end = None if plan.limit is None else plan.offset + plan.limit
+        found = []
+        for task_id in range(max(where.min_id or 1, 1), last + 1):
+            record = self._record(task_id)
+            if record is None:
+                continue
+            if (where.done is not None and
+                    bool(record[0] & _DONE) != where.done):
+                continue
+            if (want_owner is not None and
+                    self._owner_bytes(record) != want_owner):
+                continue
+            task = self._task_dict(task_id, record)
+            if where.matches(task):
+                found.append(task)
+                if len(found) == end:
+                    break
+        return planner.page(found, plan)
+
+    def search(self, terms, owner=None, limit=None):
+        # type (list[str], str, int) -> list[dict]
+        """Return tasks with a word starting with each term, in id order.
+
+        The text index is built on the first search, by a scan of every
+        record, then kept current by this process's changes.
+        """
+        found = (task for task in (self.get(task_id) for task_id
+                                   in sorted(self._text_index().search(terms)))
+                 if owner is None or task['owner'] == owner)
+        return list(islice(found, limit))
+
+    def count(self, owner=None, done=None):  # type (str, bool) -> int
+        """Return number of tasks in db, or of those matching owner/done.
+
+        The total is in the header, the rest are counted by a scan on
+        first use, then kept current by this process's changes.
+        """
+        if owner is None and done is None:
+            return self._count
+        return self._task_counts().count(owner, done)
+
+    def counts(self):  # type () -> list[list]
+        """Return [owner, done, number of tasks] for each pair in use."""
+        return self._task_counts().rows()
+
+    def rebuild_counts(self):  # type () -> list[list]
+        """Count the tasks from scratch, return [owner, done, counted,
+        actual] for each count that was wrong."""
+        actual = TaskCounts.of(t for page in self.iter_tasks(None, 1000)
+                               for t in page)
+        counted = actual if self._counts is None else self._counts
+        wrong = counted.differences(actual)
+        if self._count != actual.count():
+            wrong.append([None, None, self._count, actual.count()])
+            self._count = actual.count()
+            if not self._read_only:
+                self._save_header()
+        self._counts = actual
+        return wrong
+
+    def update(self, task_id, task):  # type (int, dict) -> ()
+        """Set the fields in task on the task with task_id.
+
+        Only changed strings are appended to the heap, setting done
+        rewrites the record alone.
+        """
+        fields = dict((f, v) for f, v in task.items() if f != 'id')
+        if not self.update_many([task_id], fields):
+            raise ValueError('id {} not in task database'.format(task_id))
+
+    def update_many(self, task_ids, fields, where=None):
+        # type (list[int]|None, dict, Where|None) -> int
+        """Set fields on the tasks in task_ids, or on every task, that
+        match where. Return how many there were.
+
+        A new summary or owner is appended to the heap once, and every
+        changed record points at that one copy.
+        """
+        self._check_writable()
+        found = list(self._matching(task_ids, where))
+        if not found:
+            return 0
+        summary = owner = None
+        if 'summary' in fields:
+            summary = self._append_heap(fields['summary'])
+        if fields.get('owner') is not None:
+            owner = self._append_heap(fields['owner'])
+        self._heap_file.flush()
+        version = self._stamp([task_id for task_id, _ in found])
+        for task_id, record in found:
+            flags, _, summary_at, summary_len, owner_at, owner_len = record
+            old = None
+            if self._text is not None or self._counts is not None:
+                old = self._task_dict(task_id, record)
+            if 'done' in fields:
+                flags = (flags & ~_DONE) | (_DONE if fields['done'] else 0)
+            if summary is not None:
+                summary_at, summary_len = summary
+            if owner is not None:
+                flags &= ~_NO_OWNER
+                owner_at, owner_len = owner
+            elif 'owner' in fields:
+                flags |= _NO_OWNER
+                owner_at, owner_len = 0, 0
+            _RECORD.pack_into(self._idx, _offset(task_id), flags, version,
+                              summary_at, summary_len, owner_at, owner_len)
+            if old is not None:
+                new = dict(old, **fields)
+                self._index_text(task_id, old['summary'], new['summary'])
+                self._recount(old, new)
+        return len(found)
+
+    def delete(self, task_id):  # type (int) -> ()
+        """Remove a task from db with given task_id."""
+        self._check_writable()
+        record = self._record(task_id)
+        if record is None:
+            raise ValueError('id {} not in task database'.format(task_id))
+        if self._text is not None or self._counts is not None:
+            old = self._task_dict(task_id, record)
+            self._index_text(task_id, old['summary'], None)
+            self._recount(old, None)
+        version = self._stamp([task_id], deleted=True)
+        _RECORD.pack_into(self._idx, _offset(task_id), 0, version, 0, 0, 0, 0)
+        self._count -= 1
+        self._save_header()
+
+    def delete_many(self, task_ids, where=None):
+        # type (list[int]|None, Where|None) -> int
+        """Remove the tasks in task_ids, or every task, that match where.
+        Return how many there were."""
+        self._check_writable()
+        found = list(self._matching(task_ids, where))
+        if found:
+            version = self._stamp([task_id for task_id, _ in found],
+                                  deleted=True)
+        for task_id, record in found:
+            if self._text is not None or self._counts is not None:
+                old = self._task_dict(task_id, record)
+                self._index_text(task_id, old['summary'], None)
+                self._recount(old, None)
+            _RECORD.pack_into(self._idx, _offset(task_id), 0, version,
+                              0, 0, 0, 0)
+        self._count -= len(found)
+        self._save_header()
+        return len(found)
+
+    def delete_all(self):
+        """Remove all tasks from db.
+
+        Every record is kept as a tombstone. The heap isn't truncated,
+        maps of it would fault past the new end; its strings are left
+        as garbage for write_snapshot() to drop.
+        """
+        self._check_writable()
+        found = [task_id for task_id, _ in self._matching(None, None)]
+        if found:
+            version = self._stamp(found, deleted=True)
+            for task_id in found:
+                _RECORD.pack_into(self._idx, _offset(task_id), 0, version,
+                                  0, 0, 0, 0)
+        self._count = 0
+        self._ids.reset()
+        self._text = None
+        self._counts = None
+
+    def unique_id(self):  # type () -> int
+        """Return an integer that does not exist in the db."""
+        return self._ids.peek()
+
+    def reserve_ids(self, n):  # type (int) -> list[int]
+        """Reserve n consecutive ids that add() won't hand out."""
+        self._check_writable()
+        return self._ids.reserve(n)
+
+    @contextmanager
+    def batch(self):
+        """Group changes, they are synced to disk when the block exits."""
+        yield
+        self.flush()
+
+    def flush(self):
+        """Sync both files to disk."""
+        if not self._read_only:
+            self._idx.flush()
+            self._heap_file.flush()
+            os.fsync(self._heap_file.fileno())
+
+    def stop_tasks_db(self):
+        """Sync and unmap the db."""
+        self.flush()
+        self._idx.close()
+        self._heap.close()
+        self._idx_file.close()
+        self._heap_file.close()
+
+    # Readers share the API's read lock, so two can find an index
+    # missing at once; _build_lock lets one build it, and the other
+    # finds it built.
+
+    def _text_index(self):  # type () -> TextIndex
+        """Return the text index, reading every summary if needed."""
+        with self._build_lock:
+            if self._text is None:
+                self._text = TextIndex.build(
+                    (t['id'], t['summary'])
+                    for page in self.iter_tasks(None, 1000) for t in page)
+        return self._text
+
+    def _task_counts(self):  # type () -> TaskCounts
+        """Return the task counts, counting the tasks if needed."""
+        with self._build_lock:
+            if self._counts is None:
+                self._counts = TaskCounts.of(
+                    t for page in self.iter_tasks(None, 1000) for t in page)
+        return self._counts
+
+    def _task_versions(self):  # type () -> TaskVersions
+        """Return the task versions, reading every record if needed."""
+        with self._build_lock:
+            if self._versions is None:
+                entries = {}
+                last = (len(self._idx) - _HEADER_SIZE) // _RECORD.size
+                for task_id in range(1, last + 1):
+                    flags, version = _STAMP.unpack_from(self._idx,
+                                                        _offset(task_id))
+                    if flags & _LIVE:
+                        # records from before versions have version 0
+                        entries[task_id] = (version or 1, False)
+                    elif version:
+                        entries[task_id] = (version, True)
+                self._versions = TaskVersions(self._version, entries)
+        return self._versions
+
+    def _stamp(self, task_ids, deleted=False):
+        # type (list[int], bool) -> int
+        """Raise the db version for one write that changed or deleted
+        the tasks, return the version to give their records."""
+        self._version += 1
+        if self._versions is not None:
+            # kept in step with self._version, one raise per write
+            if deleted:
+                self._versions.deleted(task_ids)
+            else:
+                self._versions.changed(task_ids)
+        self._save_header()
+        return self._version
+
+    def _recount(self, old, new):  # type (dict|None, dict|None) -> ()
+        """Keep the task counts, if made, current with a changed task."""
+        if self._counts is not None:
+            if old is not None:
+                self._counts.remove(old['owner'], old['done'])
+            if new is not None:
+                self._counts.add(new['owner'], new['done'])
+
+    def _index_text(self, task_id, old_summary, summary):
+        # type (int, str|None, str|None) -> ()
+        """Keep the text index, if built, current with a new summary."""
+        if self._text is not None:
+            if old_summary is not None:
+                self._text.remove(task_id, old_summary)
+            if summary is not None:
+                self._text.add(task_id, summary)
+
+    def _matching(self, task_ids, where):
+        # type (list[int]|None, Where|None) -> iterator of (int, tuple)
+        """Yield (id, record) for the live tasks in task_ids, or in
+        where's id range, that match where, in id order."""
+        if task_ids is None:
+            first, last = 1, self._ids.peek() - 1
+            if where is not None:
+                first = max(where.min_id or 1, 1)
+                if where.max_id is not None:
+                    last = min(last, where.max_id)
+            task_ids = range(first, last + 1)
+        else:
+            task_ids = sorted(set(task_ids))
+        want_owner = (None if where is None or where.owner is None
+                      else where.owner.encode('utf-8'))
+        for task_id in task_ids:
+            record = self._record(task_id)
+            if record is None:
+                continue
+            if where is not None:
+                # done and owner are checked before decoding a summary
+                if (where.done is not None and
+                        bool(record[0] & _DONE) != where.done):
+                    continue
+                if (want_owner is not None and
+                        self._owner_bytes(record) != want_owner):
+                    continue
+                if not where.matches(self._task_dict(task_id, record)):
+                    continue
+            yield task_id, record
+
+    def _check_writable(self):
+        if self._read_only:
+            raise TasksException('db is a read-only snapshot')
+
+    def _record(self, task_id):  # type (int) -> tuple
+        """Return the live record for task_id, or None."""
+        offset = _offset(task_id)
+        if task_id < 1 or offset + _RECORD.size > len(self._idx):
+            return None
+        record = _RECORD.unpack_from(self._idx, offset)
+        return record if record[0] & _LIVE else None
+
+    def _task_dict(self, task_id, record):  # type (int, tuple) -> dict
+        flags, _, summary_at, summary_len = record[:4]
+        owner = self._owner_bytes(record)
+        return {'id': task_id,
+                'summary': self._heap_bytes(summary_at,
+                                            summary_len).decode('utf-8'),
+                'owner': None if owner is None else owner.decode('utf-8'),
+                'done': bool(flags & _DONE)}
+
+    def _owner_bytes(self, record):  # type (tuple) -> bytes|None
+        flags, _, _, _, owner_at, owner_len = record
+        if flags & _NO_OWNER:
+            return None
+        return self._heap_bytes(owner_at, owner_len)
+
+    def _heap_bytes(self, start, length):  # type (int, int) -> bytes
+        # readers run side by side, the lock keeps one from closing the
+        # map another is reading
+        with self._heap_lock:
+            if start + length > len(self._heap):
+                # the heap has grown since it was mapped
+                self._heap.close()
+                self._heap = self._map(self._heap_file, writable=False)
+            return self._heap[start:start + length]
+
+    def _append_heap(self, text):  # type (str) -> (int, int)
+        """Append text to the heap, return its offset and length."""
+        data = text.encode('utf-8')
+        start = self._heap_end
+        self._heap_file.seek(start)
+        self._heap_file.write(data)
+        self._heap_end += len(data)
+        return start, len(data)
+
+    def _write_task(self, task_id, summary, owner, done, version):
+        flags = _LIVE | (_DONE if done else 0)
+        summary_at, summary_len = self._append_heap(summary)
+        if owner is None:
+            flags |= _NO_OWNER
+            owner_at, owner_len = 0, 0
+        else:
+            owner_at, owner_len = self._append_heap(owner)
+        # the heap must be readable before a record points into it
+        self._heap_file.flush()
+        offset = _offset(task_id)
+        if offset + _RECORD.size > len(self._idx):
+            self._grow(offset + _RECORD.size)
+        _RECORD.pack_into(self._idx, offset, flags, version, summary_at,
+                          summary_len, owner_at, owner_len)
+
+    def _grow(self, size):
+        """Make the index file at least size bytes, doubling it."""
+        self._idx.close()
+        self._idx_file.truncate(max(size, 2 * os.fstat(
+            self._idx_file.fileno()).st_size))
+        self._idx = self._map(self._idx_file, writable=True)
+
+    def _save_ids(self, state):
+        self._save_header(state['high_water'])
+
+    def _save_header(self, high_water=None):
+        if high_water is None:
+            high_water = self._ids.state()['high_water']
+        _HEADER.pack_into(self._idx, 0, _IDX_MAGIC, self._count, high_water,
+                          self._version)
+
+    @staticmethod
+    def _map(f, writable):
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        return mmap.mmap(f.fileno(), 0, access=access)
+
+
+def _offset(task_id):  # type (int) -> int
+    """Return where the record for task_id starts in the index."""
+    return _HEADER_SIZE + (task_id - 1) * _RECORD.size
+
+
+def _create(idx_path, heap_path, count=0, high_water=0):
+    """Write an empty index and heap."""
+    with open(idx_path, 'wb') as f:
+        f.write(_HEADER.pack(_IDX_MAGIC, count, high_water, 0).ljust(
+            _HEADER_SIZE, b'\0'))
+    with open(heap_path, 'wb') as f:
+        f.write(_HEAP_MAGIC)
+
+
+def write_snapshot(db_path, pages):
+    # type (str, iterator of list[dict]) -> int
+    """Write tasks to a new memory-mapped db in db_path, return the count.
+
+    pages is what any db's iter_tasks() returns, in id order.
+    Versions aren't copied, the snapshot's tasks are all at version 1.
+    The files are written under temporary names and renamed into
+    place at the end, so readers never see half a snapshot.
+    """
+    idx_path = os.path.join(db_path, _IDX)
+    heap_path = os.path.join(db_path, _HEAP)
+    count = high_water = 0
+    with open(idx_path + '.tmp', 'wb') as idx, \
+            open(heap_path + '.tmp', 'wb') as heap:
+        idx.write(b'\0' * _HEADER_SIZE)
+        heap.write(_HEAP_MAGIC)
+        heap_end = len(_HEAP_MAGIC)
+        for page in pages:
+            for task in page:
+                flags = _LIVE | (_DONE if task['done'] else 0)
+                summary = task['summary'].encode('utf-8')
+                heap.write(summary)
+                summary_at, heap_end = heap_end, heap_end + len(summary)
+                if task['owner'] is None:
+                    flags |= _NO_OWNER
+                    owner_at, owner = 0, b''
+                else:
+                    owner = task['owner'].encode('utf-8')
+                    heap.write(owner)
+                    owner_at, heap_end = heap_end, heap_end + len(owner)
+                # gaps between ids read back as zeros: not live
+                idx.seek(_offset(task['id']))
+                idx.write(_RECORD.pack(flags, 0, summary_at, len(summary),
+                                       owner_at, len(owner)))
+                count += 1
+                high_water = task['id']
+        idx.seek(0)
+        idx.write(_HEADER.pack(_IDX_MAGIC, count, high_water, 0))
+        for f in (idx, heap):
+            f.flush()
+            os.fsync(f.fileno())
+    # the heap goes first, so a new index never points into an old heap
+    replace(heap_path + '.tmp', heap_path)
+    replace(idx_path + '.tmp', idx_path)
+    return count
+
+
+def start_tasks_db(db_path, **options):  # type (str) -> TasksDB_Mmap
+    """Connect to db, options are passed on to TasksDB_Mmap."""
+    return TasksDB_Mmap(db_path, **options)
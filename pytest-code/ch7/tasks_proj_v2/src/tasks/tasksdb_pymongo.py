@@ -1,9 +1,22 @@
-"""Database wrapper for MongoDB for tasks project."""
+"""Database wrapper for MongoDB for tasks project.
+
+Every write takes a new db version from the 'version' counter and
+stamps it on the tasks it changes; deleted ids go in task_tombstones.
+With many clients writing, the version is taken before the write
+lands, so changes_since() can miss a write still in flight; readers
+that need every change should poll with some overlap.
+"""
 
 import os
 import pymongo
+import re
 import subprocess
+import threading
 import time
+from contextlib import contextmanager
+
+from tasks.idalloc import IdAllocator
+from tasks.textindex import words
 
 
 class TasksDB_MongoDB():  # noqa: E801
@@ -14,59 +27,254 @@ class TasksDB_MongoDB():  # noqa: E801
 
     So far, this is:
     TasksDB_TinyDB found in tasksdb_tinydb.py.
+    TasksDB_Log found in tasksdb_log.py.
+    TasksDB_SQLite found in tasksdb_sqlite.py.
+    TasksDB_Mmap found in tasksdb_mmap.py.
+    TasksDB_Remote found in tasksdb_remote.py.
     """
 
-    def __init__(self, db_path):  # type (str) -> ()
-        """Start MongoDB client and connect to db."""
+    # what query() can narrow tasks down by, done alone can't use the
+    # owner+done index
+    indexes = ('id', 'owner')
+
+    def __init__(self, db_path, reuse_ids=False, uri=None,
+                 ready_timeout=30.0):
+        # type (str, bool, str, float) -> ()
+        """Connect to db, starting a mongod for db_path unless given a uri.
+
+        With uri, attach to the server already running there, through
+        a MongoClient shared by everything in this process; the db is
+        the one named in the uri, or task_db.
+        A mongod started here must answer a ping within ready_timeout
+        seconds, and is stopped by stop_tasks_db().
+        With reuse_ids, ids of deleted tasks are handed out again.
+        """
         self._process = None
         self._client = None
-        self._start_mongod(db_path)
+        self._reuse_ids = reuse_ids
+        if uri is None:
+            self._start_mongod(db_path)
+            # the probe fails pings fast, _wait_until_ready() does the
+            # waiting; the client kept has the default timeouts
+            probe = pymongo.MongoClient(serverSelectionTimeoutMS=250)
+            try:
+                _wait_until_ready(probe, self._process, ready_timeout)
+            finally:
+                probe.close()
+            self._client = pymongo.MongoClient()
+        else:
+            self._client = _shared_client(uri)
         self._connect()
 
     def add(self, task):  # type (dict) -> int
         """Add a task dict to db."""
-        task['_id'] = self._get_next_task_id()
-        return self._db.task_list.insert_one(task).inserted_id
+        doc = _task_doc(self._ids.allocate(), task, self._next_version())
+        return self._db.task_list.insert_one(doc).inserted_id
+
+    def add_many(self, tasks):  # type (list[dict]) -> list[int]
+        """Add a list of task dicts to db.
+
+        The ids are reserved with one $inc and the tasks written with
+        one unordered insert_many, two round trips for the whole list.
+        """
+        version = self._next_version()
+        docs = [_task_doc(task_id, task, version) for task_id, task
+                in zip(self._ids.reserve(len(tasks)), tasks)]
+        return self._db.task_list.insert_many(docs,
+                                              ordered=False).inserted_ids
+
+    def changes_since(self, version):
+        # type (int) -> (list[dict], list[int], int)
+        """Return the tasks added or changed after version, the ids
+        deleted after it, and the current version.
+
+        The version indexes on task_list and task_tombstones find them.
+        Tombstones aren't removed when an id is added again, the newer
+        task hides them here instead.
+        """
+        current = self._db.counters.find_one(_VERSION_KEY)['seq']
+        query = {'version': {'$gt': version, '$lte': current}}
+        tasks = list(self._db.task_list.aggregate(
+            [{'$match': query}, {'$sort': {'version': 1, '_id': 1}},
+             {'$project': _AS_TASK}]))
+        changed = set(t['id'] for t in tasks)
+        tombstones = self._db.task_tombstones.find(query).sort(
+            [('version', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)])
+        return (tasks, [t['_id'] for t in tombstones
+                        if t['_id'] not in changed], current)
 
     def get(self, task_id):
         """Return a task dict with matching id."""
-        task_dict = self._db.task_list.find_one({'_id': task_id})
+        task_dict = self._db.task_list.find_one({'_id': task_id},
+                                                {'words': 0, 'version': 0})
+        if task_dict is None:
+            return None
         task_dict['id'] = task_dict.pop('_id')
         return task_dict
 
-    def list_tasks(self, owner=None):  # type (str) -> list[dict]
-        """Return list of tasks."""
-        if owner is None:
-            all = self._db.task_list.find()
-        else:
-            all = self._db.task_list.find({'owner': owner})
-        for task_dict in all:
-            task_dict['id'] = task_dict.pop('_id')
-        return all
+    def list_tasks(self, owner=None, batch_size=1000):
+        # type (str, int) -> list[dict]
+        """Return list of tasks, fetched batch_size at a time."""
+        return list(self._find(_filter(owner), batch_size))
+
+    def iter_tasks(self, owner=None, page_size=100, after_id=None):
+        # type (str, int, int) -> iterator of list[dict]
+        """Yield lists of up to page_size task dicts, in id order.
+
+        The server sends page_size tasks per batch, one page a batch.
+        """
+        query = _filter(owner)
+        if after_id is not None:
+            query['_id'] = {'$gt': after_id}
+        page = []
+        for task_dict in self._find(query, page_size):
+            page.append(task_dict)
+            if len(page) == page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def query(self, plan):  # type (Plan) -> list[dict]
+        """Return the task dicts plan asks for, in id order.
+
+        The whole plan is one aggregate on the server: plan.where is
+        the $match, the offset and limit are $skip and $limit, and the
+        planned index is the hint.
+        """
+        if plan.where.impossible or plan.limit == 0:
+            return []
+        pipeline = [{'$match': _where_filter(plan.where)},
+                    {'$sort': {'_id': 1}}]
+        if plan.offset:
+            pipeline.append({'$skip': plan.offset})
+        if plan.limit is not None:
+            pipeline.append({'$limit': plan.limit})
+        pipeline.append({'$project': _AS_TASK})
+        options = {}
+        if plan.index in _HINTS:
+            options['hint'] = _HINTS[plan.index]
+        return list(self._db.task_list.aggregate(pipeline, **options))
+
+    def search(self, terms, owner=None, limit=None):
+        # type (list[str], str, int) -> list[dict]
+        """Return tasks with a word starting with each term, in id order.
+
+        Every task stores its summary's words in a 'words' array, and
+        each term is an anchored regex the multikey index on it answers.
+        """
+        if limit == 0:
+            return []
+        tests = [{'words': {'$regex': '^' + re.escape(term)}}
+                 for term in terms]
+        if owner is not None:
+            tests.append({'owner': owner})
+        pipeline = [{'$match': {'$and': tests}}, {'$sort': {'_id': 1}}]
+        if limit is not None:
+            pipeline.append({'$limit': limit})
+        pipeline.append({'$project': _AS_TASK})
+        return list(self._db.task_list.aggregate(pipeline))
 
-    def count(self):  # type () -> int
-        """Return number of tasks in db."""
-        return self._db.task_list.count()
+    def count(self, owner=None, done=None):  # type (str, bool) -> int
+        """Return number of tasks in db, or of those matching owner/done.
+
+        With no filter this reads the collection metadata. The
+        owner+done index answers an owner filter, with or without done;
+        done alone isn't a prefix of it, and scans the collection.
+        """
+        query = _filter(owner, done)
+        if not query:
+            return self._db.task_list.estimated_document_count()
+        return self._db.task_list.count_documents(query)
+
+    def counts(self):  # type () -> list[list]
+        """Return [owner, done, number of tasks] for each pair in use."""
+        groups = self._db.task_list.aggregate([
+            {'$group': {'_id': {'owner': '$owner', 'done': '$done'},
+                        'n': {'$sum': 1}}}])
+        return [[g['_id'].get('owner'), g['_id']['done'], g['n']]
+                for g in groups]
+
+    def rebuild_counts(self):  # type () -> list[list]
+        """Return [], the owner+done index keeps every count exact."""
+        return []
 
     def update(self, task_id, task):  # type (int, dict) -> ()
-        """Modify task in db with given task_id."""
-        self._db.tasks_list.update_one({'_id': task_id}, task)
+        """Set the fields in task on the task with task_id, with $set."""
+        fields = dict(task)
+        fields.pop('id', None)
+        if 'summary' in fields:
+            fields['words'] = words(fields['summary'])
+        fields['version'] = self._next_version()
+        reply = self._db.task_list.update_one({'_id': task_id},
+                                              {'$set': fields})
+        if reply.matched_count == 0:
+            raise ValueError('id {} not in task database'.format(task_id))
 
     def delete(self, task_id):  # type (int) -> ()
         """Remove a task from db with given task_id."""
         reply = self._db.task_list.delete_one({'_id': task_id})
         if reply.deleted_count == 0:
             raise ValueError('id {} not in task database'.format(str(task_id)))
+        self._ids.release([task_id])
+        self._tombstone([task_id])
+
+    def update_many(self, task_ids, fields, where=None):
+        # type (list[int]|None, dict, Where|None) -> int
+        """Set fields on the tasks in task_ids, or on every task, that
+        match where, with one update_many. Return how many matched."""
+        fields = dict(fields)
+        fields.pop('id', None)
+        if task_ids is not None and not task_ids or not fields:
+            return 0
+        if 'summary' in fields:
+            fields['words'] = words(fields['summary'])
+        fields['version'] = self._next_version()
+        reply = self._db.task_list.update_many(_many_filter(task_ids, where),
+                                               {'$set': fields})
+        return reply.matched_count
+
+    def delete_many(self, task_ids, where=None):
+        # type (list[int]|None, Where|None) -> int
+        """Remove the tasks in task_ids, or every task, that match where,
+        with one delete_many. Return how many were removed.
+
+        The ids are found first, for their tombstones and the free list.
+        """
+        if task_ids is not None and not task_ids:
+            return 0
+        found = [d['_id'] for d in self._db.task_list.find(
+            _many_filter(task_ids, where), {'_id': 1})]
+        if not found:
+            return 0
+        reply = self._db.task_list.delete_many({'_id': {'$in': found}})
+        self._ids.release(found)
+        self._tombstone(found)
+        return reply.deleted_count
 
     def unique_id(self):  # type () -> int
         """Return an integer that does not exist in the db."""
-        tail_task_ids = self._db.counters.find_one({'_id': 'tasksid'})
-        uid = tail_task_ids['seq'] + 1
-        return uid
+        return self._ids.peek()
+
+    def reserve_ids(self, n):  # type (int) -> list[int]
+        """Reserve n consecutive ids that add() won't hand out."""
+        return self._ids.reserve(n)
 
     def delete_all(self):
         """Remove all tasks from db."""
+        found = [d['_id'] for d in self._db.task_list.find({}, {'_id': 1})]
         self._db.task_list.drop()
+        self._create_indexes()
+        self._ids.reset()
+        if found:
+            self._tombstone(found)
+
+    def batch(self):
+        """Return a context manager grouping writes, a no-op for MongoDB."""
+        return _no_batch()
+
+    def flush(self):
+        """Write any unwritten changes, MongoDB writes right away."""
 
     def stop_tasks_db(self):
         """Disconnect from db."""
@@ -81,42 +289,242 @@ class TasksDB_MongoDB():  # noqa: E801
         assert self._process, "mongod process failed to start"
 
     def _stop_mongod(self):
-        if self._client:
-            self._client = None
         if self._process:
+            # only a client made for our own mongod is closed,
+            # shared clients stay open for the rest of the process
+            self._client.close()
             self._process.terminate()
             self._process.wait()
             self._devnull.close()
             self._process = None
+        self._client = None
+
+    def _find(self, query, batch_size):  # type (dict, int) -> iterator
+        """Return task dicts matching query, in id order.
+
+        _id is renamed to id on the server, not per document here.
+        """
+        return self._db.task_list.aggregate(
+            [{'$match': query}, {'$sort': {'_id': 1}}, {'$project': _AS_TASK}],
+            batchSize=batch_size)
 
     def _connect(self):
-        if self._process and (not self._client or not self._db):
-            for i in range(3):
-                try:
-                    self._client = pymongo.MongoClient()
-
-                except pymongo.errors.ConnectionFailure:
-                    time.sleep(0.1)
-                    continue
-                else:
-                    break
-            if self._client:
-                self._db = self._client.task_db
-                self._db.counters.insert_one({'_id': 'tasksid', 'seq': 0})
-
-    def _reset_task_id(self):
-        self._db.counters.find_one_and_update({'_id': 'tasksid'},
-                                              {'$set': {'seq': 0}})
-
-    def _get_next_task_id(self):
-        ret = self._db.counters.find_one_and_update({'_id': 'tasksid'},
-                                                    {'$inc': {'seq': 1}})
-        return ret['seq']
+        self._db = self._client.get_default_database(default='task_db')
+        self._create_indexes()
+        self._db.task_tombstones.create_index('version')
+        self._add_missing_words()
+        self._add_missing_versions()
+        self._ids = _MongoIdAllocator(self._db.counters,
+                                      reuse_ids=self._reuse_ids)
+
+    def _create_indexes(self):
+        # also serves owner-only lookups, owner being its prefix
+        self._db.task_list.create_index([('owner', pymongo.ASCENDING),
+                                         ('done', pymongo.ASCENDING)])
+        self._db.task_list.create_index('words')
+        self._db.task_list.create_index('version')
+
+    def _add_missing_words(self):
+        """Give tasks stored before search() existed their words."""
+        missing = self._db.task_list.find({'words': {'$exists': False}},
+                                          {'summary': 1})
+        for doc in missing:
+            self._db.task_list.update_one(
+                {'_id': doc['_id']},
+                {'$set': {'words': words(doc.get('summary') or '')}})
+
+    def _add_missing_versions(self):
+        """Start the version counter, tasks stored before versions
+        were kept count as changed at version 1."""
+        self._db.counters.update_one(_VERSION_KEY,
+                                     {'$setOnInsert': {'seq': 0}},
+                                     upsert=True)
+        reply = self._db.task_list.update_many(
+            {'version': {'$exists': False}}, {'$set': {'version': 1}})
+        if reply.modified_count:
+            self._db.counters.update_one(_VERSION_KEY,
+                                         {'$max': {'seq': 1}})
+
+    def _next_version(self):  # type () -> int
+        """Raise the db version for one write, return the new version."""
+        after = self._db.counters.find_one_and_update(
+            _VERSION_KEY, {'$inc': {'seq': 1}},
+            return_document=pymongo.ReturnDocument.AFTER)
+        return after['seq']
+
+    def _tombstone(self, task_ids):  # type (list[int]) -> ()
+        """Record task_ids as deleted at a new version."""
+        version = self._next_version()
+        tombstones = self._db.task_tombstones
+        tombstones.delete_many({'_id': {'$in': task_ids}})
+        try:
+            tombstones.insert_many(
+                [{'_id': task_id, 'version': version} for task_id in task_ids],
+                ordered=False)
+        except pymongo.errors.BulkWriteError as e:
+            # another client deleting the same ids wrote theirs first
+            if any(error['code'] != 11000
+                   for error in e.details['writeErrors']):
+                raise
 
     def _disconnect(self):
         self._db = None
 
 
-def start_tasks_db(db_path):  # type (str) -> TasksDB_MongoDB object
-    """Connect to db."""
-    return TasksDB_MongoDB(db_path)
+class _MongoIdAllocator(IdAllocator):
+    """IdAllocator that keeps its state in the counters collection.
+
+    The high-water mark is 'seq' and the free list is 'free' in the
+    'tasksid' document, so ids are reserved atomically on the server
+    and every client sharing the db gets distinct ids.
+    """
+
+    _key = {'_id': 'tasksid'}
+
+    def __init__(self, counters, reuse_ids=False):
+        super(_MongoIdAllocator, self).__init__(reuse_ids=reuse_ids)
+        self._counters = counters
+        counters.update_one(self._key,
+                            {'$setOnInsert': {'seq': 0, 'free': []}},
+                            upsert=True)
+
+    def peek(self):
+        state = self.state()
+        if self.reuse_ids and state['free']:
+            return state['free'][-1]
+        return state['high_water'] + 1
+
+    def allocate(self):
+        if self.reuse_ids:
+            has_free = dict(self._key, **{'free.0': {'$exists': True}})
+            before = self._counters.find_one_and_update(
+                has_free, {'$pop': {'free': 1}})
+            if before is not None:
+                return before['free'][-1]
+        return self._advance(1)
+
+    def release(self, task_ids):
+        if self.reuse_ids and task_ids:
+            freed = sorted(task_ids, reverse=True)
+            self._counters.update_one(
+                self._key, {'$push': {'free': {'$each': freed}}})
+
+    def reset(self):
+        self._counters.update_one(self._key,
+                                  {'$set': {'seq': 0, 'free': []}})
+
+    def state(self):
+        doc = self._counters.find_one(self._key)
+        return {'high_water': doc['seq'], 'free': doc.get('free', [])}
+
+    def _advance(self, n):
+        after = self._counters.find_one_and_update(
+            self._key, {'$inc': {'seq': n}},
+            return_document=pymongo.ReturnDocument.AFTER)
+        return after['seq'] - n + 1
+
+
+# the counters document holding the db version
+_VERSION_KEY = {'_id': 'version'}
+# $project stage turning a stored doc into a task dict
+_AS_TASK = {'_id': 0, 'id': '$_id', 'summary': 1, 'owner': 1, 'done': 1}
+# planned index -> aggregate hint
+_HINTS = {'id': [('_id', pymongo.ASCENDING)],
+          'owner': [('owner', pymongo.ASCENDING), ('done', pymongo.ASCENDING)]}
+
+
+def _task_doc(task_id, task, version):  # type (int, dict, int) -> dict
+    """Return the document to store for a new task, leaving task as is."""
+    doc = dict(task)
+    doc.pop('id', None)
+    doc['_id'] = task_id
+    doc['words'] = words(doc['summary'])
+    doc['version'] = version
+    return doc
+
+
+def _filter(owner=None, done=None):  # type (str, bool) -> dict
+    """Return the query for tasks with owner and done, None matching all."""
+    query = {}
+    if owner is not None:
+        query['owner'] = owner
+    if done is not None:
+        query['done'] = done
+    return query
+
+
+def _where_filter(where):  # type (Where) -> dict
+    """Return the query for the tasks where matches."""
+    tests = [_filter(where.owner, where.done)]
+    ids = {}
+    if where.min_id is not None:
+        ids['$gte'] = where.min_id
+    if where.max_id is not None:
+        ids['$lte'] = where.max_id
+    if ids:
+        tests.append({'_id': ids})
+    if where.summary_prefix is not None:
+        tests.append({'summary': {
+            '$regex': '^' + re.escape(where.summary_prefix)}})
+    for text in where.summary_contains:
+        tests.append({'summary': {'$regex': re.escape(text)}})
+    tests = [t for t in tests if t]
+    if len(tests) > 1:
+        return {'$and': tests}
+    return tests[0] if tests else {}
+
+
+def _many_filter(task_ids, where):
+    # type (list[int]|None, Where|None) -> dict
+    """Return the query for update_many() and delete_many()."""
+    tests = [] if where is None else [_where_filter(where)]
+    if task_ids is not None:
+        tests.append({'_id': {'$in': list(task_ids)}})
+    tests = [t for t in tests if t]
+    if len(tests) > 1:
+        return {'$and': tests}
+    return tests[0] if tests else {}
+
+
+# uri -> (pid, MongoClient), MongoClient isn't safe to use after a fork
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared_client(uri):  # type (str) -> pymongo.MongoClient
+    """Return this process's pooled MongoClient for uri."""
+    with _clients_lock:
+        pid, client = _clients.get(uri, (None, None))
+        if pid != os.getpid():
+            client = pymongo.MongoClient(uri)
+            _clients[uri] = (os.getpid(), client)
+        return client
+
+
+def _wait_until_ready(client, process, timeout):
+    # type (pymongo.MongoClient, subprocess.Popen, float) -> ()
+    """Ping the server until it answers, backing off exponentially."""
+    deadline = time.time() + timeout
+    delay = 0.01
+    while True:
+        try:
+            client.admin.command('ping')
+            return
+        except pymongo.errors.ConnectionFailure:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError('mongod exited with code {}'.format(
+                    process.returncode))
+            if time.time() + delay > deadline:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+
+@contextmanager
+def _no_batch():
+    yield
+
+
+def start_tasks_db(db_path, **options):  # type (str) -> TasksDB_MongoDB
+    """Connect to db, options are passed on to TasksDB_MongoDB."""
+    return TasksDB_MongoDB(db_path, **options)
@@ -0,0 +1,189 @@
+"""Database wrapper for a running ``tasks serve`` for tasks project.
+
+Every call is sent to the server's Unix socket as one JSON line,
+and answered with one JSON line, see tasks.server.
+"""
+
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+
+from tasks.api import TasksException
+
+SOCKET_NAME = 'tasks.sock'
+
+# errors raised in the server that are raised again as themselves,
+# anything else becomes a TasksException
+_ERRORS = {'TypeError': TypeError, 'ValueError': ValueError}
+
+
+def socket_path(db_path):  # type (str) -> str
+    """Return where the server for db_path listens."""
+    return os.path.join(db_path, SOCKET_NAME)
+
+
+class TasksDB_Remote():  # noqa : E801
+    """Wrapper class for a db kept open by ``tasks serve``.
+
+    The methods in this class need to match
+    all database interaction classes.
+
+    So far, this is:
+    TasksDB_MongoDB found in tasksdb_pymongo.py.
+    TasksDB_TinyDB found in tasksdb_tinydb.py.
+    TasksDB_Log found in tasksdb_log.py.
+    TasksDB_SQLite found in tasksdb_sqlite.py.
+    TasksDB_Mmap found in tasksdb_mmap.py.
+    TasksDB_Remote found in tasksdb_remote.py.
+    """
+
+    def __init__(self, db_path, timeout=None):  # type (str, float) -> ()
+        """Connect to the server for db_path.
+
+        Raises socket.error, an EnvironmentError, if none is running.
+        """
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(socket_path(db_path))
+        except socket.error:
+            self._sock.close()
+            raise
+        self._replies = self._sock.makefile('rb')
+        self._lock = threading.Lock()
+        self._indexes = None
+
+    @property
+    def indexes(self):  # type () -> tuple
+        """The indexes of the server's db, asked for on first use."""
+        if self._indexes is None:
+            self._indexes = tuple(self._call('indexes'))
+        return self._indexes
+
+    def add(self, task):  # type (dict) -> int
+        """Add a task dict to db."""
+        return self._call('add', task)
+
+    def add_many(self, tasks):  # type (list[dict]) -> list[int]
+        """Add a list of task dicts to db in one request."""
+        return self._call('add_many', tasks)
+
+    def changes_since(self, version):
+        # type (int) -> (list[dict], list[int], int)
+        """Return the tasks changed and the ids deleted after version,
+        and the current version."""
+        tasks, deleted, current = self._call('changes_since', version)
+        return tasks, deleted, current
+
+    def get(self, task_id):  # type (int) -> dict
+        """Return a task dict with matching id."""
+        return self._call('get', task_id)
+
+    def list_tasks(self, owner=None):  # type (str) -> list[dict]
+        """Return list of tasks."""
+        return [t for page in self.iter_tasks(owner, 1000) for t in page]
+
+    def iter_tasks(self, owner=None, page_size=100, after_id=None):
+        # type (str, int, int) -> iterator of list[dict]
+        """Yield lists of up to page_size task dicts, in id order.
+
+        Each page is its own request, starting after the last id seen.
+        """
+        while True:
+            page = self._call('page', owner, page_size, after_id)
+            if not page:
+                return
+            yield page
+            after_id = page[-1]['id']
+
+    def query(self, plan):  # type (Plan) -> list[dict]
+        """Return the task dicts plan asks for, run by the server's db."""
+        return self._call('query', plan.as_dict())
+
+    def search(self, terms, owner=None, limit=None):
+        # type (list[str], str, int) -> list[dict]
+        """Return tasks with a word starting with each term, in id order."""
+        return self._call('search', terms, owner, limit)
+
+    def count(self, owner=None, done=None):  # type (str, bool) -> int
+        """Return number of tasks in db, or of those matching owner/done."""
+        return self._call('count', owner, done)
+
+    def counts(self):  # type () -> list[list]
+        """Return [owner, done, number of tasks] for each pair in use."""
+        return self._call('counts')
+
+    def rebuild_counts(self):  # type () -> list[list]
+        """Have the server's db count its tasks from scratch."""
+        return self._call('rebuild_counts')
+
+    def update(self, task_id, task):  # type (int, dict) -> ()
+        """Modify task in db with given task_id."""
+        self._call('update', task_id, task)
+
+    def update_many(self, task_ids, fields, where=None):
+        # type (list[int]|None, dict, Where|None) -> int
+        """Set fields on the matching tasks, in the server's db."""
+        return self._call('update_many', task_ids, fields,
+                          None if where is None else where.as_dict())
+
+    def delete(self, task_id):  # type (int) -> ()
+        """Remove a task from db with given task_id."""
+        self._call('delete', task_id)
+
+    def delete_many(self, task_ids, where=None):
+        # type (list[int]|None, Where|None) -> int
+        """Remove the matching tasks, in the server's db."""
+        return self._call('delete_many', task_ids,
+                          None if where is None else where.as_dict())
+
+    def delete_all(self):
+        """Remove all tasks from db."""
+        self._call('delete_all')
+
+    def unique_id(self):  # type () -> int
+        """Return an integer that does not exist in the db."""
+        return self._call('unique_id')
+
+    def reserve_ids(self, n):  # type (int) -> list[int]
+        """Reserve n consecutive ids that add() won't hand out."""
+        return self._call('reserve_ids', n)
+
+    @contextmanager
+    def batch(self):
+        """Flush when the block exits.
+
+        Other clients' calls can land between the ones in the block,
+        so the server doesn't hold a batch open for one client.
+        """
+        yield
+        self.flush()
+
+    def flush(self):
+        """Ask the server to write any changes it is holding."""
+        self._call('flush')
+
+    def stop_tasks_db(self):
+        """Disconnect from the server, which keeps running."""
+        self._replies.close()
+        self._sock.close()
+
+    def _call(self, method, *args):
+        request = json.dumps({'method': method, 'args': args}) + '\n'
+        with self._lock:
+            self._sock.sendall(request.encode('utf-8'))
+            line = self._replies.readline()
+        if not line:
+            raise TasksException('tasks server closed the connection')
+        reply = json.loads(line.decode('utf-8'))
+        if 'error' in reply:
+            raise _ERRORS.get(reply['error'], TasksException)(
+                reply['message'])
+        return reply['result']
+
+
+def start_tasks_db(db_path, **options):  # type (str) -> TasksDB_Remote
+    """Connect to the server, options are passed on to TasksDB_Remote."""
+    return TasksDB_Remote(db_path, **options)
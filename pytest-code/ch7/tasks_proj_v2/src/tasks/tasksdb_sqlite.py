@@ -0,0 +1,579 @@
+"""Database wrapper for SQLite for tasks project."""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from tasks.counters import differences
+from tasks.idalloc import IdAllocator
+from tasks.textindex import prefix_end, words
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    summary TEXT,
+    owner TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (owner);
+CREATE INDEX IF NOT EXISTS tasks_done ON tasks (done);
+CREATE INDEX IF NOT EXISTS tasks_version ON tasks (version);
+CREATE TABLE IF NOT EXISTS id_high_water (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    high_water INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS id_free (id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS task_words (
+    word TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (word, id)
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO id_high_water (id, high_water) VALUES (1, 0);
+CREATE TABLE IF NOT EXISTS task_counts (
+    owner TEXT,
+    done INTEGER NOT NULL,
+    n INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS task_counts_key
+    ON task_counts (owner, done);
+CREATE TRIGGER IF NOT EXISTS task_counts_insert AFTER INSERT ON tasks
+BEGIN
+    INSERT INTO task_counts (owner, done, n)
+        SELECT NEW.owner, NEW.done, 0 WHERE NOT EXISTS (
+            SELECT 1 FROM task_counts
+            WHERE owner IS NEW.owner AND done = NEW.done);
+    UPDATE task_counts SET n = n + 1
+        WHERE owner IS NEW.owner AND done = NEW.done;
+END;
+CREATE TRIGGER IF NOT EXISTS task_counts_delete AFTER DELETE ON tasks
+BEGIN
+    UPDATE task_counts SET n = n - 1
+        WHERE owner IS OLD.owner AND done = OLD.done;
+END;
+CREATE TRIGGER IF NOT EXISTS task_counts_update
+    AFTER UPDATE OF owner, done ON tasks
+BEGIN
+    UPDATE task_counts SET n = n - 1
+        WHERE owner IS OLD.owner AND done = OLD.done;
+    INSERT INTO task_counts (owner, done, n)
+        SELECT NEW.owner, NEW.done, 0 WHERE NOT EXISTS (
+            SELECT 1 FROM task_counts
+            WHERE owner IS NEW.owner AND done = NEW.done);
+    UPDATE task_counts SET n = n + 1
+        WHERE owner IS NEW.owner AND done = NEW.done;
+END;
+-- Python raises db_version once per write, the delete trigger stamps
+-- tombstones with it
+CREATE TABLE IF NOT EXISTS db_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO db_version (id, version) VALUES (1, 0);
+CREATE TABLE IF NOT EXISTS task_tombstones (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS task_tombstones_version
+    ON task_tombstones (version);
+CREATE TRIGGER IF NOT EXISTS task_tombstones_delete AFTER DELETE ON tasks
+BEGIN
+    INSERT OR REPLACE INTO task_tombstones (id, version)
+        SELECT OLD.id, version FROM db_version;
+END;
+CREATE TRIGGER IF NOT EXISTS task_tombstones_insert AFTER INSERT ON tasks
+BEGIN
+    DELETE FROM task_tombstones WHERE id = NEW.id;
+END;
+'''
+
+_COLUMNS = ('summary', 'owner', 'done')
+_SELECT = 'SELECT id, summary, owner, done FROM tasks'
+_INSERT = ('INSERT INTO tasks (id, summary, owner, done, version)'
+           ' VALUES (?, ?, ?, ?, ?)')
+_INSERT_WORD = 'INSERT OR IGNORE INTO task_words (word, id) VALUES (?, ?)'
+_DELETE_WORD = 'DELETE FROM task_words WHERE word = ? AND id = ?'
+# planned index -> how query() tells SQLite to use it, rowid ranges
+# are still used under NOT INDEXED
+_INDEXED_BY = {'owner': ' INDEXED BY tasks_owner',
+               'done': ' INDEXED BY tasks_done',
+               'id': ' NOT INDEXED', None: ' NOT INDEXED'}
+
+
+class TasksDB_SQLite():  # noqa : E801
+    """Wrapper class for SQLite.
+
+    The methods in this class need to match
+    all database interaction classes.
+
+    So far, this is:
+    TasksDB_MongoDB found in tasksdb_pymongo.py.
+    TasksDB_TinyDB found in tasksdb_tinydb.py.
+    TasksDB_Log found in tasksdb_log.py.
+    TasksDB_SQLite found in tasksdb_sqlite.py.
+    TasksDB_Mmap found in tasksdb_mmap.py.
+    TasksDB_Remote found in tasksdb_remote.py.
+    """
+
+    indexes = ('id', 'owner', 'done')  # what query() can narrow tasks by
+
+    def __init__(self, db_path, reuse_ids=False):  # type (str, bool) -> ()
+        """Connect to db.
+
+        The db runs in WAL mode, so readers don't block the writer.
+        With reuse_ids, ids of deleted tasks are handed out again.
+        """
+        # isolation_level=None lets _transaction() do BEGIN/COMMIT;
+        # the statement cache keeps the fixed SQL below prepared
+        self._conn = sqlite3.connect(os.path.join(db_path, 'tasks_db.sqlite'),
+                                     isolation_level=None,
+                                     check_same_thread=False,
+                                     cached_statements=64)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._ids = _SQLiteIdAllocator(self._conn, reuse_ids=reuse_ids)
+
+    def add(self, task):  # type (dict) -> int
+        """Add a task dict to db."""
+        with self._transaction():
+            task_id = self._ids.allocate()
+            self._conn.execute(_INSERT,
+                               _row(task_id, task, self._next_version()))
+            self._conn.executemany(_INSERT_WORD,
+                                   _word_rows([(task_id, task['summary'])]))
+        return task_id
+
+    def add_many(self, tasks):  # type (list[dict]) -> list[int]
+        """Add a list of task dicts to db in one transaction."""
+        with self._transaction():
+            task_ids = self._ids.reserve(len(tasks))
+            version = self._next_version()
+            self._conn.executemany(_INSERT, (_row(task_id, task, version)
+                                             for task_id, task
+                                             in zip(task_ids, tasks)))
+            self._conn.executemany(_INSERT_WORD, _word_rows(
+                (task_id, task['summary'])
+                for task_id, task in zip(task_ids, tasks)))
+        return task_ids
+
+    def changes_since(self, version):
+        # type (int) -> (list[dict], list[int], int)
+        """Return the tasks added or changed after version, the ids
+        deleted after it, and the current version.
+
+        The tasks_version and task_tombstones_version indexes find
+        them, all three reads see one snapshot.
+        """
+        with self._snapshot():
+            current = self._conn.execute(
+                'SELECT version FROM db_version').fetchone()[0]
+            rows = self._conn.execute(
+                _SELECT + ' WHERE version > ? ORDER BY version, id',
+                (version,)).fetchall()
+            deleted = [row[0] for row in self._conn.execute(
+                'SELECT id FROM task_tombstones WHERE version > ?'
+                ' ORDER BY version, id', (version,))]
+        return [_task_dict(row) for row in rows], deleted, current
+
+    def get(self, task_id):  # type (int) -> dict
+        """Return a task dict with matching id."""
+        with self._lock:
+            row = self._conn.execute(_SELECT + ' WHERE id = ?',
+                                     (task_id,)).fetchone()
+        return None if row is None else _task_dict(row)
+
+    def list_tasks(self, owner=None):  # type (str) -> list[dict]
+        """Return list of tasks."""
+        with self._lock:
+            if owner is None:
+                rows = self._conn.execute(_SELECT + ' ORDER BY id')
+            else:
+                rows = self._conn.execute(
+                    _SELECT + ' WHERE owner = ? ORDER BY id', (owner,))
+            return [_task_dict(row) for row in rows]
+
+    def iter_tasks(self, owner=None, page_size=100, after_id=None):
+        # type (str, int, int) -> iterator of list[dict]
+        """Yield lists of up to page_size task dicts, in id order.
+
+        Each page is its own query, starting after the last id seen.
+        """
+        after_id = 0 if after_id is None else after_id
+        while True:
+            with self._lock:
+                if owner is None:
+                    rows = self._conn.execute(
+                        _SELECT + ' WHERE id > ? ORDER BY id LIMIT ?',
+                        (after_id, page_size)).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        _SELECT + ' WHERE owner = ? AND id > ?'
+                        ' ORDER BY id LIMIT ?',
+                        (owner, after_id, page_size)).fetchall()
+            if not rows:
+                return
+            yield [_task_dict(row) for row in rows]
+            after_id = rows[-1][0]
+
+    def query(self, plan):  # type (Plan) -> list[dict]
+        """Return the task dicts plan asks for, in id order.
+
+        The whole plan is one SELECT: plan.where is the WHERE clause,
+        INDEXED BY picks the planned index, LIMIT and OFFSET page it.
+        """
+        if plan.where.impossible:
+            return []
+        clauses, params = _where_sql(plan.where)
+        sql = _SELECT + _INDEXED_BY[plan.index]
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY id LIMIT ? OFFSET ?'
+        params += [-1 if plan.limit is None else plan.limit, plan.offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_task_dict(row) for row in rows]
+
+    def search(self, terms, owner=None, limit=None):
+        # type (list[str], str, int) -> list[dict]
+        """Return tasks with a word starting with each term, in id order.
+
+        Each term is a range scan of the task_words primary key.
+        """
+        clauses, params = [], []
+        for term in terms:
+            clauses.append('id IN (SELECT id FROM task_words'
+                           ' WHERE word >= ? AND word < ?)')
+            params += [term, prefix_end(term)]
+        if owner is not None:
+            clauses.append('owner = ?')
+            params.append(owner)
+        sql = _SELECT + ' WHERE {} ORDER BY id LIMIT ?'.format(
+            ' AND '.join(clauses))
+        params.append(-1 if limit is None else limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_task_dict(row) for row in rows]
+
+    def count(self, owner=None, done=None):  # type (str, bool) -> int
+        """Return number of tasks in db, or of those matching owner/done.
+
+        Triggers keep task_counts current in the transaction that
+        changes the tasks, so this sums a row per owner at most.
+        """
+        clauses, params = [], []
+        if owner is not None:
+            clauses.append('owner = ?')
+            params.append(owner)
+        if done is not None:
+            clauses.append('done = ?')
+            params.append(done)
+        sql = 'SELECT IFNULL(SUM(n), 0) FROM task_counts'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def counts(self):  # type () -> list[list]
+        """Return [owner, done, number of tasks] for each pair in use."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT owner, done, n FROM task_counts WHERE n != 0')
+            return [[owner, bool(done), n] for owner, done, n in rows]
+
+    def rebuild_counts(self):  # type () -> list[list]
+        """Count the tasks from scratch, return [owner, done, counted,
+        actual] for each count that was wrong."""
+        with self._transaction():
+            actual = self._conn.execute(
+                'SELECT owner, done, COUNT(*) FROM tasks'
+                ' GROUP BY owner, done').fetchall()
+            wrong = differences(self.counts(), actual)
+            self._conn.execute('DELETE FROM task_counts')
+            self._conn.executemany(
+                'INSERT INTO task_counts (owner, done, n) VALUES (?, ?, ?)',
+                actual)
+        return wrong
+
+    def update(self, task_id, task):  # type (int, dict) -> ()
+        """Modify task in db with given task_id."""
+        fields = [f for f in _COLUMNS if f in task]
+        if not fields:
+            with self._lock:
+                if self._conn.execute('SELECT 1 FROM tasks WHERE id = ?',
+                                      (task_id,)).fetchone() is None:
+                    raise ValueError(
+                        'id {} not in task database'.format(task_id))
+            return
+        sql = 'UPDATE tasks SET {}, version = ? WHERE id = ?'.format(
+            ', '.join('{} = ?'.format(f) for f in fields))
+        with self._transaction():
+            if 'summary' in task:
+                self._unindex_words(task_id)
+            cursor = self._conn.execute(
+                sql, [task[f] for f in fields] +
+                [self._next_version(), task_id])
+            if cursor.rowcount == 0:
+                raise ValueError('id {} not in task database'.format(task_id))
+            if 'summary' in task:
+                self._conn.executemany(
+                    _INSERT_WORD, _word_rows([(task_id, task['summary'])]))
+
+    def update_many(self, task_ids, fields, where=None):
+        # type (list[int]|None, dict, Where|None) -> int
+        """Set fields on the tasks in task_ids, or on every task, that
+        match where, in one transaction. Return how many there were.
+
+        Without a summary change this is a single UPDATE ... WHERE.
+        """
+        columns = [f for f in _COLUMNS if f in fields]
+        if not columns:
+            return 0
+        condition, params = _many_sql(task_ids, where)
+        sets = ', '.join('{} = ?'.format(f) for f in columns + ['version'])
+        values = [fields[f] for f in columns]
+        with self._transaction():
+            values.append(self._next_version())
+            if 'summary' not in fields:
+                return self._conn.execute(
+                    'UPDATE tasks SET {} WHERE {}'.format(sets, condition),
+                    values + params).rowcount
+            # the new summary's words replace the old ones, and the
+            # tasks are picked first, it may not match where any more
+            rows = self._conn.execute(
+                'SELECT id, summary FROM tasks WHERE ' + condition,
+                params).fetchall()
+            self._conn.executemany(_DELETE_WORD, _word_rows(rows))
+            found = [row[0] for row in rows]
+            condition, params = _many_sql(found, None)
+            self._conn.execute(
+                'UPDATE tasks SET {} WHERE {}'.format(sets, condition),
+                values + params)
+            self._conn.executemany(_INSERT_WORD, _word_rows(
+                (task_id, fields['summary']) for task_id in found))
+            return len(found)
+
+    def delete(self, task_id):  # type (int) -> ()
+        """Remove a task from db with given task_id."""
+        with self._transaction():
+            self._unindex_words(task_id)
+            self._next_version()
+            cursor = self._conn.execute('DELETE FROM tasks WHERE id = ?',
+                                        (task_id,))
+            if cursor.rowcount == 0:
+                raise ValueError('id {} not in task database'.format(task_id))
+            self._ids.release([task_id])
+
+    def delete_many(self, task_ids, where=None):
+        # type (list[int]|None, Where|None) -> int
+        """Remove the tasks in task_ids, or every task, that match where,
+        in one transaction. Return how many there were."""
+        condition, params = _many_sql(task_ids, where)
+        with self._transaction():
+            rows = self._conn.execute(
+                'SELECT id, summary FROM tasks WHERE ' + condition,
+                params).fetchall()
+            self._conn.executemany(_DELETE_WORD, _word_rows(rows))
+            if rows:
+                self._next_version()
+            self._conn.execute('DELETE FROM tasks WHERE ' + condition, params)
+            self._ids.release([row[0] for row in rows])
+            return len(rows)
+
+    def delete_all(self):
+        """Remove all tasks from db."""
+        with self._transaction():
+            self._next_version()
+            self._conn.execute('DELETE FROM tasks')
+            self._conn.execute('DELETE FROM task_words')
+            self._conn.execute('DELETE FROM task_counts')
+            self._ids.reset()
+
+    def unique_id(self):  # type () -> int
+        """Return an integer that does not exist in the db."""
+        with self._lock:
+            return self._ids.peek()
+
+    def reserve_ids(self, n):  # type (int) -> list[int]
+        """Reserve n consecutive ids that add() won't hand out."""
+        with self._transaction():
+            return self._ids.reserve(n)
+
+    def batch(self):
+        """Return a context manager running everything in one transaction."""
+        return self._transaction()
+
+    def flush(self):
+        """Write any unwritten changes, SQLite commits every transaction."""
+
+    def stop_tasks_db(self):
+        """Disconnect from db."""
+        self._conn.close()
+
+    def _next_version(self):  # type () -> int
+        """Raise db_version for this write, inside its transaction."""
+        self._conn.execute('UPDATE db_version SET version = version + 1')
+        return self._conn.execute(
+            'SELECT version FROM db_version').fetchone()[0]
+
+    def _unindex_words(self, task_id):
+        """Remove task_id's summary words from task_words."""
+        row = self._conn.execute('SELECT summary FROM tasks WHERE id = ?',
+                                 (task_id,)).fetchone()
+        if row is not None:
+            self._conn.executemany(_DELETE_WORD,
+                                   _word_rows([(task_id, row[0])]))
+
+    @contextmanager
+    def _transaction(self):
+        """Run the block in a write transaction, joining an open one."""
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute('BEGIN IMMEDIATE')
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute('ROLLBACK')
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute('COMMIT')
+
+    @contextmanager
+    def _snapshot(self):
+        """Run the block in a read transaction, joining an open one.
+
+        BEGIN is deferred, so only the first read takes a snapshot and
+        writers in other processes aren't held up.
+        """
+        with self._lock:
+            if self._depth:
+                yield
+                return
+            self._conn.execute('BEGIN')
+            try:
+                yield
+            finally:
+                self._conn.execute('COMMIT')
+
+
+class _SQLiteIdAllocator(IdAllocator):
+    """IdAllocator that keeps its state in the db.
+
+    The high-water mark and free list live in tables, and are changed
+    inside the caller's write transaction, so processes sharing the
+    file never hand out the same id.
+    """
+
+    def __init__(self, conn, reuse_ids=False):
+        super(_SQLiteIdAllocator, self).__init__(reuse_ids=reuse_ids)
+        self._conn = conn
+
+    def peek(self):
+        if self.reuse_ids:
+            free = self._lowest_free()
+            if free is not None:
+                return free
+        return self._high_water_mark() + 1
+
+    def allocate(self):
+        if self.reuse_ids:
+            free = self._lowest_free()
+            if free is not None:
+                self._conn.execute('DELETE FROM id_free WHERE id = ?',
+                                   (free,))
+                return free
+        return self._advance(1)
+
+    def release(self, task_ids):
+        if self.reuse_ids and task_ids:
+            self._conn.executemany('INSERT OR IGNORE INTO id_free VALUES (?)',
+                                   ((i,) for i in task_ids))
+
+    def reset(self):
+        self._conn.execute('UPDATE id_high_water SET high_water = 0')
+        self._conn.execute('DELETE FROM id_free')
+
+    def state(self):
+        free = [row[0] for row in
+                self._conn.execute('SELECT id FROM id_free ORDER BY id DESC')]
+        return {'high_water': self._high_water_mark(), 'free': free}
+
+    def _advance(self, n):
+        self._conn.execute(
+            'UPDATE id_high_water SET high_water = high_water + ?', (n,))
+        return self._high_water_mark() - n + 1
+
+    def _high_water_mark(self):
+        return self._conn.execute(
+            'SELECT high_water FROM id_high_water').fetchone()[0]
+
+    def _lowest_free(self):
+        return self._conn.execute('SELECT MIN(id) FROM id_free').fetchone()[0]
+
+
+def _row(task_id, task, version):  # type (int, dict, int) -> tuple
+    """Return the INSERT parameters for a task dict."""
+    return (task_id, task['summary'], task['owner'], task['done'], version)
+
+
+def _word_rows(tasks):  # type (iterable of (int, str)) -> iterator
+    """Yield task_words rows for (id, summary) pairs."""
+    for task_id, summary in tasks:
+        for word in words(summary or ''):
+            yield (word, task_id)
+
+
+def _where_sql(where):  # type (Where) -> (list[str], list)
+    """Return the WHERE clauses and their parameters for where.
+
+    substr() and instr() compare case sensitively, unlike LIKE.
+    """
+    clauses, params = [], []
+    for column in ('owner', 'done'):
+        if getattr(where, column) is not None:
+            clauses.append('{} = ?'.format(column))
+            params.append(getattr(where, column))
+    if where.min_id is not None:
+        clauses.append('id >= ?')
+        params.append(where.min_id)
+    if where.max_id is not None:
+        clauses.append('id <= ?')
+        params.append(where.max_id)
+    if where.summary_prefix is not None:
+        clauses.append('substr(summary, 1, ?) = ?')
+        params += [len(where.summary_prefix), where.summary_prefix]
+    for text in where.summary_contains:
+        clauses.append('instr(summary, ?) > 0')
+        params.append(text)
+    return clauses, params
+
+
+def _many_sql(task_ids, where):
+    # type (list[int]|None, Where|None) -> (str, list)
+    """Return the WHERE condition and parameters for update_many() and
+    delete_many(). The ids go in as one JSON array parameter."""
+    clauses, params = ([], []) if where is None else _where_sql(where)
+    if task_ids is not None:
+        clauses.append('id IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(list(task_ids)))
+    return ' AND '.join(clauses) or '1', params
+
+
+def _task_dict(row):  # type (tuple) -> dict
+    """Return a task dict for a row from _SELECT."""
+    return {'id': row[0], 'summary': row[1], 'owner': row[2],
+            'done': bool(row[3])}
+
+
+def start_tasks_db(db_path, **options):  # type (str) -> TasksDB_SQLite
+    """Connect to db, options are passed on to TasksDB_SQLite."""
+    return TasksDB_SQLite(db_path, **options)
@@ -1,5 +1,229 @@
 """Database wrapper for TinyDB for tasks project."""
+import json
+import operator
+import os
+import threading
+from contextlib import contextmanager
+from functools import reduce
+from itertools import islice
+
 import tinydb
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import Storage
+
+from tasks import planner
+from tasks.compat import replace
+from tasks.counters import TaskCounts
+from tasks.idalloc import IdAllocator
+from tasks.textindex import TextIndex
+from tasks.versions import TaskVersions
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where the lock is a no-op
+    fcntl = None
+
+
+class AtomicJSONStorage(Storage):
+    """Store the db in a JSON file that many processes can share.
+
+    write() writes a temp file and renames it over the db file,
+    so readers see the old db or the new one, never half a write.
+    changed() tells if another process has replaced the file since
+    this storage last read or wrote it. Every write makes a new inode,
+    and the last one seen is kept open so its number can't be reused.
+    lock() holds an fcntl lock on the db file's .lock file.
+    """
+
+    def __init__(self, path):  # type (str) -> ()
+        super(AtomicJSONStorage, self).__init__()
+        self.path = path
+        if not os.path.exists(path):
+            open(path, 'a').close()
+        self._lock_file = open(path + '.lock', 'a')
+        self._seen = None  # the version of the file last read or written
+
+    def read(self):  # type () -> dict|None
+        f = open(self.path)
+        text = f.read()
+        self._see(f)
+        return json.loads(text) if text else None
+
+    def write(self, data):  # type (dict) -> ()
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        f = open(tmp_path, 'w')
+        # dumps() encodes in C in one go, dump() in Python a piece at
+        # a time
+        f.write(json.dumps(data))
+        f.flush()
+        os.fsync(f.fileno())
+        replace(tmp_path, self.path)
+        self._see(f)
+
+    def changed(self):  # type () -> bool
+        """Return True if the file isn't what this storage last saw."""
+        if self._seen is None:
+            return True
+        try:
+            return (_signature(os.stat(self.path)) !=
+                    _signature(os.fstat(self._seen.fileno())))
+        except OSError:
+            return True
+
+    def lock(self, exclusive):  # type (bool) -> ()
+        """Take the file lock, shared or exclusive, waiting for it."""
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(),
+                        fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def close(self):
+        self._lock_file.close()
+        if self._seen is not None:
+            self._seen.close()
+
+    def _see(self, f):
+        """Keep f, open, as the version of the file last seen."""
+        if self._seen is not None:
+            self._seen.close()
+        self._seen = f
+
+
+class WriteBehindMiddleware(CachingMiddleware):
+    """Keep the db in memory and write it to disk on a flush policy.
+
+    The file is written after ``flush_every`` changes, or ``flush_ms``
+    milliseconds after the first unwritten change, whichever comes first.
+    ``flush_every=1`` writes every change straight through.
+
+    A crash loses at most the changes made since the last flush.
+
+    Other processes can share the file: locked() holds the file lock
+    and reloads the file first if another process has written it.
+    Reloading is skipped while changes are unwritten, so with
+    write-behind a flush overwrites what other processes wrote.
+    """
+
+    def __init__(self, storage_cls=AtomicJSONStorage,
+                 flush_every=1, flush_ms=None, tables=()):
+        super(WriteBehindMiddleware, self).__init__(storage_cls)
+        if flush_every < 1:
+            raise ValueError('flush_every must be 1 or more')
+        self.flush_every = flush_every
+        self.flush_ms = flush_ms
+        # tables read() fills in when missing, else TinyDB writes them
+        # out as it opens them, before any lock is held
+        self.tables = tables
+        self.on_reload = None  # called after locked() reloads the file
+        self._lock = threading.RLock()
+        self._timer = None
+        self._holds = 0
+        self._held_changes = False
+        self._flush_on_release = False
+        self._file_locks = 0
+        self._file_exclusive = False
+
+    def read(self):
+        with self._lock:
+            if self.cache is None:
+                data = _int_doc_ids(self.storage.read()) or {}
+                for name in self.tables:
+                    data.setdefault(name, {})
+                self.cache = data
+            return self.cache
+
+    def write(self, data):
+        with self._lock:
+            self.cache = data
+            if self._holds:
+                self._held_changes = True
+            else:
+                self._changed()
+
+    def flush(self):
+        """Write all unwritten changes to disk."""
+        with self.locked(exclusive=True):
+            self._cancel_timer()
+            super(WriteBehindMiddleware, self).flush()
+
+    @contextmanager
+    def locked(self, exclusive=False):
+        """Hold the file lock, and the db up to date, for the block.
+
+        Nested blocks share the outermost lock, asking for exclusive
+        inside a shared block upgrades it.
+        """
+        with self._lock:
+            outermost = not self._file_locks
+            if outermost or (exclusive and not self._file_exclusive):
+                self.storage.lock(exclusive)
+                self._file_exclusive = exclusive
+            self._file_locks += 1
+            try:
+                if (outermost and self.cache is not None and
+                        not self._cache_modified_count and
+                        self.storage.changed()):
+                    self.cache = None
+                    if self.on_reload is not None:
+                        self.on_reload()
+                yield
+            finally:
+                self._file_locks -= 1
+                if not self._file_locks:
+                    self.storage.unlock()
+                    self._file_exclusive = False
+
+    @contextmanager
+    def hold(self, flush=False):
+        """Count all writes inside as one change to the flush policy.
+
+        With flush=True, flush when the outermost hold() exits instead.
+        The file lock is held exclusive throughout.
+        """
+        with self.locked(exclusive=True):
+            self._holds += 1
+            self._flush_on_release = self._flush_on_release or flush
+            try:
+                yield
+            finally:
+                self._holds -= 1
+                if not self._holds:
+                    if self._flush_on_release:
+                        if self._held_changes:
+                            self._cache_modified_count += 1
+                        self.flush()
+                    elif self._held_changes:
+                        self._changed()
+                    self._held_changes = False
+                    self._flush_on_release = False
+
+    def close(self):
+        with self._lock:
+            super(WriteBehindMiddleware, self).close()
+
+    def _changed(self):
+        self._cache_modified_count += 1
+        if self._cache_modified_count >= self.flush_every:
+            self.flush()
+        elif self.flush_ms is not None and self._timer is None:
+            self._timer = threading.Timer(self.flush_ms / 1000.0,
+                                          self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._holds:
+                self.flush()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
 
 
 class TasksDB_TinyDB():  # noqa : E801
@@ -11,58 +235,498 @@ class TasksDB_TinyDB():  # noqa : E801
     So far, this is:
     TasksDB_MongoDB found in tasksdb_pymongo.py.
     TasksDB_TinyDB found in tasksdb_tinydb.py.
+    TasksDB_Log found in tasksdb_log.py.
+    TasksDB_SQLite found in tasksdb_sqlite.py.
+    TasksDB_Mmap found in tasksdb_mmap.py.
+    TasksDB_Remote found in tasksdb_remote.py.
     """
 
-    def __init__(self, db_path):  # type (str) -> ()
-        """Connect to db."""
-        self._db = tinydb.TinyDB(db_path + '/tasks_db.json')
+    indexes = ('id', 'owner')  # what query() can narrow tasks down by
+
+    def __init__(self, db_path, flush_every=1, flush_ms=None,
+                 reuse_ids=False):
+        # type (str, int, int|None, bool) -> ()
+        """Connect to db.
+
+        The defaults write every change to disk right away.
+        Raise flush_every or set flush_ms for write-behind,
+        see WriteBehindMiddleware.
+        With reuse_ids, ids of deleted tasks are handed out again.
+
+        Processes can share the db: every call holds an fcntl lock on
+        tasks_db.json.lock while it runs, and reloads the file only if
+        another process wrote it since.
+        """
+        self._storage = WriteBehindMiddleware(
+            AtomicJSONStorage, flush_every=flush_every, flush_ms=flush_ms,
+            tables=(tinydb.TinyDB.DEFAULT_TABLE, 'meta'))
+        self._db = tinydb.TinyDB(db_path + '/tasks_db.json',
+                                 storage=self._storage)
+        self._reuse_ids = reuse_ids
+        with self._storage.locked(exclusive=True):
+            # doc 1 holds the IdAllocator state, doc 2 the TaskVersions
+            self._meta = self._db.table('meta')
+            self._ids = self._load_ids()
+            self._versions = self._load_versions()
+        # owner -> set of ids, built on first use by list_tasks(owner)
+        self._owners = None
+        self._text = None  # TextIndex, built on first use by search()
+        self._counts = None  # TaskCounts, built on first use by count()
+        self._storage.on_reload = self._reloaded
 
     def add(self, task):  # type (dict) -> int
         """Add a task dict to db."""
-        task_id = self._db.insert(task)
-        task['id'] = task_id
-        self._db.update(task, doc_ids=[task_id])
+        with self._storage.hold():
+            task_id = self._ids.allocate()
+            self._put({task_id: _without_id(task)})
+            self._stamp([task_id])
+            self._index_owner(task_id, task['owner'])
+            self._index_text(task_id, None, task['summary'])
+            if self._counts is not None:
+                self._counts.add(task['owner'], task['done'])
         return task_id
 
+    def add_many(self, tasks):  # type (list[dict]) -> list[int]
+        """Add a list of task dicts to db with a single write."""
+        with self._storage.hold():
+            task_ids = self._ids.reserve(len(tasks))
+            self._put(dict((task_id, _without_id(task))
+                           for task_id, task in zip(task_ids, tasks)))
+            self._stamp(task_ids)
+            for task_id, task in zip(task_ids, tasks):
+                self._index_owner(task_id, task['owner'])
+                self._index_text(task_id, None, task['summary'])
+                if self._counts is not None:
+                    self._counts.add(task['owner'], task['done'])
+        return task_ids
+
+    def changes_since(self, version):
+        # type (int) -> (list[dict], list[int]|None, int)
+        """Return the tasks added or changed after version, the ids
+        deleted after it, and the current version.
+
+        If the tombstones after version were pruned, every task comes
+        back and the deleted ids are None, see TaskVersions.
+        """
+        with self._storage.locked():
+            changed, deleted, current = self._versions.since(version)
+            docs = self._table_data()
+            return ([_task_dict(i, docs[i]) for i in changed], deleted,
+                    current)
+
     def get(self, task_id):  # type (int) -> dict
         """Return a task dict with matching id."""
-        return self._db.get(doc_id=task_id)
+        with self._storage.locked():
+            return _with_id(self._db.get(doc_id=task_id))
 
     def list_tasks(self, owner=None):  # type (str) -> list[dict]
         """Return list of tasks."""
-        if owner is None:
-            return self._db.all()
-        else:
-            return self._db.search(tinydb.Query().owner == owner)
+        with self._storage.locked():
+            if owner is None:
+                return [_with_id(doc) for doc in self._db.all()]
+            docs = self._table_data()
+            task_ids = sorted(self._owner_index().get(owner, ()))
+            return [_task_dict(task_id, docs[task_id])
+                    for task_id in task_ids]
+
+    def iter_tasks(self, owner=None, page_size=100, after_id=None):
+        # type (str, int, int) -> iterator of list[dict]
+        """Yield lists of up to page_size task dicts, in id order."""
+        with self._storage.locked():
+            if owner is None:
+                task_ids = self._table_data()
+            else:
+                task_ids = self._owner_index().get(owner, ())
+            if after_id is not None:
+                task_ids = [i for i in task_ids if i > after_id]
+            task_ids = sorted(task_ids)
+        for start in range(0, len(task_ids), page_size):
+            # the lock is taken per page, never held while the caller runs
+            with self._storage.locked():
+                docs = self._table_data()
+                page = [_task_dict(task_id, docs[task_id])
+                        for task_id in task_ids[start:start + page_size]
+                        if task_id in docs]
+            if page:
+                yield page
+
+    def query(self, plan):  # type (Plan) -> list[dict]
+        """Return the task dicts plan asks for, in id order.
+
+        The owner index or the id range picks the tasks to check,
+        a TinyDB query built from plan.where checks them;
+        without an index the query searches the whole table.
+        """
+        where = plan.where
+        if where.impossible:
+            return []
+        test = _tinydb_query(where)
+        with self._storage.locked():
+            docs = self._table_data()
+            if plan.index is None:
+                found = self._db.search(test) if test else self._db.all()
+                found = [(doc.doc_id, doc) for doc in found]
+            else:
+                if plan.index == 'owner':
+                    task_ids = self._owner_index().get(where.owner, ())
+                else:
+                    task_ids = planner.ids_in_range(docs, where.min_id,
+                                                    where.max_id)
+                found = [(i, docs[i]) for i in task_ids
+                         if not test or test(docs[i])]
+            # TinyDB queries can't see doc ids, the id range is checked here
+            found = [_task_dict(i, doc) for i, doc in sorted(found)
+                     if where.has_id(i)]
+        return planner.page(found, plan)
+
+    def search(self, terms, owner=None, limit=None):
+        # type (list[str], str, int) -> list[dict]
+        """Return tasks with a word starting with each term, in id order.
+
+        The text index is built on the first search, then kept current.
+        """
+        with self._storage.locked():
+            docs = self._table_data()
+            if self._text is None:
+                self._text = TextIndex.build(
+                    (task_id, doc['summary']) for task_id, doc in docs.items())
+            found = (_task_dict(task_id, docs[task_id])
+                     for task_id in sorted(self._text.search(terms))
+                     if owner is None or docs[task_id].get('owner') == owner)
+            return list(islice(found, limit))
 
-    def count(self):  # type () -> int
-        """Return number of tasks in db."""
-        return len(self._db)
+    def count(self, owner=None, done=None):  # type (str, bool) -> int
+        """Return number of tasks in db, or of those matching owner/done.
+
+        The counts are made on first use, then kept current.
+        """
+        with self._storage.locked():
+            if owner is None and done is None:
+                # len(self._db) would make a document of every task
+                return len(self._table_data())
+            return self._task_counts().count(owner, done)
+
+    def counts(self):  # type () -> list[list]
+        """Return [owner, done, number of tasks] for each pair in use."""
+        with self._storage.locked():
+            return self._task_counts().rows()
+
+    def rebuild_counts(self):  # type () -> list[list]
+        """Count the tasks from scratch, return [owner, done, counted,
+        actual] for each count that was wrong."""
+        with self._storage.locked():
+            actual = TaskCounts.of(self._table_data().values())
+            wrong = (self._counts.differences(actual)
+                     if self._counts is not None else [])
+            self._counts = actual
+            return wrong
 
     def update(self, task_id, task):  # type (int, dict) -> ()
-        """Modify task in db with given task_id."""
-        self._db.update(task, doc_ids=[task_id])
+        """Set the fields in task on the task with task_id.
+
+        Only those fields change, the file is reloaded first if another
+        process wrote it, so its changes to other fields are kept.
+        """
+        task = _without_id(task)
+        with self._storage.hold():
+            old = self._table_data().get(task_id)
+            if old is None:
+                raise ValueError('id {} not in task database'.format(task_id))
+            if self._owners is not None and 'owner' in task:
+                self._unindex_owner(task_id)
+                self._index_owner(task_id, task['owner'])
+            if 'summary' in task:
+                self._index_text(task_id, old['summary'], task['summary'])
+            if self._counts is not None:
+                self._counts.remove(old.get('owner'), old['done'])
+                self._counts.add(task.get('owner', old.get('owner')),
+                                 task.get('done', old['done']))
+            self._db.update(task, doc_ids=[task_id])
+            self._stamp([task_id])
+
+    def update_many(self, task_ids, fields, where=None):
+        # type (list[int]|None, dict, Where|None) -> int
+        """Set fields on the tasks in task_ids, or on every task, that
+        match where, with one write. Return how many there were."""
+        with self._storage.hold():
+            found = self._matching(task_ids, where)
+            for task_id, old in found:
+                if self._owners is not None and 'owner' in fields:
+                    self._unindex_owner(task_id)
+                    self._index_owner(task_id, fields['owner'])
+                if 'summary' in fields:
+                    self._index_text(task_id, old['summary'],
+                                     fields['summary'])
+                if self._counts is not None:
+                    self._counts.remove(old.get('owner'), old['done'])
+                    self._counts.add(fields.get('owner', old.get('owner')),
+                                     fields.get('done', old['done']))
+            if found:
+                updated = [i for i, _ in found]
+                self._db.update(fields, doc_ids=updated)
+                self._stamp(updated)
+            return len(found)
 
     def delete(self, task_id):  # type (int) -> ()
         """Remove a task from db with given task_id."""
-        self._db.remove(doc_ids=[task_id])
+        with self._storage.hold():
+            old = self._table_data().get(task_id)
+            if old is None:
+                raise ValueError('id {} not in task database'.format(task_id))
+            self._unindex_owner(task_id)
+            self._index_text(task_id, old['summary'], None)
+            if self._counts is not None:
+                self._counts.remove(old.get('owner'), old['done'])
+            self._db.remove(doc_ids=[task_id])
+            self._ids.release([task_id])
+            self._stamp([task_id], deleted=True)
+
+    def delete_many(self, task_ids, where=None):
+        # type (list[int]|None, Where|None) -> int
+        """Remove the tasks in task_ids, or every task, that match where,
+        with one write. Return how many there were."""
+        with self._storage.hold():
+            found = self._matching(task_ids, where)
+            for task_id, old in found:
+                self._unindex_owner(task_id)
+                self._index_text(task_id, old['summary'], None)
+                if self._counts is not None:
+                    self._counts.remove(old.get('owner'), old['done'])
+            if found:
+                removed = [i for i, _ in found]
+                self._db.remove(doc_ids=removed)
+                self._ids.release(removed)
+                self._stamp(removed, deleted=True)
+            return len(found)
 
     def delete_all(self):
         """Remove all tasks from db."""
-        self._db.purge()
+        with self._storage.hold():
+            removed = list(self._table_data())
+            self._db.purge()
+            if removed:
+                self._stamp(removed, deleted=True)
+            self._ids.reset()
+            if self._owners is not None:
+                self._owners = {}
+            self._text = None
+            self._counts = None
 
     def unique_id(self):  # type () -> int
         """Return an integer that does not exist in the db."""
-        i = 1
-        while self._db.contains(doc_ids=[i]):
-            i += 1
-        return i
+        with self._storage.locked():
+            return self._ids.peek()
+
+    def reserve_ids(self, n):  # type (int) -> list[int]
+        """Reserve n consecutive ids that add() won't hand out."""
+        with self._storage.hold():
+            return self._ids.reserve(n)
+
+    def batch(self):
+        """Return a context manager that writes to disk once, on exit.
+
+        Other processes wait for the file lock until the block exits.
+        """
+        return self._storage.hold(flush=True)
+
+    def flush(self):
+        """Write any unwritten changes to disk."""
+        self._storage.flush()
 
     def stop_tasks_db(self):
-        """Disconnect from DB."""
+        """Flush and disconnect from DB."""
         self._db.close()
 
+    def _reloaded(self):
+        """Drop what was worked out from the old file contents."""
+        self._owners = None
+        self._text = None
+        self._counts = None
+        self._ids = self._load_ids()
+        self._versions = self._load_versions()
+        self._db.clear_cache()
+        self._meta.clear_cache()
+
+    def _put(self, docs):  # type (dict) -> ()
+        """Store {id: doc} in the table with one write."""
+        self._db.process_elements(
+            lambda data, doc_id: data.__setitem__(doc_id, docs[doc_id]),
+            doc_ids=list(docs))
+
+    def _matching(self, task_ids, where):
+        # type (list[int]|None, Where|None) -> list[(int, dict)]
+        """Return (id, doc) for the tasks in task_ids, or every task,
+        that match where, in id order.
+
+        Without ids, the owner index or the id range picks the tasks.
+        """
+        docs = self._table_data()
+        if task_ids is None:
+            if where is None:
+                task_ids = docs
+            elif where.owner is not None:
+                task_ids = self._owner_index().get(where.owner, ())
+            else:
+                task_ids = planner.ids_in_range(docs, where.min_id,
+                                                where.max_id)
+        return [(i, docs[i]) for i in sorted(set(task_ids)) if i in docs and
+                (where is None or where.matches(_task_dict(i, docs[i])))]
+
+    def _load_ids(self):  # type () -> IdAllocator
+        """Return an IdAllocator restored from the meta table."""
+        state = self._meta.get(doc_id=1)
+        if state is None:
+            # db from before ids were tracked, start above the largest
+            state = {'high_water': max(self._table_data() or [0])}
+        return IdAllocator(reuse_ids=self._reuse_ids, save=self._save_ids,
+                           **state)
+
+    def _save_ids(self, state):  # type (dict) -> ()
+        self._put_meta(1, state)
+
+    def _load_versions(self):  # type () -> TaskVersions
+        """Return the TaskVersions kept in the tasks and the meta table.
+
+        Each task doc holds its own version, the meta table the db's
+        version and the tombstones.
+        """
+        state = self._meta.get(doc_id=2) or {}
+        # tasks from before versions were kept are at version 1
+        entries = dict((task_id, (doc.get('version', 1), False))
+                       for task_id, doc in self._table_data().items())
+        for task_id, version in state.get('tombstones', {}).items():
+            entries[int(task_id)] = (version, True)
+        version = state.get('version', max(
+            [v for v, _ in entries.values()] or [0]))
+        return TaskVersions(version, entries, state.get('pruned', 0))
+
+    def _stamp(self, task_ids, deleted=False):  # type (list[int], bool) -> ()
+        """Give the tasks one write changed or deleted a new version.
+
+        Only the db's version and the tombstones go to the meta table,
+        a changed task's version goes in its doc, written with it.
+        """
+        if deleted:
+            version = self._versions.deleted(task_ids)
+        else:
+            version = self._versions.changed(task_ids)
+            docs = self._table_data()
+            for task_id in task_ids:
+                docs[task_id]['version'] = version
+        # the tombstones aren't copied, the next write stores them again
+        self._put_meta(2, {'version': version,
+                           'pruned': self._versions.pruned,
+                           'tombstones': self._versions.tombstones()})
+
+    def _put_meta(self, doc_id, doc):  # type (int, dict) -> ()
+        """Store doc as doc_id in the meta table, without insert()'s
+        id picking."""
+        self._meta.process_elements(
+            lambda data, i: data.__setitem__(i, doc), doc_ids=[doc_id])
+
+    def _table_data(self):  # type () -> dict
+        """Return the cached {id: task dict} mapping behind the table."""
+        return self._storage.read()[tinydb.TinyDB.DEFAULT_TABLE]
+
+    def _owner_index(self):  # type () -> dict
+        """Return the owner -> ids index, building it if needed."""
+        if self._owners is None:
+            owners = {}
+            for task_id, doc in self._table_data().items():
+                owners.setdefault(doc.get('owner'), set()).add(task_id)
+            self._owners = owners
+        return self._owners
+
+    def _task_counts(self):  # type () -> TaskCounts
+        """Return the task counts, counting the tasks if needed."""
+        if self._counts is None:
+            self._counts = TaskCounts.of(self._table_data().values())
+        return self._counts
+
+    def _index_owner(self, task_id, owner):
+        if self._owners is not None:
+            self._owners.setdefault(owner, set()).add(task_id)
+
+    def _index_text(self, task_id, old_summary, summary):
+        # type (int, str|None, str|None) -> ()
+        """Keep the text index, if built, current with a new summary."""
+        if self._text is not None:
+            if old_summary is not None:
+                self._text.remove(task_id, old_summary)
+            if summary is not None:
+                self._text.add(task_id, summary)
+
+    def _unindex_owner(self, task_id):
+        if self._owners is not None:
+            doc = self._table_data().get(task_id)
+            if doc is not None:
+                task_ids = self._owners.get(doc.get('owner'))
+                task_ids.discard(task_id)
+                if not task_ids:
+                    del self._owners[doc.get('owner')]
+
+
+def _without_id(task):  # type (dict) -> dict
+    """Return a copy of task without the id, TinyDB's doc_id holds it."""
+    doc = dict(task)
+    doc.pop('id', None)
+    return doc
+
+
+def _with_id(doc):  # type (tinydb.database.Document) -> dict
+    """Return a task dict for doc with id filled in from doc_id."""
+    if doc is None:
+        return None
+    return _task_dict(doc.doc_id, doc)
+
+
+def _task_dict(task_id, doc):  # type (int, dict) -> dict
+    """Return a copy of a stored doc with its id filled in, and its
+    version left out."""
+    task = dict(doc)
+    task.pop('version', None)
+    task['id'] = task_id
+    return task
+
+
+def _tinydb_query(where):  # type (Where) -> tinydb.Query|None
+    """Return a TinyDB query for the tests in where but the id range."""
+    task = tinydb.Query()
+    tests = []
+    if where.owner is not None:
+        tests.append(task.owner == where.owner)
+    if where.done is not None:
+        tests.append(task.done == where.done)
+    if where.summary_prefix is not None:
+        tests.append(task.summary.test(_starts_with, where.summary_prefix))
+    for text in where.summary_contains:
+        tests.append(task.summary.test(_contains, text))
+    return reduce(operator.and_, tests) if tests else None
+
+
+def _starts_with(summary, prefix):  # type (str, str) -> bool
+    return summary.startswith(prefix)
+
+
+def _contains(summary, text):  # type (str, str) -> bool
+    return text in summary
+
+
+def _signature(stat):  # type (os.stat_result) -> tuple
+    """Return what tells one version of a file from another."""
+    return (stat.st_dev, stat.st_ino, stat.st_size,
+            getattr(stat, 'st_mtime_ns', stat.st_mtime))
+
+
+def _int_doc_ids(data):  # type (dict|None) -> dict|None
+    """Turn the str doc ids read from JSON into ints, as TinyDB uses."""
+    if data is None:
+        return None
+    return dict((name, dict((int(doc_id), doc)
+                            for doc_id, doc in table.items()))
+                for name, table in data.items())
+
 
-def start_tasks_db(db_path):  # type (str) -> TasksDB_MongoDB object
-    """Connect to db."""
-    return TasksDB_TinyDB(db_path)
+def start_tasks_db(db_path, **options):  # type (str) -> TasksDB_TinyDB
+    """Connect to db, options are passed on to TasksDB_TinyDB."""
+    return TasksDB_TinyDB(db_path, **options)
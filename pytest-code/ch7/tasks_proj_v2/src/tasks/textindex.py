@@ -0,0 +1,108 @@
+"""Full-text index over task summaries for tasks project.
+
+A summary is split into words, lowercased runs of letters, digits and
+underscores. tasks.search() finds the tasks whose summary has, for
+every word searched for, a word starting with it:
+
+    'fix bri' finds 'Fix what Brian did'
+"""
+
+import re
+from bisect import bisect_left
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def words(text):  # type: (str) -> list of str
+    """Return the distinct words in text, lowercased and sorted."""
+    return sorted(_word_set(text))
+
+
+def _word_set(text):  # type: (str) -> set of str
+    return set(_WORD.findall(text.lower()))
+
+
+def prefix_end(prefix):  # type: (str) -> str
+    """Return a string above every string starting with prefix.
+
+    word >= prefix and word < prefix_end(prefix) is a prefix test
+    an index on word can answer.
+    """
+    return prefix + u'\U0010ffff'
+
+
+class TextIndex(object):
+    """In-memory inverted index, word -> ids of the tasks using it.
+
+    The dbs that keep tasks in memory build one on the first search,
+    then keep it current with add() and remove() as summaries change.
+    The words are also kept sorted, so a prefix finds its words with
+    a bisect; the sort is redone on the first search after new words.
+    """
+
+    def __init__(self):
+        self._ids = {}  # word -> set of ids
+        self._sorted = []  # every word, or None when new words came in
+
+    @classmethod
+    def build(cls, tasks):  # type: (iterable of (int, str)) -> TextIndex
+        """Return an index of (id, summary) pairs."""
+        index = cls()
+        for task_id, summary in tasks:
+            index.add(task_id, summary)
+        return index
+
+    def add(self, task_id, summary):  # type: (int, str) -> None
+        for word in _word_set(summary):
+            task_ids = self._ids.get(word)
+            if task_ids is None:
+                task_ids = self._ids[word] = set()
+                self._sorted = None
+            task_ids.add(task_id)
+
+    def remove(self, task_id, summary):  # type: (int, str) -> None
+        for word in _word_set(summary):
+            task_ids = self._ids.get(word)
+            if task_ids is not None:
+                task_ids.discard(task_id)
+                if not task_ids:
+                    del self._ids[word]
+                    self._unsort(word)
+
+    def search(self, terms):  # type: (list of str) -> set of int
+        """Return the ids of tasks with a word starting with each term."""
+        if self._sorted is None:
+            self._sorted = sorted(self._ids)
+        matches = []
+        for term in terms:
+            sets = [self._ids[word] for word in self._starting_with(term)]
+            if not sets:
+                return set()
+            # one word's ids are used as they are, not copied
+            matches.append(sets[0] if len(sets) == 1 else set().union(*sets))
+        matches.sort(key=len)
+        if len(matches) == 1:
+            return set(matches[0])
+        found = matches[0] & matches[1]
+        for task_ids in matches[2:]:
+            found &= task_ids
+            if not found:
+                break
+        return found
+
+    def _starting_with(self, prefix):  # type: (str) -> iterator of str
+        i = bisect_left(self._sorted, prefix)
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+            yield self._sorted[i]
+            i += 1
+
+    def _unsort(self, word):  # type: (str) -> None
+        """Take a word no task uses any more out of the sorted words."""
+        if self._sorted is not None:
+            i = bisect_left(self._sorted, word)
+            if i < len(self._sorted) and self._sorted[i] == word:
+                del self._sorted[i]
+
+    def __len__(self):
+        """Return the number of distinct words."""
+        return len(self._ids)
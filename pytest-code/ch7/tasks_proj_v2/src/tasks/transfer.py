@@ -0,0 +1,209 @@
+"""Read and write tasks as JSON lines, CSV or a compact binary format.
+
+tasks.export_stream() and tasks.import_stream() move tasks through here
+one page at a time, so no format holds more than a page in memory.
+
+jsonl - one JSON object per task, with id, summary, owner and done
+csv   - a header row then id,summary,owner,done; an empty owner is None
+bin   - _MAGIC then a _RECORD per task, followed by the summary and
+        owner in UTF-8; an owner length of _NO_OWNER means None
+
+Files are gzip compressed when asked or when their name ends in .gz,
+and compressed input is found by its first bytes whatever its name.
+The id of every task is written out but not read back in, imported
+tasks get new ids from the db they are added to.
+"""
+
+import csv
+import gzip
+import io
+import json
+import struct
+from contextlib import contextmanager
+from six import string_types
+
+FORMATS = ('jsonl', 'csv', 'bin')
+_CSV_FIELDS = ['id', 'summary', 'owner', 'done']
+_MAGIC = b'TASKBIN1'
+_RECORD = struct.Struct('<QBII')  # id, done, summary and owner lengths
+_NO_OWNER = 0xFFFFFFFF
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def format_for(path, default='jsonl'):  # type: (str|None, str) -> str
+    """Return the format a path's extension names, .gz aside."""
+    if isinstance(path, string_types):
+        name = path[:-3] if path.endswith('.gz') else path
+        for fmt in FORMATS:
+            if name.endswith('.' + fmt):
+                return fmt
+    return default
+
+
+def check_format(fmt):  # type: (str) -> None
+    if fmt not in FORMATS:
+        raise ValueError("format must be 'jsonl', 'csv' or 'bin'")
+
+
+@contextmanager
+def open_out(out, compress=None):
+    """Yield a binary stream writing to out, a path or a binary file.
+
+    compress None compresses paths ending in .gz, and nothing else.
+    A file passed in is left open.
+    """
+    if compress is None:
+        compress = isinstance(out, string_types) and out.endswith('.gz')
+    f = open(out, 'wb') if isinstance(out, string_types) else out
+    try:
+        if compress:
+            # level 6, as the gzip tool uses: 9 is far slower, barely smaller
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6) as z:
+                yield z
+        else:
+            yield f
+    finally:
+        if f is not out:
+            f.close()
+
+
+@contextmanager
+def open_in(source):
+    """Yield a peekable binary stream reading source, gunzipped if need be.
+
+    source is a path or a binary file, a file passed in is left open.
+    """
+    f = open(source, 'rb') if isinstance(source, string_types) else source
+    try:
+        stream = f if hasattr(f, 'peek') else io.BufferedReader(f)
+        if stream.peek(2)[:2] == _GZIP_MAGIC:
+            stream = gzip.GzipFile(fileobj=stream, mode='rb')
+        yield stream
+    finally:
+        if f is not source:
+            f.close()
+
+
+def sniff(stream):  # type: (peekable binary stream) -> str
+    """Return the format of what's left of stream, by its first bytes."""
+    start = stream.peek(len(_MAGIC))
+    if start[:len(_MAGIC)] == _MAGIC:
+        return 'bin'
+    if start.lstrip()[:1] == b'{':
+        return 'jsonl'
+    return 'csv'
+
+
+def encoder(fmt):  # type: (str) -> Encoder
+    """Return an encoder turning pages of task dicts into fmt bytes."""
+    check_format(fmt)
+    return {'jsonl': _JsonlEncoder, 'csv': _CsvEncoder,
+            'bin': _BinEncoder}[fmt]()
+
+
+class _JsonlEncoder(object):
+    start = b''
+    # json.dumps() makes a new encoder per call when given options
+    _dumps = json.JSONEncoder(ensure_ascii=False).encode
+
+    def encode(self, page):  # type: (list of dict) -> bytes
+        dumps = self._dumps
+        return ''.join([dumps(
+            {'id': t['id'], 'summary': t['summary'], 'owner': t['owner'],
+             'done': t['done']}) + '\n' for t in page]).encode('utf-8')
+
+
+class _CsvEncoder(object):
+    start = (','.join(_CSV_FIELDS) + '\r\n').encode('utf-8')
+
+    def encode(self, page):  # type: (list of dict) -> bytes
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerows(
+            (t['id'], t['summary'], '' if t['owner'] is None else t['owner'],
+             t['done']) for t in page)
+        return text.getvalue().encode('utf-8')
+
+
+class _BinEncoder(object):
+    start = _MAGIC
+
+    def encode(self, page):  # type: (list of dict) -> bytes
+        parts = []
+        for t in page:
+            summary = t['summary'].encode('utf-8')
+            owner = b'' if t['owner'] is None else t['owner'].encode('utf-8')
+            parts.append(_RECORD.pack(
+                t['id'], t['done'], len(summary),
+                _NO_OWNER if t['owner'] is None else len(owner)))
+            parts.append(summary)
+            parts.append(owner)
+        return b''.join(parts)
+
+
+def decode(stream, fmt):
+    # type: (binary stream, str) -> iterator of (str, str|None, bool)
+    """Yield (summary, owner, done) for each task in stream.
+
+    Raise ValueError naming the record that can't be read.
+    """
+    check_format(fmt)
+    records = {'jsonl': _decode_jsonl, 'csv': _decode_csv,
+               'bin': _decode_bin}[fmt](stream)
+    n = 0
+    while True:
+        n += 1
+        try:
+            record = next(records)
+        except StopIteration:
+            return
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            raise ValueError('task {} is unreadable: {}'.format(n, e))
+        summary, owner, done = record
+        if not (isinstance(summary, string_types) and
+                (owner is None or isinstance(owner, string_types)) and
+                isinstance(done, bool)):
+            raise ValueError('task {} is unreadable: {!r}'.format(n, record))
+        yield record
+
+
+def _decode_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            t = json.loads(line.decode('utf-8'))
+            yield t['summary'], t['owner'], t['done']
+
+
+def _decode_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        reader = csv.reader(text)
+        if next(reader, None) != _CSV_FIELDS:
+            raise ValueError('csv header must be ' + ','.join(_CSV_FIELDS))
+        done = {'True': True, 'False': False}
+        for _, summary, owner, done_text in reader:
+            yield summary, owner or None, done[done_text]
+    finally:
+        text.detach()  # closing the stream is up to its opener
+
+
+def _decode_bin(stream):
+    if stream.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError('not a tasks binary file')
+    while True:
+        head = stream.read(_RECORD.size)
+        if not head:
+            return
+        _, done, summary_len, owner_len = _RECORD.unpack(head)
+        summary = _read_exactly(stream, summary_len).decode('utf-8')
+        owner = None
+        if owner_len != _NO_OWNER:
+            owner = _read_exactly(stream, owner_len).decode('utf-8')
+        yield summary, owner, bool(done)
+
+
+def _read_exactly(stream, n):  # type: (binary stream, int) -> bytes
+    data = stream.read(n)
+    if len(data) != n:
+        raise ValueError('file ends inside a task')
+    return data
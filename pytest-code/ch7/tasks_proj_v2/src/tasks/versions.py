@@ -0,0 +1,122 @@
+"""Task versions and tombstones for tasks.changes_since()."""
+
+from collections import OrderedDict
+
+
+class TaskVersions(object):
+    """The db's version, and the version each task last changed at.
+
+    Every write raises the version, and stamps each task it adds or
+    changes with the new version; a deleted task leaves a tombstone
+    stamped the same way. Entries are kept oldest change first, so
+    since() walks back from the newest only as far as it has to, and
+    costs what has changed, not what is in the db.
+
+    Only the newest max_tombstones tombstones are kept. Past that the
+    oldest are dropped, down to half as many, and pruned is the newest
+    version dropped; since() a version older than that can't tell what
+    was deleted, and asks for a resync instead.
+
+    The dbs that keep tasks in memory hold one, as they do TaskCounts,
+    and change it under the same lock as the tasks.
+    """
+
+    max_tombstones = 10000
+
+    def __init__(self, version=0, entries=None, pruned=0):
+        # type: (int, dict of id -> [version, deleted], int) -> None
+        """Restore versions from state(), ids may be strs from JSON."""
+        self.version = version
+        self.pruned = pruned
+        self._entries = OrderedDict()  # id -> (version, deleted)
+        self._tombstones = OrderedDict()  # id -> version, oldest first
+        for task_id, (task_version, deleted) in sorted(
+                (entries or {}).items(), key=lambda entry: entry[1][0]):
+            self._entries[int(task_id)] = (task_version, deleted)
+            if deleted:
+                self._tombstones[int(task_id)] = task_version
+        self._prune()
+
+    @classmethod
+    def of(cls, task_ids):  # type: (iterable of int) -> TaskVersions
+        """Return versions for a db from before versions were kept.
+
+        Its tasks all count as changed at version 1, so a first
+        since(0) returns them.
+        """
+        versions = cls()
+        for task_id in task_ids:
+            versions._entries[task_id] = (1, False)
+        versions.version = 1 if versions._entries else 0
+        return versions
+
+    def changed(self, task_ids):  # type: (iterable of int) -> int
+        """Stamp tasks added or changed by one write, return its version."""
+        return self._stamp(task_ids, False)
+
+    def deleted(self, task_ids):  # type: (iterable of int) -> int
+        """Leave tombstones for tasks deleted by one write."""
+        return self._stamp(task_ids, True)
+
+    def since(self, version):
+        # type: (int) -> (list of int, list of int|None, int)
+        """Return (changed ids, deleted ids, current version) for what
+        changed after version, oldest change first.
+
+        If tombstones newer than version were pruned, deleted is None,
+        and changed is every task, for the caller to start over with.
+        """
+        if 0 < version < self.pruned:
+            return ([task_id for task_id, (_, is_deleted)
+                     in self._entries.items() if not is_deleted],
+                    None, self.version)
+        changed, deleted = [], []
+        for task_id in reversed(self._entries):
+            task_version, is_deleted = self._entries[task_id]
+            if task_version <= version:
+                break
+            (deleted if is_deleted else changed).append(task_id)
+        changed.reverse()
+        deleted.reverse()
+        return changed, deleted, self.version
+
+    def state(self, copy=True):  # type: (bool) -> dict
+        """Return the state to persist, as keyword args for __init__.
+
+        With copy=False the entries are these versions' own, costing
+        nothing to return, but they change with the next write.
+        """
+        entries = dict(self._entries) if copy else self._entries
+        return {'version': self.version, 'entries': entries,
+                'pruned': self.pruned}
+
+    def tombstones(self):  # type: () -> dict
+        """Return {id: version} for the tombstones kept.
+
+        The dict is these versions' own, it changes with the next write.
+        """
+        return self._tombstones
+
+    def _stamp(self, task_ids, deleted):  # type: (iterable, bool) -> int
+        self.version += 1
+        entries = self._entries
+        tombstones = self._tombstones
+        for task_id in task_ids:
+            # popped first, so the entry moves to the newest end
+            entries.pop(task_id, None)
+            tombstones.pop(task_id, None)
+            entries[task_id] = (self.version, deleted)
+            if deleted:
+                tombstones[task_id] = self.version
+        if deleted:
+            self._prune()
+        return self.version
+
+    def _prune(self):
+        """Drop the oldest tombstones, if there are too many."""
+        tombstones = self._tombstones
+        if len(tombstones) <= self.max_tombstones:
+            return
+        while len(tombstones) > self.max_tombstones // 2:
+            task_id, self.pruned = tombstones.popitem(last=False)
+            del self._entries[task_id]
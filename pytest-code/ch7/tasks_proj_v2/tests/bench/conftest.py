@@ -0,0 +1,178 @@
+"""Fixtures for the API benchmarks, their report and their baselines.
+
+Each benchmark times single calls to a TasksClient whose db already
+holds --bench-sizes tasks, for every db type in --bench-dbs, and
+reports operations per second with the median (p50) and 99th
+percentile (p99) latency of a call. An operation is a call, or a task
+for calls that handle many (per_call of them).
+
+The first run, and any run with --bench-save, stores its numbers in
+the pytest cache as the baseline. Later runs fail a benchmark whose
+median is over --bench-threshold times its baseline, and slower by
+more than NOISE. This is ch4/cache/test_slower.py's idea, with fixed
+baselines and percentiles in place of the last run's duration.
+"""
+
+import gc
+import math
+import random
+import shutil
+import time
+
+import pytest
+import tasks
+from tasks import Task
+
+OWNERS = 100  # a db of n tasks has n / OWNERS per owner
+MAX_SECONDS = 2.0  # time spent on one benchmark, after MIN_CALLS
+MIN_CALLS = 5
+NOISE = 0.00005  # a median this many seconds slower is not a regression
+
+_results = []  # (db_type, size, name, Timing, baseline p50 or None)
+
+
+def _option_list(config, name):  # type: (pytest.Config, str) -> list
+    return [item.strip() for item in config.getoption(name).split(',')
+            if item.strip()]
+
+
+def pytest_generate_tests(metafunc):
+    """Run each benchmark against every db type and size asked for."""
+    if 'bench_db' not in metafunc.fixturenames:
+        return
+    config = metafunc.config
+    params = [(db_type, int(size))
+              for db_type in _option_list(config, '--bench-dbs')
+              for size in _option_list(config, '--bench-sizes')]
+    metafunc.parametrize('bench_db', params, indirect=True, scope='module',
+                         ids=['{}-{}'.format(*param) for param in params])
+
+
+class BenchDb(object):
+    """A client on a db filled with size tasks, and their ids."""
+
+    def __init__(self, client, db_type, size, ids):
+        self.client = client
+        self.db_type = db_type
+        self.size = size
+        self.ids = ids  # delete benchmarks take theirs from here
+        self.random = random.Random(size)
+
+
+@pytest.fixture(scope='module')
+def bench_db(request, tmpdir_factory):
+    """Client on a db of one type holding one number of tasks."""
+    db_type, size = request.param
+    if db_type == 'mongo':
+        pytest.importorskip('pymongo')
+        if shutil.which('mongod') is None:
+            pytest.skip('mongod not found')
+    client = tasks.TasksClient(str(tmpdir_factory.mktemp(db_type)), db_type)
+    ids = client.add_many(
+        Task('task {}'.format(i), 'owner{}'.format(i % OWNERS), i % 2 == 0)
+        for i in range(size))
+    yield BenchDb(client, db_type, size, ids)
+    client.close()
+
+
+class Timing(object):
+    """Latencies of repeated calls, in seconds."""
+
+    def __init__(self, latencies, per_call=1):
+        # type: (list of float, int) -> None
+        self.latencies = sorted(latencies)
+        self.per_call = per_call
+
+    def percentile(self, p):  # type: (float) -> float
+        i = int(math.ceil(p / 100.0 * len(self.latencies))) - 1
+        return self.latencies[max(i, 0)]
+
+    @property
+    def p50(self):  # type: () -> float
+        return self.percentile(50)
+
+    @property
+    def p99(self):  # type: () -> float
+        return self.percentile(99)
+
+    @property
+    def per_second(self):  # type: () -> float
+        return self.per_call * len(self.latencies) / sum(self.latencies)
+
+    def as_dict(self):  # type: () -> dict
+        return {'calls': len(self.latencies), 'per_second': self.per_second,
+                'p50': self.p50, 'p99': self.p99}
+
+
+def time_calls(call, max_calls, per_call=1):
+    # type: (callable, int, int) -> Timing
+    """Time call(i) for i = 0, 1, ... up to max_calls or MAX_SECONDS.
+
+    As timeit does, the garbage collector is off while timing, its
+    pauses land on whichever call happens to trigger them.
+    """
+    latencies = []
+    gc.collect()
+    gc.disable()
+    try:
+        deadline = time.perf_counter() + MAX_SECONDS
+        while len(latencies) < max_calls:
+            start = time.perf_counter()
+            call(len(latencies))
+            end = time.perf_counter()
+            latencies.append(end - start)
+            if end > deadline and len(latencies) >= MIN_CALLS:
+                break
+    finally:
+        gc.enable()
+    return Timing(latencies, per_call)
+
+
+@pytest.fixture()
+def bench(request, bench_db):
+    """Return bench(name, call, max_calls, per_call), which times call(i).
+
+    The timing is reported at the end of the run and checked against
+    its baseline.
+    """
+    config = request.config
+
+    def run(name, call, max_calls=1000, per_call=1):
+        timing = time_calls(call, max_calls, per_call)
+        key = 'bench/{}/{}/{}'.format(bench_db.db_type, bench_db.size, name)
+        # the cache is gone under -p no:cacheprovider, nothing to compare
+        cache = getattr(config, 'cache', None)
+        baseline = None if cache is None else cache.get(key, None)
+        _results.append((bench_db.db_type, bench_db.size, name, timing,
+                         baseline and baseline['p50']))
+        if cache is not None and (baseline is None or
+                                  config.getoption('--bench-save')):
+            cache.set(key, timing.as_dict())
+        elif baseline is not None:
+            threshold = config.getoption('--bench-threshold')
+            limit = max(baseline['p50'] * threshold, baseline['p50'] + NOISE)
+            assert timing.p50 <= limit, (
+                '{} p50 {:.3f} ms is {:.1f}x the baseline {:.3f} ms'.format(
+                    name, timing.p50 * 1000, timing.p50 / baseline['p50'],
+                    baseline['p50'] * 1000))
+        return timing
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report every benchmark run, one line each."""
+    if not _results:
+        return
+    write = terminalreporter.write_line
+    terminalreporter.section('benchmarks')
+    row = '{:<7} {:>8} {:<18} {:>11} {:>10} {:>10} {:>9}'
+    write(row.format('db', 'tasks', 'call', 'ops/s', 'p50 ms', 'p99 ms',
+                     'p50/base'))
+    for db_type, size, name, timing, baseline in _results:
+        write(row.format(
+            db_type, size, name, '{:.0f}'.format(timing.per_second),
+            '{:.3f}'.format(timing.p50 * 1000),
+            '{:.3f}'.format(timing.p99 * 1000),
+            '-' if baseline is None else '{:.2f}'.format(
+                timing.p50 / baseline)))
@@ -0,0 +1,78 @@
+"""Benchmark the tasks API calls, see conftest.py for the options."""
+
+import pytest
+from tasks import Task, Where
+
+pytestmark = pytest.mark.bench
+
+BATCH = 1000  # tasks per add_many call
+
+# Reads go first, adds last: tasks added grow the db the others measure.
+
+
+def test_get(bench_db, bench):
+    ids, rnd = bench_db.ids, bench_db.random
+    bench('get', lambda i: bench_db.client.get(rnd.choice(ids)))
+
+
+def test_list_tasks(bench_db, bench):
+    bench('list_tasks', lambda i: bench_db.client.list_tasks(), max_calls=100)
+
+
+def test_list_tasks_owner(bench_db, bench):
+    bench('list_tasks(owner)',
+          lambda i: bench_db.client.list_tasks('owner{}'.format(i % 100)))
+
+
+def test_count(bench_db, bench):
+    bench('count', lambda i: bench_db.client.count())
+
+
+def test_unique_id(bench_db, bench):
+    bench('unique_id', lambda i: bench_db.client.unique_id())
+
+
+def test_update(bench_db, bench):
+    ids, rnd = bench_db.ids, bench_db.random
+    bench('update', lambda i: bench_db.client.update(
+        rnd.choice(ids), Task(done=i % 2 == 0)))
+
+
+def test_changes_since(bench_db, bench):
+    """An update then a sync of it, what a polling cache pays per change.
+
+    Compare with update alone, the sync shouldn't grow with the db.
+    """
+    client, ids, rnd = bench_db.client, bench_db.ids, bench_db.random
+    synced = [client.changes_since().version]
+
+    def update_and_sync(i):
+        client.update(rnd.choice(ids), Task(done=i % 2 == 0))
+        synced[0] = client.changes_since(synced[0]).version
+
+    bench('update+changes_since', update_and_sync)
+
+
+def test_update_many_owner(bench_db, bench):
+    bench('update_many(owner)', lambda i: bench_db.client.update_many(
+        Where(owner='owner{}'.format(i % 100)), {'done': i % 2 == 0}),
+        max_calls=100)
+
+
+def test_delete(bench_db, bench):
+    """Deletes tasks of the original size, get() won't pick them after."""
+    ids = bench_db.ids
+    bench('delete', lambda i: bench_db.client.delete(ids.pop()),
+          max_calls=min(1000, len(ids) // 2))
+
+
+def test_add(bench_db, bench):
+    bench('add', lambda i: bench_db.client.add(Task('added', 'owner1')))
+
+
+def test_add_many(bench_db, bench):
+    def add_many(i):
+        bench_db.client.add_many(Task('added', 'owner1') for _ in range(BATCH))
+
+    bench('add_many({})'.format(BATCH), add_many, max_calls=100,
+          per_call=BATCH)
@@ -0,0 +1,43 @@
+"""Benchmark tasks export and import, ops/s is tasks per second."""
+
+import pytest
+from tasks import TasksClient
+
+pytestmark = pytest.mark.bench
+
+FILES = ['t.jsonl', 't.csv', 't.bin', 't.jsonl.gz']
+MAX_CALLS = 5  # each call moves the whole db
+TINY_IMPORT_MAX = 100000  # tiny rewrites its whole file for every chunk
+
+
+@pytest.fixture(scope='module')
+def exported(bench_db, tmpdir_factory):
+    """Paths of the bench db exported to each of FILES."""
+    out_dir = tmpdir_factory.mktemp('exported')
+    paths = {}
+    for name in FILES:
+        paths[name] = str(out_dir.join(name))
+        bench_db.client.export_stream(paths[name])
+    return paths
+
+
+@pytest.mark.parametrize('name', FILES)
+def test_export(bench_db, bench, exported, name):
+    bench('export({})'.format(name),
+          lambda i: bench_db.client.export_stream(exported[name]),
+          max_calls=MAX_CALLS, per_call=bench_db.size)
+
+
+@pytest.mark.parametrize('name', FILES)
+def test_import(bench_db, bench, exported, name, tmpdir):
+    """Each call imports into a new, empty db of the same type."""
+    if bench_db.db_type == 'tiny' and bench_db.size > TINY_IMPORT_MAX:
+        pytest.skip('tiny import of over {} tasks'.format(TINY_IMPORT_MAX))
+
+    def import_into_new_db(i):
+        with TasksClient(str(tmpdir.mkdir(str(i))),
+                         bench_db.db_type) as client:
+            client.import_stream(exported[name])
+
+    bench('import({})'.format(name), import_into_new_db,
+          max_calls=MAX_CALLS, per_call=bench_db.size)
@@ -5,11 +5,41 @@ import tasks
 from tasks import Task
 
 
-@pytest.fixture(scope='session')
+def pytest_addoption(parser):
+    """Add --bench, to run the benchmarks, and the tests/bench options."""
+    parser.addoption('--bench', action='store_true',
+                     help='run tests marked bench')
+    group = parser.getgroup('bench', 'tests/bench, run with --bench')
+    group.addoption('--bench-sizes', default='1000,10000,100000,1000000',
+                    help='comma separated numbers of tasks in the db '
+                         '(default: %(default)s)')
+    group.addoption('--bench-dbs', default='tiny,log,sqlite,mmap,mongo',
+                    help='comma separated db types to measure, those '
+                         'that can\'t run here are skipped '
+                         '(default: %(default)s)')
+    group.addoption('--bench-threshold', type=float, default=1.5,
+                    help='fail when median latency is over this many '
+                         'times the baseline (default: %(default)s)')
+    group.addoption('--bench-save', action='store_true',
+                    help='store this run as the baseline to compare '
+                         'later runs to')
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip benchmarks unless --bench is given."""
+    if config.getoption('--bench'):
+        return
+    skip_bench = pytest.mark.skip(reason='benchmark, use --bench to run')
+    for item in items:
+        if 'bench' in item.keywords:
+            item.add_marker(skip_bench)
+
+
+@pytest.fixture(scope='session', params=['tiny', 'log', 'sqlite', 'mmap'])
 def tasks_db_session(tmpdir_factory, request):
     """Connect to db before tests, disconnect after."""
     temp_dir = tmpdir_factory.mktemp('temp')
-    tasks.start_tasks_db(str(temp_dir), 'tiny')
+    tasks.start_tasks_db(str(temp_dir), request.param)
     yield  # this is where the testing happens
     tasks.stop_tasks_db()
 
@@ -64,3 +94,47 @@ def db_with_multi_per_owner(tasks_db, tasks_mult_per_owner):
     """Connected db with 9 tasks, 3 owners, all with 3 tasks."""
     for t in tasks_mult_per_owner:
         tasks.add(t)
+
+
+# The unit tests call the db objects directly, with task dicts
+# like tasks.api passes to them.
+
+
+@pytest.fixture()
+def new_task():
+    """Return a function that makes a task dict like tasks.api passes
+    to the db."""
+    def _new_task(summary, owner=None, done=False):
+        return {'summary': summary, 'owner': owner, 'done': done, 'id': None}
+    return _new_task
+
+
+@pytest.fixture()
+def open_db(tmpdir):
+    """Return a function that opens a db of db_type on tmpdir, after
+    stopping db if one is given. Dbs still open are stopped after the
+    test."""
+    opened = []
+
+    def _open_db(db_type, db=None, **options):
+        if db is not None:
+            db.stop_tasks_db()
+            opened.remove(db)
+        db = tasks.api._open_db(str(tmpdir), db_type, **options)
+        opened.append(db)
+        return db
+    yield _open_db
+    for db in opened:
+        db.stop_tasks_db()
+
+
+@pytest.fixture()
+def sqlite_db(open_db):
+    """An empty TasksDB_SQLite."""
+    return open_db('sqlite')
+
+
+@pytest.fixture()
+def mmap_db(open_db):
+    """An empty TasksDB_Mmap."""
+    return open_db('mmap')
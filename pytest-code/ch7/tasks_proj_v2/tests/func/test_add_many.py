@@ -0,0 +1,57 @@
+"""Test the tasks.add_many() API function."""
+
+import pytest
+import tasks
+from tasks import Task
+
+
+def test_add_many_returns_ids(tasks_db, tasks_mult_per_owner):
+    """add_many() should return one int id per task, all unique."""
+    # GIVEN an initialized tasks db
+    # WHEN a batch of tasks is added
+    task_ids = tasks.add_many(tasks_mult_per_owner)
+
+    # THEN an int id is returned for each task
+    assert len(task_ids) == len(tasks_mult_per_owner)
+    assert all(isinstance(task_id, int) for task_id in task_ids)
+
+    # AND no id is repeated
+    assert len(set(task_ids)) == len(task_ids)
+
+
+def test_add_many_tasks_retrievable(tasks_db, tasks_just_a_few):
+    """Each id returned by add_many() finds the matching task."""
+    task_ids = tasks.add_many(tasks_just_a_few)
+    for task_id, task in zip(task_ids, tasks_just_a_few):
+        t_from_db = tasks.get(task_id)
+        assert t_from_db.id == task_id
+        assert t_from_db[:-1] == task[:-1]
+
+
+def test_add_many_accepts_generator(tasks_db):
+    """Any iterable of tasks works, not just lists."""
+    task_ids = tasks.add_many(Task('task {}'.format(i)) for i in range(5))
+    assert len(task_ids) == 5
+    assert tasks.count() == 5
+
+
+def test_add_many_empty(db_with_3_tasks):
+    """An empty batch adds nothing."""
+    assert tasks.add_many([]) == []
+    assert tasks.count() == 3
+
+
+def test_add_many_after_add(db_with_3_tasks, tasks_just_a_few):
+    """Ids from add_many() don't collide with existing ids."""
+    existing_ids = {t.id for t in tasks.list_tasks()}
+    task_ids = tasks.add_many(tasks_just_a_few)
+    assert existing_ids.isdisjoint(task_ids)
+    assert tasks.count() == 6
+
+
+def test_add_many_validates_whole_batch(db_with_3_tasks):
+    """One bad task means nothing from the batch is added."""
+    batch = [Task('good'), Task('also good'), Task(summary=None)]
+    with pytest.raises(ValueError):
+        tasks.add_many(batch)
+    assert tasks.count() == 3
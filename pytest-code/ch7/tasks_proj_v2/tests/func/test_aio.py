@@ -0,0 +1,126 @@
+"""Test the coroutine API in tasks.aio."""
+
+import asyncio
+import time
+
+import pytest
+import tasks
+import tasks.aio
+from tasks import Task
+
+
+def run(coro):
+    """Run coro to the end on a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_add_get(tasks_db):
+    """What aio adds, sync and aio get() both see."""
+    task_id = run(tasks.aio.add(Task('sit', 'brian')))
+    assert run(tasks.aio.get(task_id)) == tasks.get(task_id)
+    assert run(tasks.aio.count()) == 1
+
+
+def test_get_many(db_with_multi_per_owner):
+    """get_many() returns the tasks in the order asked for."""
+    ids = [t.id for t in tasks.list_tasks()]
+    ids.reverse()
+    found = run(tasks.aio.get_many(ids))
+    assert [t.id for t in found] == ids
+
+
+def test_query(db_with_multi_per_owner):
+    """query() returns the list tasks.query() would."""
+    found = run(tasks.aio.query(owner='Daniel', limit=2))
+    assert found == tasks.query(owner='Daniel', limit=2).all()
+    assert len(found) == 2
+
+
+def test_count_stats(db_with_3_tasks):
+    assert run(tasks.aio.count('Brian', True)) == 1
+    assert run(tasks.aio.stats()) == tasks.stats()
+
+
+def test_update_many_delete_many(db_with_3_tasks):
+    assert run(tasks.aio.update_many(tasks.Where(), {'done': True})) == 3
+    assert run(tasks.aio.delete_many(tasks.Where(owner='Brian'))) == 1
+    assert tasks.count(done=True) == 2
+
+
+def test_changes_since(db_with_3_tasks):
+    version = tasks.changes_since().version
+    assert run(tasks.aio.changes_since()) == tasks.changes_since()
+    assert run(tasks.aio.changes_since(version)).tasks == []
+
+
+def test_update_delete(db_with_3_tasks):
+    """Writes through aio change the db."""
+    ids = [t.id for t in tasks.list_tasks()]
+
+    async def change():
+        await tasks.aio.update(ids[0], Task(done=False))
+        await tasks.aio.delete(ids[1])
+        return await tasks.aio.list_tasks()
+
+    remaining = run(change())
+    assert [t.id for t in remaining] == [ids[0], ids[2]]
+    assert remaining[0].done is False
+
+
+def test_concurrent_writes(tasks_db):
+    """Adds gathered together each get their own id."""
+    async def add_all():
+        return await asyncio.gather(
+            *(tasks.aio.add(Task(str(i))) for i in range(50)))
+
+    ids = run(add_all())
+    assert sorted(ids) == sorted(set(ids))
+    assert tasks.count() == 50
+
+
+def test_errors_raised(tasks_db):
+    """Errors from tasks.api come out of the await."""
+    with pytest.raises(TypeError):
+        run(tasks.aio.add('not a Task object'))
+
+
+def test_start_stop(tasks_db, mocker):
+    """Starting and stopping don't wait on the pool from the loop."""
+    # the db stays as it is, it's the pool being checked
+    start = mocker.patch.object(tasks.api, 'start_tasks_db')
+    mocker.patch.object(tasks.api, 'stop_tasks_db')
+    shutdown = mocker.spy(tasks.aio.ThreadPoolExecutor, 'shutdown')
+
+    async def start_twice_and_stop():
+        await tasks.aio.start_tasks_db('db_path', 'tiny')
+        await tasks.aio.start_tasks_db('db_path', 'tiny', max_workers=2)
+        assert tasks.aio._executor._max_workers == 2
+        await tasks.aio.add(Task('sit'))
+        await tasks.aio.stop_tasks_db()
+
+    run(start_twice_and_stop())
+    assert start.call_count == 2
+    assert tasks.aio._executor is None
+    assert tasks.count() == 1
+    assert len(shutdown.call_args_list) >= 2
+    assert all(c[1] == {'wait': False} for c in shutdown.call_args_list)
+
+
+@pytest.mark.bench
+def test_get_throughput(tasks_db, capsys):
+    """Compare gets per second, sync against aio.get_many()."""
+    ids = tasks.add_many(Task(str(i), 'bench') for i in range(2000))
+    start = time.perf_counter()
+    for task_id in ids:
+        tasks.get(task_id)
+    sync_rate = len(ids) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    run(tasks.aio.get_many(ids))
+    aio_rate = len(ids) / (time.perf_counter() - start)
+    with capsys.disabled():
+        print('\nget/s sync {:.0f}, aio get_many {:.0f}'.format(sync_rate,
+                                                                aio_rate))
@@ -25,6 +25,12 @@ def test_add_raises():
         tasks.add(task='not a Task object')
 
 
+def test_add_many_raises():
+    """add_many() should raise an exception if any item isn't a Task."""
+    with pytest.raises(TypeError):
+        tasks.add_many([Task('fine'), 'not a Task object'])
+
+
 @pytest.mark.smoke
 def test_list_raises():
     """list() should raise an exception with wrong type param."""
@@ -32,6 +38,27 @@ def test_list_raises():
         tasks.list_tasks(owner=123)
 
 
+class TestIterTasks():
+    """Test expected exceptions with tasks.iter_tasks()."""
+
+    def test_bad_owner(self):
+        """A non-string owner should raise an exception."""
+        with pytest.raises(TypeError):
+            tasks.iter_tasks(owner=123)
+
+    def test_bad_page_size(self):
+        """page_size must be a positive int."""
+        with pytest.raises(TypeError):
+            tasks.iter_tasks(page_size='10')
+        with pytest.raises(ValueError):
+            tasks.iter_tasks(page_size=0)
+
+    def test_bad_after_id(self):
+        """after_id must be an int."""
+        with pytest.raises(TypeError):
+            tasks.iter_tasks(after_id='3')
+
+
 @pytest.mark.get
 @pytest.mark.smoke
 def test_get_raises():
@@ -61,9 +88,24 @@ def test_delete_raises():
         tasks.delete(task_id=(1, 2, 3))
 
 
+def test_reserve_ids_raises():
+    """reserve_ids() needs a positive int."""
+    with pytest.raises(TypeError):
+        tasks.reserve_ids('5')
+    with pytest.raises(ValueError):
+        tasks.reserve_ids(0)
+
+
+def test_export_snapshot_raises():
+    """export_snapshot() needs a path string."""
+    with pytest.raises(TypeError):
+        tasks.export_snapshot(None)
+
+
 def test_start_tasks_db_raises():
     """Make sure unsupported db raises an exception."""
     with pytest.raises(ValueError) as excinfo:
         tasks.start_tasks_db('some/great/path', 'mysql')
     exception_msg = excinfo.value.args[0]
-    assert exception_msg == "db_type must be a 'tiny' or 'mongo'"
+    assert exception_msg == ("db_type must be 'tiny', 'mongo', 'log', "
+                             "'sqlite', 'mmap' or 'remote'")
@@ -0,0 +1,30 @@
+"""Test tasks.batch() and tasks.flush()."""
+
+import tasks
+from tasks import Task
+
+
+def test_batch_changes_visible_inside(tasks_db):
+    """Changes made inside a batch can be read inside it."""
+    with tasks.batch():
+        task_id = tasks.add(Task('breathe'))
+        assert tasks.get(task_id).summary == 'breathe'
+        assert tasks.count() == 1
+
+
+def test_batch_groups_many_calls(db_with_3_tasks):
+    """Adds, updates and deletes can all go in one batch."""
+    ids = [t.id for t in tasks.list_tasks()]
+    with tasks.batch():
+        new_id = tasks.add(Task('throw a party'))
+        tasks.update(ids[0], Task(done=True))
+        tasks.delete(ids[1])
+    assert tasks.count() == 3
+    assert tasks.get(ids[0]).done is True
+    assert tasks.get(new_id).summary == 'throw a party'
+
+
+def test_flush(db_with_3_tasks):
+    """flush() can be called any time."""
+    tasks.flush()
+    assert tasks.count() == 3
@@ -0,0 +1,128 @@
+"""Test tasks.changes_since()."""
+
+import pytest
+import tasks
+from tasks import Changes, Task, TasksClient, Where
+
+
+@pytest.fixture()
+def start(tasks_db):
+    """The version of the emptied db, tests sync from there."""
+    return tasks.changes_since().version
+
+
+def ids(task_list):
+    return [t.id for t in task_list]
+
+
+def test_add_and_update(start):
+    """Added then changed tasks come back, and the version goes up."""
+    a = tasks.add(Task('Write some code', 'Brian'))
+    b = tasks.add(Task('Fix what Brian did', 'Michelle'))
+    added = tasks.changes_since(start)
+    assert added == Changes(tasks.list_tasks(), [], added.version)
+    assert added.version > start
+    tasks.update(a, Task(done=True))
+    changed = tasks.changes_since(added.version)
+    assert changed.tasks == [tasks.get(a)]
+    assert changed.deleted == []
+    assert changed.version > added.version
+    assert ids(tasks.changes_since(start).tasks) == [b, a]
+
+
+def test_nothing_changed(start):
+    tasks.add(Task('Inspire'))
+    version = tasks.changes_since(start).version
+    assert tasks.changes_since(version) == Changes([], [], version)
+
+
+def test_delete(start):
+    """A deleted task leaves its id, and isn't in tasks any more."""
+    a, b = tasks.add_many([Task('Create'), Task('Encourage')])
+    version = tasks.changes_since(start).version
+    tasks.delete(a)
+    deleted = tasks.changes_since(version)
+    assert (deleted.tasks, deleted.deleted) == ([], [a])
+    assert tasks.changes_since(start).tasks == [tasks.get(b)]
+    assert tasks.changes_since(start).deleted == [a]
+
+
+def test_many_is_one_version(db_with_multi_per_owner):
+    """update_many() and delete_many() raise the version once."""
+    version = tasks.changes_since().version
+    assert tasks.update_many(Where(owner='Raphael'), {'done': True}) == 3
+    changed = tasks.changes_since(version)
+    assert changed.version == version + 1
+    assert ids(changed.tasks) == ids(tasks.list_tasks('Raphael'))
+    michelle = ids(tasks.list_tasks('Michelle'))
+    assert tasks.delete_many(Where(owner='Michelle')) == 3
+    deleted = tasks.changes_since(changed.version)
+    assert deleted == Changes([], michelle, changed.version + 1)
+
+
+def test_delete_all(db_with_3_tasks):
+    """Every task leaves its id, the version keeps going up."""
+    all_ids = ids(tasks.list_tasks())
+    version = tasks.changes_since().version
+    tasks.delete_all()
+    cleared = tasks.changes_since(version)
+    assert cleared.tasks == []
+    assert sorted(cleared.deleted) == all_ids
+    assert cleared.version > version
+
+
+def test_version_ahead_of_db(start):
+    with pytest.raises(ValueError):
+        tasks.changes_since(start + 1)
+
+
+@pytest.mark.parametrize('version, error', [
+    ('1', TypeError), (1.5, TypeError), (-1, ValueError)])
+def test_bad_version(start, version, error):
+    with pytest.raises(error):
+        tasks.changes_since(version)
+
+
+@pytest.mark.parametrize('db_type', ['tiny', 'log', 'sqlite', 'mmap'])
+def test_versions_survive_reopen(tmpdir, db_type):
+    with TasksClient(str(tmpdir), db_type) as client:
+        a, b, c = client.add_many([Task('a'), Task('b'), Task('c')])
+        client.update(a, Task(owner='Okken'))
+        client.delete(b)
+        before = client.changes_since()
+    with TasksClient(str(tmpdir), db_type) as client:
+        assert client.changes_since() == before
+        assert ids(before.tasks) == [c, a]
+        assert before.deleted == [b]
+        client.add(Task('d'))
+        assert client.changes_since().version > before.version
+
+
+@pytest.mark.parametrize('db_type', ['tiny', 'log', 'sqlite'])
+def test_reused_id_drops_tombstone(tmpdir, db_type):
+    """An id handed out again is a changed task, not a deleted one."""
+    with TasksClient(str(tmpdir), db_type, reuse_ids=True) as client:
+        a, b = client.add_many([Task('a'), Task('b')])
+        client.delete(a)
+        version = client.changes_since().version
+        assert client.add(Task('again')) == a
+        assert client.changes_since(version) == Changes(
+            [client.get(a)], [], version + 1)
+        assert client.changes_since().deleted == []
+
+
+@pytest.mark.parametrize('db_type', ['tiny', 'log', 'mmap'])
+def test_resync_after_pruning(tmpdir, db_type, monkeypatch):
+    """From before the tombstones kept, every task comes back to start
+    over with."""
+    monkeypatch.setattr('tasks.versions.TaskVersions.max_tombstones', 4)
+    with TasksClient(str(tmpdir), db_type) as client:
+        ids_added = client.add_many([Task(str(i)) for i in range(6)])
+        version = client.changes_since().version
+        for task_id in ids_added[:5]:
+            client.delete(task_id)
+        expected = Changes(client.list_tasks(), [], version + 5, True)
+        assert client.changes_since(version) == expected
+        assert client.changes_since(version + 3).deleted == ids_added[3:5]
+    with TasksClient(str(tmpdir), db_type) as client:
+        assert client.changes_since(version) == expected
@@ -0,0 +1,84 @@
+"""Test tasks.count() filters, tasks.stats() and tasks.check_counts()."""
+
+import pytest
+import tasks
+from tasks import Task
+from tasks.tasksdb_sqlite import TasksDB_SQLite
+
+
+def counted_by_hand(owner=None, done=None):
+    return len([t for t in tasks.list_tasks()
+                if (owner is None or t.owner == owner) and
+                (done is None or t.done == done)])
+
+
+FILTERS = [(None, None), ('Brian', None), (None, True), (None, False),
+           ('Brian', True), ('Katie', False), ('Nobody', None)]
+
+
+@pytest.fixture()
+def db_with_changes(tasks_db):
+    """Connected db whose tasks were added, changed and deleted."""
+    ids = tasks.add_many(Task(str(i), ['Brian', 'Katie', None][i % 3],
+                              i % 2 == 0) for i in range(12))
+    tasks.add(Task('one more', 'Katie', True))
+    tasks.update(ids[0], Task(owner='Katie'))
+    tasks.update(ids[1], Task(done=True))
+    tasks.update(ids[2], Task(owner='Brian', done=False))
+    tasks.delete(ids[3])
+    tasks.delete(ids[4])
+    return ids
+
+
+@pytest.mark.parametrize('owner, done', FILTERS)
+def test_count_filters(db_with_changes, owner, done):
+    """count() agrees with counting list_tasks() by hand."""
+    assert tasks.count(owner, done) == counted_by_hand(owner, done)
+
+
+def test_count_after_delete_all(db_with_changes):
+    tasks.delete_all()
+    tasks.add(Task('fresh', 'Brian'))
+    assert [tasks.count(owner, done) for owner, done in FILTERS] == [
+        counted_by_hand(owner, done) for owner, done in FILTERS]
+
+
+def test_stats(db_with_3_tasks):
+    """stats() breaks the counts down by owner."""
+    tasks.add(Task('again', 'Brian', False))
+    tasks.add(Task('nobody'))
+    assert tasks.stats() == {
+        'Brian': {'done': 1, 'not_done': 1, 'total': 2},
+        'Katie': {'done': 0, 'not_done': 1, 'total': 1},
+        'Michelle': {'done': 0, 'not_done': 1, 'total': 1},
+        None: {'done': 0, 'not_done': 1, 'total': 1}}
+
+
+def test_stats_empty(tasks_db):
+    assert tasks.stats() == {}
+
+
+def test_check_counts_finds_nothing(db_with_changes):
+    assert tasks.check_counts() == []
+
+
+def test_check_counts_repairs(db_with_changes):
+    """Counts thrown off behind the API's back are found and fixed."""
+    right = tasks.count('Brian', True)
+    db = tasks.api._client._db
+    if isinstance(db, TasksDB_SQLite):
+        db._conn.execute("UPDATE task_counts SET n = n + 5"
+                         " WHERE owner = 'Brian' AND done = 1")
+    else:
+        db._counts.add('Brian', True, 5)
+    assert tasks.count('Brian', True) == right + 5
+
+    assert tasks.check_counts() == [('Brian', True, right + 5, right)]
+    assert tasks.count('Brian', True) == right
+    assert tasks.check_counts() == []
+
+
+@pytest.mark.parametrize('owner, done', [(3, None), (None, 'yes')])
+def test_bad_filters(tasks_db, owner, done):
+    with pytest.raises(TypeError):
+        tasks.count(owner, done)
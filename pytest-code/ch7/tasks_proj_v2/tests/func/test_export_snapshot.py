@@ -0,0 +1,17 @@
+"""Test the tasks.export_snapshot() API function."""
+
+import tasks
+from tasks.tasksdb_mmap import TasksDB_Mmap
+
+
+def test_snapshot_matches_db(db_with_multi_per_owner, tmpdir):
+    """A snapshot of any db lists the same tasks."""
+    tasks.delete(2)
+    assert tasks.export_snapshot(str(tmpdir)) == tasks.count()
+    snapshot = TasksDB_Mmap(str(tmpdir), read_only=True)
+    try:
+        assert ([tasks.Task(**t) for t in snapshot.list_tasks()] ==
+                tasks.list_tasks())
+        assert snapshot.count() == tasks.count()
+    finally:
+        snapshot.stop_tasks_db()
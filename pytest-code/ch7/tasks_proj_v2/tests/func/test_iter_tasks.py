@@ -0,0 +1,58 @@
+"""Test the tasks.iter_tasks() API function."""
+
+import pytest
+import tasks
+from tasks import Task
+
+
+def test_iter_matches_list(db_with_multi_per_owner):
+    """iter_tasks() yields the same tasks as list_tasks(), in id order."""
+    listed = sorted(tasks.list_tasks(), key=lambda t: t.id)
+    assert list(tasks.iter_tasks(page_size=2)) == listed
+
+
+def test_iter_by_owner(db_with_multi_per_owner):
+    """Only the owner's tasks are yielded."""
+    owners = {t.owner for t in tasks.iter_tasks('Michelle', page_size=2)}
+    assert owners == {'Michelle'}
+
+
+def test_iter_is_lazy(db_with_3_tasks):
+    """Pages are read as needed, so changes to later pages show up."""
+    cursor = tasks.iter_tasks(page_size=1)
+    first, second, third = tasks.list_tasks()
+    assert next(cursor) == first
+    tasks.update(second.id, Task(done=True))
+    tasks.delete(third.id)
+    assert list(cursor) == [second._replace(done=True)]
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 4, 100])
+def test_resume_with_after_id(db_with_multi_per_owner, page_size):
+    """A cursor's after_id picks up where the cursor stopped."""
+    # GIVEN a cursor that has returned 4 tasks
+    cursor = tasks.iter_tasks(page_size=page_size)
+    first = [next(cursor) for _ in range(4)]
+    assert cursor.after_id == first[-1].id
+
+    # WHEN a new cursor starts at its after_id
+    rest = list(tasks.iter_tasks(page_size=page_size,
+                                 after_id=cursor.after_id))
+
+    # THEN together they cover every task exactly once
+    all_ids = [t.id for t in first + rest]
+    assert sorted(all_ids) == sorted(t.id for t in tasks.list_tasks())
+    assert len(set(all_ids)) == len(all_ids)
+
+
+def test_after_last_id(db_with_3_tasks):
+    """Nothing comes after the last task."""
+    last_id = max(t.id for t in tasks.list_tasks())
+    cursor = tasks.iter_tasks(after_id=last_id)
+    assert list(cursor) == []
+    assert cursor.after_id == last_id
+
+
+def test_empty_db(tasks_db):
+    """An empty db yields nothing."""
+    assert list(tasks.iter_tasks()) == []
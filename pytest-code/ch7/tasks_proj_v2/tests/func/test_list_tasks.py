@@ -0,0 +1,44 @@
+"""Test the tasks.list_tasks() API function."""
+
+import tasks
+from tasks import Task
+
+
+def test_list_all(db_with_multi_per_owner, tasks_mult_per_owner):
+    """With no owner, all tasks are listed."""
+    assert len(tasks.list_tasks()) == len(tasks_mult_per_owner)
+
+
+def test_list_by_owner(db_with_multi_per_owner):
+    """Only the owner's tasks are listed."""
+    summaries = [t.summary for t in tasks.list_tasks('Daniel')]
+    assert summaries == ['Do a handstand', 'Write some books', 'Eat ice cream']
+
+
+def test_list_by_owner_after_changes(db_with_multi_per_owner):
+    """Updates and deletes show up in owner listings."""
+    # GIVEN 3 tasks for Daniel
+    daniel = tasks.list_tasks('Daniel')
+
+    # WHEN one is given away and one is deleted
+    tasks.update(daniel[0].id, Task(owner='Michelle'))
+    tasks.delete(daniel[1].id)
+
+    # THEN Daniel has one task left and Michelle has one more
+    assert [t.id for t in tasks.list_tasks('Daniel')] == [daniel[2].id]
+    assert len(tasks.list_tasks('Michelle')) == 4
+
+
+def test_list_as_table(db_with_multi_per_owner):
+    """as_table=True returns the same tasks as a TaskTable."""
+    table = tasks.list_tasks(as_table=True)
+    assert isinstance(table, tasks.TaskTable)
+    assert sorted(table, key=lambda t: t.id) == sorted(
+        tasks.list_tasks(), key=lambda t: t.id)
+
+
+def test_list_as_table_by_owner(db_with_multi_per_owner):
+    """as_table=True works with an owner too."""
+    table = tasks.list_tasks('Raphael', as_table=True)
+    assert set(table.owners) == {'Raphael'}
+    assert len(table) == 3
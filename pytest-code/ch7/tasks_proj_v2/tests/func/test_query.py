@@ -0,0 +1,105 @@
+"""Test the tasks.query() API function."""
+
+import pytest
+import tasks
+from tasks import Task, Where
+
+
+@pytest.fixture()
+def db_with_queryable_tasks(tasks_db):
+    """Connected db with 30 tasks, a third of them deleted."""
+    task_ids = tasks.add_many(
+        Task('{} task {}'.format('Fix' if i % 2 else 'Add', i),
+             ['Brian', 'Katie', 'Michelle'][i % 3], i % 4 == 0)
+        for i in range(30))
+    for task_id in task_ids[::3]:
+        tasks.delete(task_id)
+
+
+@pytest.mark.parametrize('fields', [
+    {},
+    {'owner': 'Katie'},
+    {'done': True},
+    {'owner': 'Brian', 'done': False},
+    {'min_id': 5, 'max_id': 17},
+    {'max_id': 9},
+    {'min_id': 20, 'owner': 'Michelle'},
+    {'summary_prefix': 'Fix'},
+    {'summary_prefix': 'Fix task 1'},
+    {'summary_contains': '2'},
+    {'summary_contains': ('1', 'task')},
+    {'owner': 'Katie', 'done': True, 'summary_prefix': 'Add',
+     'min_id': 3, 'max_id': 28},
+    {'owner': 'Nobody'},
+])
+def test_query_matches_filtering(db_with_queryable_tasks, fields):
+    """query() returns what filtering list_tasks() by hand does."""
+    where = Where(**fields)
+    expected = sorted((t for t in tasks.list_tasks()
+                       if where.matches(t._asdict())), key=lambda t: t.id)
+    assert tasks.query(**fields).all() == expected
+    assert list(tasks.query(where)) == expected
+
+
+@pytest.mark.parametrize('limit, offset', [
+    (None, 0), (3, 0), (3, 2), (None, 5), (0, 0), (100, 15)])
+def test_limit_offset(db_with_queryable_tasks, limit, offset):
+    """offset matches are skipped, then at most limit returned."""
+    matching = tasks.query(done=False).all()
+    end = None if limit is None else offset + limit
+    assert tasks.query(done=False, limit=limit,
+                       offset=offset).all() == matching[offset:end]
+
+
+def test_where_and_fields_combine(db_with_queryable_tasks):
+    """Keyword fields narrow the Where passed in."""
+    assert (tasks.query(Where(owner='Katie'), done=False).all() ==
+            tasks.query(owner='Katie', done=False).all())
+
+
+def test_conflict_matches_nothing(db_with_queryable_tasks):
+    query = tasks.query(Where(owner='Katie') & Where(owner='Brian'))
+    assert query.all() == []
+    assert str(query.explain()).startswith('nothing can match')
+
+
+def test_query_is_lazy(db_with_3_tasks):
+    """The db is read when the query is iterated, each time."""
+    query = tasks.query(done=True)
+    assert len(query.all()) == 1
+    tasks.add(Task('later', 'Katie', True))
+    assert len(query.all()) == 2
+
+
+def test_explain(db_with_queryable_tasks):
+    """explain() names the index, and the db's own plan follows it."""
+    plan = tasks.query(min_id=3, max_id=4).explain()
+    assert plan.index == 'id'
+    assert str(plan).startswith('id range 3..4 (~')
+
+
+def test_no_filter_is_full_scan(db_with_3_tasks):
+    plan = tasks.query().explain()
+    assert plan.index is None
+    assert plan.estimate == 3
+
+
+@pytest.mark.parametrize('args, kwargs, exception', [
+    (('Katie',), {}, TypeError),
+    ((), {'limit': 'ten'}, TypeError),
+    ((), {'offset': None}, TypeError),
+    ((), {'limit': -1}, ValueError),
+    ((), {'offset': -1}, ValueError),
+    ((), {'owner': 3}, TypeError),
+    ((), {'color': 'red'}, TypeError),
+])
+def test_bad_arguments(tasks_db, args, kwargs, exception):
+    with pytest.raises(exception):
+        tasks.query(*args, **kwargs)
+
+
+def test_query_needs_db():
+    """Making a query is fine, reading it needs a connected db."""
+    query = tasks.TasksClient().query(owner='Katie')
+    with pytest.raises(tasks.api.UninitializedDatabase):
+        query.all()
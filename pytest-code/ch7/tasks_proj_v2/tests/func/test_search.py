@@ -0,0 +1,68 @@
+"""Test the tasks.search() API function."""
+
+import pytest
+import tasks
+from tasks import Task
+
+
+@pytest.fixture()
+def db_with_summaries(tasks_db):
+    """Connected db with summaries sharing some words."""
+    return tasks.add_many([
+        Task('Fix what Brian did', 'Katie'),
+        Task('Fixture for the API tests', 'Brian'),
+        Task('Write the docs', 'Katie', True),
+        Task('Fix the docs', 'Brian')])
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('fix', [0, 1, 3]),
+    ('FIX', [0, 1, 3]),
+    ('fix docs', [3]),
+    ('fix bri', [0]),
+    ('the', [1, 2, 3]),
+    ('docs brian', []),
+    ('zebra', []),
+])
+def test_search(db_with_summaries, text, expected):
+    """Every word searched for starts a word of the summary."""
+    found = tasks.search(text)
+    assert [t.id for t in found] == [db_with_summaries[i] for i in expected]
+
+
+def test_owner_and_limit(db_with_summaries):
+    assert [t.owner for t in tasks.search('fix', owner='Brian')] == [
+        'Brian', 'Brian']
+    assert tasks.search('fix', limit=2) == tasks.search('fix')[:2]
+    assert tasks.search('fix', limit=0) == []
+
+
+def test_returns_tasks(db_with_summaries):
+    assert tasks.search('write') == [tasks.get(db_with_summaries[2])]
+
+
+def test_index_follows_changes(db_with_summaries):
+    """Changes after a search, once the index is built, are found."""
+    fix_what, fixture, write, fix_docs = db_with_summaries
+    assert len(tasks.search('fix')) == 3
+    tasks.update(fix_what, Task(summary='Review what Brian did'))
+    tasks.update(write, Task(done=False))
+    tasks.delete(fixture)
+    new_id = tasks.add(Task('Fix the fix', 'Daniel'))
+    assert [t.id for t in tasks.search('fix')] == [fix_docs, new_id]
+    assert [t.id for t in tasks.search('review')] == [fix_what]
+    assert [t.id for t in tasks.search('write')] == [write]
+    tasks.delete_all()
+    assert tasks.search('fix') == []
+
+
+@pytest.mark.parametrize('args, exception', [
+    ((3,), TypeError),
+    (('fix', 3), TypeError),
+    (('fix', None, 'ten'), TypeError),
+    (('fix', None, -1), ValueError),
+    (('...',), ValueError),
+])
+def test_bad_arguments(tasks_db, args, exception):
+    with pytest.raises(exception):
+        tasks.search(*args)
@@ -0,0 +1,165 @@
+"""Test tasks serve, through the 'remote' db talking to it."""
+
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+from tasks.api import _open_db
+from tasks.planner import Where, plan
+from tasks.server import TasksServer
+from tasks.tasksdb_remote import TasksDB_Remote, socket_path
+
+
+@pytest.fixture()
+def server(tmpdir):
+    """A TasksServer for an sqlite db, running in a background thread."""
+    db_path = str(tmpdir)
+    server = TasksServer(_open_db(db_path, 'sqlite'), socket_path(db_path))
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield server
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(server.stop())
+    loop.close()
+    server.db.stop_tasks_db()
+
+
+@pytest.fixture()
+def client(server, open_db):
+    """A 'remote' db connected to server."""
+    return open_db('remote', timeout=10)
+
+
+def test_calls_reach_db(client, server, new_task):
+    """What the client does happens to the db the server has open."""
+    task_id = client.add(new_task('serve it', 'brian'))
+    client.update(task_id, {'done': True})
+    assert server.db.get(task_id)['done'] is True
+    assert client.get(task_id) == server.db.get(task_id)
+    assert client.count() == 1
+
+
+def test_iter_tasks_pages(client, new_task):
+    """iter_tasks() asks for one page at a time."""
+    client.add_many([new_task(str(i), 'a' if i % 2 else 'b')
+                     for i in range(25)])
+    pages = list(client.iter_tasks('a', page_size=5))
+    assert [len(p) for p in pages] == [5, 5, 2]
+    assert [t['id'] for p in pages for t in p] == list(range(2, 26, 2))
+
+
+def test_paging_carries_on(client, server, new_task, mocker):
+    """The server goes on with its iter_tasks() for the next page."""
+    client.add_many([new_task(str(i)) for i in range(25)])
+    iter_tasks = mocker.spy(server.db, 'iter_tasks')
+    pages = list(client.iter_tasks(page_size=10))
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert iter_tasks.call_count == 1
+    # a page from somewhere else starts over
+    assert [t['id'] for t in next(client.iter_tasks(after_id=20))] == [
+        21, 22, 23, 24, 25]
+    assert iter_tasks.call_count == 2
+
+
+def test_errors_come_back(client):
+    """A ValueError in the server is raised as a ValueError here."""
+    with pytest.raises(ValueError):
+        client.delete(99)
+    with pytest.raises(ValueError):
+        client._call('stop_tasks_db')
+    assert client.count() == 0
+
+
+@pytest.fixture()
+def short_lines(monkeypatch):
+    """Servers started after this take request lines of up to 1000 bytes."""
+    monkeypatch.setattr('tasks.server._LINE_LIMIT', 1000)
+
+
+def test_long_line_refused(short_lines, server):
+    """A line over the limit gets an error back, then the server hangs up."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(server.path)
+    sock.sendall(b'{"method": "count", "args": ["' + b'x' * 2000 + b'"]}\n')
+    reply = sock.makefile('rb').read()
+    sock.close()
+    assert json.loads(reply.decode('utf-8')) == {
+        'error': 'ValueError', 'message': 'request line too long'}
+
+
+def test_concurrent_clients(server, tmpdir, new_task):
+    """Many clients at once, none of their tasks are lost."""
+    ids = []
+
+    def add_tasks():
+        db = TasksDB_Remote(str(tmpdir), timeout=10)
+        for i in range(20):
+            ids.append(db.add(new_task(str(i))))
+        db.stop_tasks_db()
+
+    threads = [threading.Thread(target=add_tasks) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(ids) == list(range(1, 161))
+    assert server.db.count() == 160
+
+
+def test_no_server(tmpdir):
+    """Connecting without a server raises an EnvironmentError."""
+    with pytest.raises(EnvironmentError):
+        TasksDB_Remote(str(tmpdir))
+
+
+def test_stale_socket_replaced(tmpdir):
+    """A socket file left by a dead server doesn't stop a new one."""
+    path = socket_path(str(tmpdir))
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    dead.bind(path)
+    dead.close()
+    with pytest.raises(EnvironmentError):
+        TasksDB_Remote(str(tmpdir))
+    server = TasksServer(None, path)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start())
+    loop.run_until_complete(server.stop())
+    loop.close()
+
+
+def test_query_runs_on_server(client, server, new_task):
+    """A query plan is sent over and run by the server's db."""
+    client.add_many([new_task('Fix {}'.format(i), 'a' if i % 2 else 'b')
+                     for i in range(10)])
+    assert client.indexes == server.db.indexes
+    where = Where(owner='a', summary_prefix='Fix')
+    found = client.query(plan(where, client.indexes, 10, 10, limit=3))
+    assert found == server.db.query(plan(where, server.db.indexes, 10, 10,
+                                         limit=3))
+    assert [t['id'] for t in found] == [2, 4, 6]
+
+
+def test_search_runs_on_server(client, server, new_task):
+    client.add_many([new_task('Fix it', 'a'), new_task('fixture', 'b')])
+    assert client.search(['fix'], 'b', None) == server.db.search(['fix'], 'b')
+
+
+def test_many_changes_run_on_server(client, server, new_task):
+    """update_many() and delete_many() send their Where to the server."""
+    client.add_many([new_task('a', 'brian'), new_task('b', 'okken')])
+    assert client.update_many(None, {'done': True}, Where(owner='brian')) == 1
+    assert server.db.count(done=True) == 1
+    assert client.delete_many([1, 2], Where(done=False)) == 1
+    assert [t['summary'] for t in server.db.list_tasks()] == ['a']
+
+
+def test_changes_since_runs_on_server(client, server, new_task):
+    client.add_many([new_task('a'), new_task('b')])
+    client.delete(1)
+    assert client.changes_since(0) == server.db.changes_since(0)
+    assert client.changes_since(0)[1:] == ([1], 2)
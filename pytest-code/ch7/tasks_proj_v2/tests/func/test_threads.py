@@ -0,0 +1,137 @@
+"""Test the API from many threads at once, and tasks.TasksClient."""
+
+import threading
+import time
+
+import pytest
+import tasks
+from tasks import Task, TasksClient
+
+THREADS = 8
+TASKS_PER_THREAD = 25
+
+
+def run_threads(target, n=THREADS):
+    """Run target(i) in n threads, re-raise the first error."""
+    errors = []
+
+    def call(i):
+        try:
+            target(i)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+
+def test_stress(tasks_db):
+    """Writers and readers at once leave every task as last written."""
+    stop_reading = threading.Event()
+
+    def writer(i):
+        owner = 'owner{}'.format(i)
+        for n in range(TASKS_PER_THREAD):
+            task_id = tasks.add(Task(str(n), owner))
+            tasks.update(task_id, Task(done=True))
+            tasks.update(task_id, Task(summary='done ' + str(n), done=True))
+
+    def reader():
+        while not stop_reading.is_set():
+            for t in tasks.list_tasks():
+                assert isinstance(t.id, int)
+            tasks.count()
+
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for t in readers:
+        t.start()
+    try:
+        run_threads(writer)
+    finally:
+        stop_reading.set()
+        for t in readers:
+            t.join()
+    all_tasks = tasks.list_tasks()
+    assert len(all_tasks) == tasks.count() == THREADS * TASKS_PER_THREAD
+    assert len({t.id for t in all_tasks}) == len(all_tasks)
+    assert all(t.done and t.summary.startswith('done ') for t in all_tasks)
+    for i in range(THREADS):
+        assert len(tasks.list_tasks('owner{}'.format(i))) == TASKS_PER_THREAD
+
+
+def test_batch_excludes_other_threads(tasks_db):
+    """Another thread's write waits for the batch to finish."""
+    order = []
+
+    def add(label):
+        tasks.add(Task(label))
+        order.append(label)
+
+    with tasks.batch():
+        t = threading.Thread(target=add, args=('outside',))
+        t.start()
+        t.join(0.1)
+        waited = t.is_alive()
+        add('inside')
+    t.join()
+    assert waited
+    assert order == ['inside', 'outside']
+
+
+def test_client(tmpdir):
+    """A TasksClient has its own connection, apart from the API's."""
+    with TasksClient(str(tmpdir), 'sqlite') as client:
+        task_id = client.add(Task('own db'))
+        assert client.get(task_id).summary == 'own db'
+        assert [t.summary for t in client.iter_tasks()] == ['own db']
+    with pytest.raises(tasks.api.UninitializedDatabase):
+        client.count()
+
+
+def slowly(method, delay):
+    """Return method, made to sleep delay seconds before each call."""
+    def slow(*args, **kwargs):
+        time.sleep(delay)
+        return method(*args, **kwargs)
+    return slow
+
+
+def slow_db(client, mocker, delay):
+    """Make client's db take delay seconds per list_tasks() and add(),
+    waiting outside the interpreter like a Mongo or server round trip."""
+    for name in ('list_tasks', 'add'):
+        mocker.patch.object(client._db, name, side_effect=slowly(
+            getattr(client._db, name), delay))
+
+
+def test_reads_scale(tmpdir, mocker):
+    """Reads from many threads wait for the db side by side.
+
+    The dbs in this process serialize their own reads, so the gain
+    shows with a db that waits on I/O, here one that sleeps.
+    """
+    delay = 0.05
+    with TasksClient(str(tmpdir), 'sqlite') as client:
+        client.add(Task('read me'))
+        slow_db(client, mocker, delay)
+        start = time.perf_counter()
+        run_threads(lambda i: client.list_tasks())
+        elapsed = time.perf_counter() - start
+    assert elapsed < THREADS * delay / 2
+
+
+def test_writes_serialize(tmpdir, mocker):
+    """Writes from many threads run one at a time."""
+    delay = 0.02
+    with TasksClient(str(tmpdir), 'sqlite') as client:
+        slow_db(client, mocker, delay)
+        start = time.perf_counter()
+        run_threads(lambda i: client.add(Task(str(i))))
+        elapsed = time.perf_counter() - start
+        assert client.count() == THREADS
+    assert elapsed >= THREADS * delay
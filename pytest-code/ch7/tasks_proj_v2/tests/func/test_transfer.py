@@ -0,0 +1,101 @@
+"""Test tasks.export_stream() and tasks.import_stream()."""
+
+import io
+
+import pytest
+import tasks
+from tasks import Task
+
+
+def without_ids(task_list):
+    return [t._replace(id=None) for t in task_list]
+
+
+@pytest.mark.parametrize('name', ['t.jsonl', 't.csv', 't.bin',
+                                  't.jsonl.gz', 't.csv.gz', 't.bin.gz'])
+def test_round_trip(db_with_multi_per_owner, tmpdir, name):
+    """Exported tasks import as the same tasks, with new ids."""
+    path = str(tmpdir.join(name))
+    tasks.update(1, Task(done=True))
+    before = tasks.list_tasks()
+    assert tasks.export_stream(path, chunk_size=4) == 9
+    tasks.delete_all()
+    assert tasks.import_stream(path) == 9
+    assert without_ids(tasks.list_tasks()) == without_ids(before)
+    assert tasks.search('cookie')[0].done
+
+
+def test_file_objects(db_with_3_tasks):
+    """Open binary files are written and read, and left open."""
+    out = io.BytesIO()
+    assert tasks.export_stream(out, 'bin', owner='Brian', compress=True) == 1
+    assert not out.closed
+    out.seek(0)
+    assert tasks.import_stream(out) == 1
+    assert tasks.count('Brian') == 2
+
+
+def test_export_reads_pages(db_with_multi_per_owner, tmpdir, mocker):
+    """The db is read a page of chunk_size tasks at a time."""
+    iter_tasks = mocker.spy(tasks.api._client._db, 'iter_tasks')
+    tasks.export_stream(str(tmpdir.join('t.jsonl')), chunk_size=4)
+    iter_tasks.assert_called_once_with(None, 4, None)
+
+
+def test_import_chunks(db_with_multi_per_owner, tmpdir, mocker):
+    """Each chunk is one add_many(), and reported after it's added."""
+    path = str(tmpdir.join('t.csv'))
+    tasks.export_stream(path)
+    add_many = mocker.spy(tasks.api._client._db, 'add_many')
+    done = []
+    assert tasks.import_stream(path, chunk_size=4, progress=done.append) == 9
+    assert [len(c[0][0]) for c in add_many.call_args_list] == [4, 4, 1]
+    assert done == [4, 8, 9]
+
+
+def test_import_resume(db_with_multi_per_owner, tmpdir):
+    """An import stopped between chunks picks up where it stopped."""
+    path = str(tmpdir.join('t.jsonl.gz'))
+    tasks.export_stream(path)
+    done = []
+
+    def stop_after_two(n):
+        done.append(n)
+        if len(done) == 2:
+            raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        tasks.import_stream(path, chunk_size=3, progress=stop_after_two)
+    assert tasks.count() == 15
+    assert tasks.import_stream(path, chunk_size=3, skip=done[-1]) == 3
+    assert tasks.count() == 18
+    assert tasks.count('Daniel') == 6
+
+
+def test_import_bad_task(tasks_db):
+    """Tasks before a bad one are added, the error names the task."""
+    source = io.BytesIO(b'{"summary": "a", "owner": null, "done": true}\n'
+                        b'{"summary": "b", "owner": null, "done": 1}\n')
+    with pytest.raises(ValueError, match='task 2'):
+        tasks.import_stream(source, chunk_size=1)
+    assert tasks.count() == 1
+
+
+@pytest.mark.parametrize('kwargs', [{'format': 'xml'}, {'chunk_size': 0}])
+def test_bad_export_args(tasks_db, kwargs):
+    with pytest.raises(ValueError):
+        tasks.export_stream(io.BytesIO(), **kwargs)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'format': 'xml'}, {'chunk_size': 0}, {'skip': -1}])
+def test_bad_import_args(tasks_db, kwargs):
+    with pytest.raises(ValueError):
+        tasks.import_stream(io.BytesIO(b''), **kwargs)
+
+
+def test_bad_arg_types(tasks_db):
+    with pytest.raises(TypeError):
+        tasks.export_stream(io.BytesIO(), owner=3)
+    with pytest.raises(TypeError):
+        tasks.import_stream(io.BytesIO(b''), chunk_size='10')
@@ -10,3 +10,26 @@ def test_unique_id(tasks_db, tasks_mult_per_owner):
     for t in existing_tasks:
         assert uid != t.id
 
+
+def test_unique_id_is_next_add(tasks_db, tasks_just_a_few):
+    """unique_id() is the id the next add() will use."""
+    tasks.add_many(tasks_just_a_few)
+    uid = tasks.unique_id()
+    assert tasks.add(tasks_just_a_few[0]) == uid
+
+
+def test_reserve_ids(db_with_3_tasks, tasks_just_a_few):
+    """reserve_ids(n) returns n consecutive ids add() won't use."""
+    # GIVEN a db with 3 tasks
+    existing = {t.id for t in tasks.list_tasks()}
+
+    # WHEN 5 ids are reserved
+    reserved = tasks.reserve_ids(5)
+
+    # THEN they are consecutive and unused
+    assert reserved == list(range(reserved[0], reserved[0] + 5))
+    assert existing.isdisjoint(reserved)
+
+    # AND tasks added later don't get them
+    new_ids = tasks.add_many(tasks_just_a_few)
+    assert set(reserved).isdisjoint(new_ids)
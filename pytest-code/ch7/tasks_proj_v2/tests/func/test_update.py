@@ -0,0 +1,69 @@
+"""Test tasks.update(), which sets only the fields given."""
+
+import pytest
+import tasks
+from tasks import Task, TasksClient
+
+
+@pytest.fixture()
+def task_id(db_with_3_tasks):
+    """Id of the task 'Write some code', owned by Brian and done."""
+    return tasks.list_tasks('Brian')[0].id
+
+
+def test_update_keeps_other_fields(task_id):
+    tasks.update(task_id, Task(summary='Sleep', done=None))
+    assert tasks.get(task_id) == Task('Sleep', 'Brian', True, task_id)
+
+
+def test_update_sends_changed_fields(task_id, mocker):
+    """The db is sent a patch, and is not read first."""
+    db = tasks.api._client._db
+    get = mocker.spy(db, 'get')
+    update = mocker.spy(db, 'update')
+    tasks.update(task_id, Task(owner='Okken', done=None))
+    update.assert_called_once_with(task_id, {'owner': 'Okken'})
+    assert not get.called
+    assert tasks.get(task_id) == Task('Write some code', 'Okken', True,
+                                      task_id)
+
+
+def test_update_default_done(task_id):
+    """done defaults to False in a Task, so leaving it out sets it."""
+    tasks.update(task_id, Task(owner='Okken'))
+    assert tasks.get(task_id) == Task('Write some code', 'Okken', False,
+                                      task_id)
+
+
+def test_update_missing_id(db_with_3_tasks):
+    with pytest.raises(ValueError):
+        tasks.update(999, Task(done=True))
+    assert tasks.count() == 3
+
+
+def test_update_nothing_missing_id(db_with_3_tasks):
+    """An update setting no fields still checks the id, on every db."""
+    with pytest.raises(ValueError):
+        tasks.api._client._db.update(999, {})
+
+
+def test_delete_missing_id(db_with_3_tasks):
+    """Every db raises ValueError for a task it doesn't have."""
+    with pytest.raises(ValueError):
+        tasks.delete(999)
+    assert tasks.count() == 3
+
+
+@pytest.mark.parametrize('db_type', ['tiny', 'sqlite'])
+def test_clients_update_different_fields(tmpdir, db_type):
+    """Two clients of one db, each setting a field, keep both changes."""
+    with TasksClient(str(tmpdir), db_type) as first:
+        task_id = first.add(Task('write', 'brian'))
+        with TasksClient(str(tmpdir), db_type) as second:
+            first.get(task_id)
+            second.get(task_id)
+            first.update(task_id, Task(owner='okken', done=None))
+            second.update(task_id, Task(summary='review', done=None))
+            assert second.get(task_id) == Task('review', 'okken', False,
+                                               task_id)
+        assert first.get(task_id) == Task('review', 'okken', False, task_id)
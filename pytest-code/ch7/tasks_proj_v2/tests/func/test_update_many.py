@@ -0,0 +1,123 @@
+"""Test tasks.update_many() and tasks.delete_many()."""
+
+import pytest
+import tasks
+from tasks import Task, TasksClient, Where
+
+
+def summaries(task_list):
+    return sorted(t.summary for t in task_list)
+
+
+@pytest.fixture()
+def ids(db_with_multi_per_owner):
+    """Ids of the 9 tasks, 3 each for Raphael, Michelle and Daniel."""
+    return [t.id for t in tasks.list_tasks()]
+
+
+def test_update_by_filter(ids):
+    """Every match changes, and nothing else."""
+    assert tasks.update_many(Where(owner='Raphael'), {'done': True}) == 3
+    assert summaries(tasks.query(done=True)) == [
+        'Make a cookie', 'Move to Berlin', 'Use an emoji']
+    assert tasks.count(done=False) == 6
+
+
+def test_update_by_ids(ids):
+    """Ids not in the db are skipped."""
+    assert tasks.update_many([ids[0], ids[4], 999], {'owner': 'Okken'}) == 2
+    assert summaries(tasks.list_tasks('Okken')) == ['Inspire',
+                                                    'Make a cookie']
+    assert tasks.count('Raphael') == 2
+    assert tasks.count('Michelle') == 2
+
+
+def test_update_summary(ids):
+    """The summary is indexed again, even if it no longer matches."""
+    changed = tasks.update_many(Where(summary_prefix='M'),
+                                {'summary': 'Bake bread', 'owner': None})
+    assert changed == 2
+    assert summaries(tasks.search('bread')) == ['Bake bread'] * 2
+    assert tasks.search('cookie') == []
+    assert tasks.count(None, False) == 9
+    assert [t.owner for t in tasks.search('bake')] == [None, None]
+
+
+def test_update_everything(ids):
+    assert tasks.update_many(Where(), {'done': True}) == 9
+    assert tasks.count(done=True) == 9
+
+
+def test_delete_by_filter(ids):
+    assert tasks.delete_many(Where(owner='Michelle')) == 3
+    assert tasks.list_tasks('Michelle') == []
+    assert tasks.count() == 6
+    assert tasks.search('inspire') == []
+    assert tasks.get(ids[0]).summary == 'Make a cookie'
+
+
+def test_delete_by_ids(ids):
+    assert tasks.delete_many([ids[1], ids[2], 999]) == 2
+    assert [t.id for t in tasks.list_tasks()] == [ids[0]] + ids[3:]
+    assert tasks.count('Raphael') == 1
+
+
+def test_delete_with_id_range(ids):
+    assert tasks.delete_many(Where(min_id=ids[3], max_id=ids[5])) == 3
+    assert tasks.count() == 6
+    assert tasks.list_tasks('Michelle') == []
+
+
+@pytest.mark.parametrize('ids_or_filter', [
+    [], Where(min_id=5, max_id=1), Where(owner='Nobody')])
+def test_nothing_matches(ids, ids_or_filter):
+    assert tasks.update_many(ids_or_filter, {'done': True}) == 0
+    assert tasks.delete_many(ids_or_filter) == 0
+    assert tasks.count() == 9
+
+
+def test_counts_kept(ids):
+    """The kept counts agree with the tasks after many changes."""
+    tasks.update_many(Where(owner='Daniel'), {'owner': 'Raphael'})
+    tasks.update_many(ids[::2], {'done': True})
+    tasks.delete_many(Where(done=True, owner='Raphael'))
+    assert tasks.check_counts() == []
+    assert tasks.stats() == {
+        'Raphael': {'done': 0, 'not_done': 2, 'total': 2},
+        'Michelle': {'done': 1, 'not_done': 2, 'total': 3}}
+
+
+@pytest.mark.parametrize('db_type', ['tiny', 'log', 'sqlite', 'mmap'])
+def test_changes_saved(tmpdir, db_type):
+    """Changes made by update_many and delete_many are there on reopen."""
+    with TasksClient(str(tmpdir), db_type) as client:
+        ids = client.add_many(Task(str(i), 'a' if i % 2 else 'b')
+                              for i in range(10))
+        client.update_many(Where(owner='a'), {'summary': 'odd', 'done': True})
+        client.delete_many(ids[:4])
+    with TasksClient(str(tmpdir), db_type) as client:
+        assert [(t.summary, t.done) for t in client.list_tasks()] == [
+            ('4', False), ('odd', True), ('6', False), ('odd', True),
+            ('8', False), ('odd', True)]
+        assert client.count('a') == 3
+
+
+@pytest.mark.parametrize('changes', [
+    {}, {'id': 3}, {'summary': 3}, {'owner': 3}, {'done': 'yes'}])
+def test_bad_changes(ids, changes):
+    with pytest.raises(ValueError):
+        tasks.update_many(ids, changes)
+
+
+@pytest.mark.parametrize('ids_or_filter', ['3', 3, [1, 'two'], None],
+                         ids=['str', 'int', 'not int', 'None'])
+def test_bad_ids_or_filter(tasks_db, ids_or_filter):
+    with pytest.raises(TypeError):
+        tasks.update_many(ids_or_filter, {'done': True})
+    with pytest.raises(TypeError):
+        tasks.delete_many(ids_or_filter)
+
+
+def test_changes_not_dict(tasks_db):
+    with pytest.raises(TypeError):
+        tasks.update_many([1], Task(done=True))
@@ -1,3 +1,4 @@
+import socket
 from click.testing import CliRunner
 from contextlib import contextmanager
 import pytest
@@ -13,10 +14,10 @@ def stub_tasks_db():
 
 def test_list_no_args(mocker):
     mocker.patch.object(tasks.cli, '_tasks_db', new=stub_tasks_db)
-    mocker.patch.object(tasks.cli.tasks, 'list_tasks', return_value=[])
+    mocker.patch.object(tasks.cli.tasks, 'iter_tasks', return_value=[])
     runner = CliRunner()
     runner.invoke(tasks.cli.tasks_cli, ['list'])
-    tasks.cli.tasks.list_tasks.assert_called_once_with(None)
+    tasks.cli.tasks.iter_tasks.assert_called_once_with(None)
 
 
 @pytest.fixture()
@@ -25,7 +26,7 @@ def no_db(mocker):
 
 
 def test_list_print_empty(no_db, mocker):
-    mocker.patch.object(tasks.cli.tasks, 'list_tasks', return_value=[])
+    mocker.patch.object(tasks.cli.tasks, 'iter_tasks', return_value=[])
     runner = CliRunner()
     result = runner.invoke(tasks.cli.tasks_cli, ['list'])
     expected_output = ("  ID      owner  done summary\n"
@@ -40,7 +41,7 @@ def test_list_print_many_items(no_db, mocker):
         Task('modify chapter', 'Brian', False, 3),
         Task('finalize chapter', 'Katie', False, 4),
     )
-    mocker.patch.object(tasks.cli.tasks, 'list_tasks',
+    mocker.patch.object(tasks.cli.tasks, 'iter_tasks',
                         return_value=many_tasks)
     runner = CliRunner()
     result = runner.invoke(tasks.cli.tasks_cli, ['list'])
@@ -54,14 +55,109 @@ def test_list_print_many_items(no_db, mocker):
 
 
 def test_list_dash_o(no_db, mocker):
-    mocker.patch.object(tasks.cli.tasks, 'list_tasks')
+    mocker.patch.object(tasks.cli.tasks, 'iter_tasks')
     runner = CliRunner()
     runner.invoke(tasks.cli.tasks_cli, ['list', '-o', 'brian'])
-    tasks.cli.tasks.list_tasks.assert_called_once_with('brian')
+    tasks.cli.tasks.iter_tasks.assert_called_once_with('brian')
 
 
 def test_list_dash_dash_owner(no_db, mocker):
-    mocker.patch.object(tasks.cli.tasks, 'list_tasks')
+    mocker.patch.object(tasks.cli.tasks, 'iter_tasks')
     runner = CliRunner()
     runner.invoke(tasks.cli.tasks_cli, ['list', '--owner', 'okken'])
-    tasks.cli.tasks.list_tasks.assert_called_once_with('okken')
+    tasks.cli.tasks.iter_tasks.assert_called_once_with('okken')
+
+
+def test_search(no_db, mocker):
+    mocker.patch.object(tasks.cli.tasks, 'search', return_value=[
+        Task('fix the build', 'Brian', False, 7)])
+    runner = CliRunner()
+    result = runner.invoke(tasks.cli.tasks_cli,
+                           ['search', 'fix bui', '-o', 'Brian', '-n', '5'])
+    tasks.cli.tasks.search.assert_called_once_with('fix bui', 'Brian', 5)
+    assert result.output == ("  ID      owner  done summary\n"
+                             "  --      -----  ---- -------\n"
+                             "   7      Brian False fix the build\n")
+
+
+def test_count_filters(no_db, mocker):
+    mocker.patch.object(tasks.cli.tasks, 'count', return_value=3)
+    runner = CliRunner()
+    result = runner.invoke(tasks.cli.tasks_cli,
+                           ['count', '-o', 'brian', '--done', 'True'])
+    tasks.cli.tasks.count.assert_called_once_with('brian', True)
+    assert result.output == '3\n'
+
+
+def test_export_options(no_db, mocker):
+    mocker.patch.object(tasks.cli.tasks, 'export_stream', return_value=2)
+    result = CliRunner().invoke(tasks.cli.tasks_cli,
+                                ['export', 't.csv', '-o', 'brian', '-z'])
+    tasks.cli.tasks.export_stream.assert_called_once_with(
+        't.csv', None, 'brian', True)
+    assert result.output == 'exported 2 tasks\n'
+
+
+def test_export_gzip_default(no_db, mocker):
+    """Without -z the API decides, from the path."""
+    mocker.patch.object(tasks.cli.tasks, 'export_stream', return_value=0)
+    CliRunner().invoke(tasks.cli.tasks_cli, ['export', 't.jsonl.gz'])
+    tasks.cli.tasks.export_stream.assert_called_once_with(
+        't.jsonl.gz', None, None, None)
+
+
+def test_import_resume(no_db, mocker, tmpdir):
+    """An interrupted import leaves its progress for --resume."""
+    path = str(tmpdir.join('t.jsonl'))
+
+    def fail_after_a_chunk(path, format, chunk_size, skip, progress):
+        progress(skip + chunk_size)
+        raise ValueError('task 9 is unreadable')
+
+    mocker.patch.object(tasks.cli.tasks, 'import_stream',
+                        side_effect=fail_after_a_chunk)
+    runner = CliRunner()
+    result = runner.invoke(tasks.cli.tasks_cli, ['import', path, '-n', '8'])
+    assert isinstance(result.exception, ValueError)
+    assert tmpdir.join('t.jsonl.progress').read() == '8'
+
+    mocker.patch.object(tasks.cli.tasks, 'import_stream', return_value=5)
+    result = runner.invoke(tasks.cli.tasks_cli,
+                           ['import', path, '-n', '8', '--resume'])
+    assert result.output == 'imported 5 tasks\n'
+    assert tasks.cli.tasks.import_stream.call_args[0][:4] == (
+        path, None, 8, 8)
+    assert not tmpdir.join('t.jsonl.progress').exists()
+
+
+@pytest.fixture()
+def config(mocker):
+    mocker.patch.object(tasks.config, 'get_config',
+                        return_value=tasks.config.TasksConfig('/db', 'tiny'))
+    mocker.patch.object(tasks.cli.tasks, 'stop_tasks_db')
+    mocker.patch.object(tasks.cli.tasks, 'count', return_value=0)
+
+
+def test_uses_server(config, mocker):
+    mocker.patch.object(tasks.cli.tasks, 'start_tasks_db')
+    CliRunner().invoke(tasks.cli.tasks_cli, ['count'])
+    tasks.cli.tasks.start_tasks_db.assert_called_once_with('/db', 'remote')
+
+
+def test_no_server_falls_back(config, mocker):
+    mocker.patch.object(tasks.cli.tasks, 'start_tasks_db',
+                        side_effect=[socket.error('no server'), None])
+    CliRunner().invoke(tasks.cli.tasks_cli, ['count'])
+    tasks.cli.tasks.start_tasks_db.assert_called_with('/db', 'tiny')
+
+
+def test_db_uri_passed_on(mocker):
+    config = tasks.config.TasksConfig('/db', 'mongo', 'mongodb://h:1/')
+    mocker.patch.object(tasks.config, 'get_config', return_value=config)
+    mocker.patch.object(tasks.cli.tasks, 'stop_tasks_db')
+    mocker.patch.object(tasks.cli.tasks, 'count', return_value=0)
+    mocker.patch.object(tasks.cli.tasks, 'start_tasks_db',
+                        side_effect=[socket.error('no server'), None])
+    CliRunner().invoke(tasks.cli.tasks_cli, ['count'])
+    tasks.cli.tasks.start_tasks_db.assert_called_with(
+        '/db', 'mongo', uri='mongodb://h:1/')
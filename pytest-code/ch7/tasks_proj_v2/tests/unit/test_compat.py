@@ -0,0 +1,13 @@
+"""Test tasks.compat."""
+
+from tasks.compat import replace
+
+
+def test_replace_overwrites(tmpdir):
+    """replace() moves a file over one that already exists."""
+    src, dst = tmpdir.join('new'), tmpdir.join('old')
+    src.write('new')
+    dst.write('old')
+    replace(str(src), str(dst))
+    assert dst.read() == 'new'
+    assert not src.exists()
@@ -0,0 +1,40 @@
+"""Test tasks.counters.TaskCounts."""
+
+from tasks.counters import TaskCounts, differences
+
+
+def task(owner, done):
+    return {'summary': 's', 'owner': owner, 'done': done}
+
+
+def test_counts():
+    counts = TaskCounts.of([task('brian', True), task('brian', False),
+                            task('okken', False), task(None, False)])
+    assert counts.count() == 4
+    assert counts.count(done=False) == 3
+    assert counts.count(owner='brian') == 2
+    assert counts.count(owner='brian', done=True) == 1
+    assert counts.count(owner='nobody') == 0
+
+
+def test_add_remove():
+    """Pairs that drop to 0 are gone from rows()."""
+    counts = TaskCounts()
+    counts.add('brian', True)
+    counts.add('brian', False)
+    counts.remove('brian', True)
+    assert counts.rows() == [['brian', False, 1]]
+    assert counts.count(done=True) == 0
+
+
+def test_differences():
+    counted = TaskCounts.of([task('brian', True), task('okken', False)])
+    actual = TaskCounts.of([task('brian', True), task('brian', True)])
+    assert sorted(counted.differences(actual)) == [
+        ['brian', True, 1, 2], ['okken', False, 1, 0]]
+    assert actual.differences(actual) == []
+
+
+def test_differences_of_rows():
+    """done is compared as a bool, SQLite hands back 0 and 1."""
+    assert differences([['a', True, 2]], [('a', 1, 2)]) == []
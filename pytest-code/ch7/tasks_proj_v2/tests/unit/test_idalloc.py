@@ -0,0 +1,95 @@
+"""Test the IdAllocator shared by the db wrappers."""
+
+from tasks.idalloc import IdAllocator
+from tasks.tasksdb_tinydb import TasksDB_TinyDB
+
+
+def test_allocate_counts_up():
+    """Without reuse, ids just go up."""
+    ids = IdAllocator()
+    assert [ids.allocate() for _ in range(3)] == [1, 2, 3]
+
+
+def test_peek_does_not_reserve():
+    """peek() returns the next id but doesn't use it up."""
+    ids = IdAllocator(high_water=10)
+    assert ids.peek() == 11
+    assert ids.peek() == 11
+    assert ids.allocate() == 11
+
+
+def test_reserve_block():
+    """reserve(n) returns n consecutive ids past everything handed out."""
+    ids = IdAllocator()
+    ids.allocate()
+    assert ids.reserve(3) == [2, 3, 4]
+    assert ids.allocate() == 5
+
+
+def test_release_ignored_without_reuse():
+    """Released ids are not handed out again by default."""
+    ids = IdAllocator()
+    ids.reserve(3)
+    ids.release([2])
+    assert ids.allocate() == 4
+
+
+def test_release_with_reuse():
+    """With reuse_ids, released ids come back lowest first."""
+    ids = IdAllocator(reuse_ids=True)
+    ids.reserve(5)
+    ids.release([4, 2])
+    assert ids.peek() == 2
+    assert [ids.allocate() for _ in range(3)] == [2, 4, 6]
+
+
+def test_reserve_skips_free_list():
+    """Blocks always come from the high-water mark, never the free list."""
+    ids = IdAllocator(reuse_ids=True)
+    ids.reserve(3)
+    ids.release([2])
+    assert ids.reserve(2) == [4, 5]
+    assert ids.allocate() == 2
+
+
+def test_reset():
+    """reset() starts over at 1."""
+    ids = IdAllocator(high_water=7, free=[3], reuse_ids=True)
+    ids.reset()
+    assert ids.allocate() == 1
+
+
+def test_save_and_restore():
+    """State passed to save() restores an equivalent allocator."""
+    saved = []
+    ids = IdAllocator(reuse_ids=True, save=saved.append)
+    ids.reserve(4)
+    ids.release([3])
+    restored = IdAllocator(reuse_ids=True, **saved[-1])
+    assert restored.allocate() == 3
+    assert restored.allocate() == 5
+
+
+def test_tinydb_ids_survive_reopen(tmpdir):
+    """The TinyDB wrapper persists its high-water mark."""
+    task = {'summary': 'a', 'owner': None, 'done': False, 'id': None}
+    db = TasksDB_TinyDB(str(tmpdir))
+    db.add_many([task, task])
+    db.delete(2)
+    db.stop_tasks_db()
+    db = TasksDB_TinyDB(str(tmpdir))
+    assert db.add(task) == 3
+    db.stop_tasks_db()
+
+
+def test_tinydb_reuse_ids_survive_reopen(tmpdir):
+    """The TinyDB wrapper persists its free list."""
+    task = {'summary': 'a', 'owner': None, 'done': False, 'id': None}
+    db = TasksDB_TinyDB(str(tmpdir), reuse_ids=True)
+    db.add_many([task, task, task])
+    db.delete(2)
+    db.stop_tasks_db()
+    db = TasksDB_TinyDB(str(tmpdir), reuse_ids=True)
+    assert db.unique_id() == 2
+    assert db.add(task) == 2
+    db.stop_tasks_db()
@@ -0,0 +1,92 @@
+"""Test the owner index in the TinyDB wrapper."""
+
+import pytest
+import tinydb
+from tasks.tasksdb_tinydb import TasksDB_TinyDB
+
+
+@pytest.fixture()
+def tiny_db(open_db, new_task):
+    """A TasksDB_TinyDB with a few tasks for two owners."""
+    db = open_db('tiny')
+    db.add_many([new_task('a', 'brian'), new_task('b', 'katie'),
+                 new_task('c', 'brian'), new_task('d')])
+    return db
+
+
+def summaries(task_dicts):
+    """Return the summaries from a list of task dicts."""
+    return [t['summary'] for t in task_dicts]
+
+
+def test_index_built_lazily(tiny_db):
+    """Nothing is indexed until someone lists by owner."""
+    assert tiny_db._owners is None
+    assert summaries(tiny_db.list_tasks('brian')) == ['a', 'c']
+    assert tiny_db._owners is not None
+
+
+def test_list_by_owner_has_ids(tiny_db):
+    """Tasks listed via the index have their id filled in."""
+    for t in tiny_db.list_tasks('brian'):
+        assert tiny_db.get(t['id']) == t
+
+
+def test_no_owner(tiny_db):
+    """Unknown owners have no tasks."""
+    assert tiny_db.list_tasks('nobody') == []
+
+
+def test_add_after_index_built(tiny_db, new_task):
+    """add() and add_many() keep the index current."""
+    tiny_db.list_tasks('brian')
+    tiny_db.add(new_task('e', 'brian'))
+    tiny_db.add_many([new_task('f', 'okken')])
+    assert summaries(tiny_db.list_tasks('brian')) == ['a', 'c', 'e']
+    assert summaries(tiny_db.list_tasks('okken')) == ['f']
+
+
+def test_update_moves_owner(tiny_db):
+    """Changing the owner moves the task to the new owner."""
+    tiny_db.list_tasks('brian')
+    tiny_db.update(1, {'owner': 'katie'})
+    assert summaries(tiny_db.list_tasks('brian')) == ['c']
+    assert summaries(tiny_db.list_tasks('katie')) == ['a', 'b']
+
+
+def test_update_other_fields(tiny_db):
+    """Updates that don't touch owner leave the index alone."""
+    tiny_db.list_tasks('brian')
+    tiny_db.update(1, {'done': True})
+    assert [t['done'] for t in tiny_db.list_tasks('brian')] == [True, False]
+
+
+def test_delete(tiny_db):
+    """delete() drops the task from the index."""
+    tiny_db.list_tasks('katie')
+    tiny_db.delete(2)
+    assert tiny_db.list_tasks('katie') == []
+
+
+def test_delete_all(tiny_db):
+    """delete_all() empties the index."""
+    tiny_db.list_tasks('brian')
+    tiny_db.delete_all()
+    assert tiny_db.list_tasks('brian') == []
+
+
+def test_index_after_reopen(tmpdir, new_task):
+    """Ids read back from the JSON file work with the index."""
+    db = TasksDB_TinyDB(str(tmpdir))
+    db.add_many([new_task('a', 'brian'), new_task('b', 'katie')])
+    db.stop_tasks_db()
+    db = TasksDB_TinyDB(str(tmpdir))
+    assert [t['id'] for t in db.list_tasks('katie')] == [2]
+    db.stop_tasks_db()
+
+
+def test_count_reads_no_documents(tiny_db, mocker):
+    """count() takes the number of tasks from the cached table."""
+    read = mocker.spy(tinydb.database.Table, '_read')
+    assert tiny_db.count() == 4
+    assert read.call_count == 0
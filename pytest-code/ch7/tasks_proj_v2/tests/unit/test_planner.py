@@ -0,0 +1,121 @@
+"""Test tasks.planner, Where and the index choice."""
+
+import pytest
+from tasks.planner import Plan, Where, ids_in_range, plan
+
+
+def task(task_id, summary='Fix it', owner='brian', done=False):
+    return {'id': task_id, 'summary': summary, 'owner': owner, 'done': done}
+
+
+def test_matches():
+    """Every field given must match."""
+    where = Where(owner='brian', done=False, min_id=2, max_id=5,
+                  summary_prefix='Fix', summary_contains='it')
+    assert where.matches(task(3))
+    assert not where.matches(task(1))
+    assert not where.matches(task(6))
+    assert not where.matches(task(3, owner='okken'))
+    assert not where.matches(task(3, done=True))
+    assert not where.matches(task(3, summary='fix it'))
+    assert not where.matches(task(3, summary='Fix that'))
+
+
+def test_empty_matches_everything():
+    assert Where().matches(task(1, owner=None))
+
+
+def test_and_narrows():
+    """& keeps every test, and the tighter id range."""
+    where = (Where(owner='brian', min_id=2, max_id=10) &
+             Where(done=True, min_id=4, max_id=20, summary_contains='a') &
+             Where(summary_contains='b'))
+    assert where == Where(owner='brian', done=True, min_id=4, max_id=10,
+                          summary_contains=('a', 'b'))
+    assert not where.impossible
+
+
+def test_and_keeps_longer_prefix():
+    assert (Where(summary_prefix='Fi') & Where(summary_prefix='Fix')
+            ).summary_prefix == 'Fix'
+
+
+@pytest.mark.parametrize('first, second', [
+    (Where(owner='brian'), Where(owner='okken')),
+    (Where(done=True), Where(done=False)),
+    (Where(max_id=3), Where(min_id=4)),
+    (Where(summary_prefix='Fix'), Where(summary_prefix='Add')),
+])
+def test_and_conflict_is_impossible(first, second):
+    """Where()s that can't both match make one that matches nothing."""
+    where = first & second
+    assert where.impossible
+    assert not where.matches(task(3, summary='Fix and Add'))
+
+
+@pytest.mark.parametrize('fields', [
+    {'owner': 1}, {'done': 'yes'}, {'min_id': '1'},
+    {'summary_prefix': 2}, {'summary_contains': [1]}])
+def test_bad_fields(fields):
+    with pytest.raises(TypeError):
+        Where(**fields)
+
+
+@pytest.mark.parametrize('where, indexes, index', [
+    (Where(), ('id', 'owner', 'done'), None),
+    (Where(owner='brian'), ('id',), None),
+    (Where(owner='brian'), ('id', 'owner'), 'owner'),
+    (Where(done=True), ('id', 'owner', 'done'), 'done'),
+    (Where(owner='brian', done=True), ('id', 'owner', 'done'), 'owner'),
+    # 5 ids of 1000 beats an owner's 10%
+    (Where(owner='brian', min_id=10, max_id=14), ('id', 'owner'), 'id'),
+    # half the ids doesn't
+    (Where(owner='brian', min_id=500), ('id', 'owner'), 'owner'),
+    (Where(done=True, max_id=100), ('id', 'owner', 'done'), 'id'),
+])
+def test_most_selective_index(where, indexes, index):
+    """plan() picks the index expected to leave the fewest tasks."""
+    chosen = plan(where, indexes, total=1000, high_id=1000)
+    assert chosen.index == index
+    assert chosen.where is where
+
+
+def test_estimate_spreads_over_gaps():
+    """With half the ids deleted, a range holds about half its span."""
+    chosen = plan(Where(min_id=1, max_id=100), ('id',), total=500,
+                  high_id=1000)
+    assert chosen.estimate == 50
+
+
+def test_impossible_plan():
+    chosen = plan(Where(owner='a') & Where(owner='b'), ('owner',), 10, 10)
+    assert chosen.estimate == 0
+    assert str(chosen).startswith('nothing can match')
+
+
+def test_explain_text():
+    chosen = plan(Where(owner='brian', done=False), ('id', 'owner'),
+                  total=200, high_id=200, limit=10, offset=20)
+    assert str(chosen) == ("index owner='brian' (~20 tasks); "
+                           "filter done=False, owner='brian'; "
+                           "offset 20; limit 10")
+
+
+def test_plan_round_trip():
+    """A plan survives as_dict(), as a server gets it."""
+    chosen = plan(Where(owner='a', summary_contains=('x', 'y')),
+                  ('owner',), 10, 10, limit=3)
+    again = Plan.from_dict(chosen.as_dict())
+    assert (again.index, again.where, again.limit, again.offset,
+            again.estimate) == (chosen.index, chosen.where, 3, 0,
+                                chosen.estimate)
+
+
+@pytest.mark.parametrize('min_id, max_id, expected', [
+    (None, None, [1, 5, 9, 200]),
+    (5, None, [5, 9, 200]),
+    (None, 8, [1, 5]),
+    (2, 9, [5, 9]),
+])
+def test_ids_in_range(min_id, max_id, expected):
+    assert sorted(ids_in_range({1, 5, 9, 200}, min_id, max_id)) == expected
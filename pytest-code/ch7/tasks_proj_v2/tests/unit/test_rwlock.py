@@ -0,0 +1,51 @@
+"""Test the ReadWriteLock used by tasks.api."""
+
+import threading
+
+from tasks.rwlock import ReadWriteLock
+
+
+def test_readers_share():
+    """Two threads can hold the read lock together."""
+    lock = ReadWriteLock()
+    both_in = threading.Barrier(2, timeout=5)
+
+    def reader():
+        with lock.read():
+            both_in.wait()
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not both_in.broken
+
+
+def test_writer_excludes_readers():
+    """A reader waits until the writer is done."""
+    lock = ReadWriteLock()
+    events = []
+
+    def reader():
+        with lock.read():
+            events.append('read')
+
+    with lock.write():
+        t = threading.Thread(target=reader)
+        t.start()
+        t.join(0.1)
+        events.append('write done')
+    t.join()
+    assert events == ['write done', 'read']
+
+
+def test_writer_reenters():
+    """The writing thread can read and write again while holding it."""
+    lock = ReadWriteLock()
+    with lock.write():
+        with lock.read():
+            with lock.write():
+                pass
+    with lock.write():
+        pass
@@ -0,0 +1,102 @@
+"""Test what the tasks CLI imports, and how long it takes, at startup."""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import tasks
+
+SRC = os.path.dirname(os.path.dirname(tasks.__file__))
+RUN_CLI = 'from tasks.cli import tasks_cli; tasks_cli()'
+
+# Not needed to answer --help or --version.
+DB_MODULES = {'tasks.api', 'tasks.config', 'tasks.planner', 'tasks.table',
+              'tasks.tasksdb_tinydb', 'tasks.tasksdb_pymongo',
+              'tasks.tasksdb_log', 'tasks.tasksdb_sqlite',
+              'tasks.tasksdb_mmap', 'tasks.tasksdb_remote', 'tasks.transfer',
+              'tasks.versions',
+              'configparser',
+              'six', 'tinydb', 'sqlite3', 'pymongo'}
+
+
+@pytest.fixture()
+def env(tmpdir):
+    """Environment for a CLI run, home is a tmpdir with an empty db."""
+    tmpdir.mkdir('tasks_db')  # where the default config puts it
+    env = dict(os.environ, HOME=str(tmpdir))
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in [SRC, os.environ.get('PYTHONPATH')] if p)
+    return env
+
+
+def run_cli(args, env, *python_options):
+    # type: (list of str, dict, ...) -> subprocess.CompletedProcess
+    return subprocess.run(
+        [sys.executable] + list(python_options) + ['-c', RUN_CLI] + args,
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+
+
+def imported(args, env):  # type: (list of str, dict) -> dict
+    """Return {module: cumulative microseconds} for a CLI run."""
+    modules = {}
+    for line in run_cli(args, env, '-X', 'importtime').stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('package'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.mark.parametrize('args', [['--help'], ['--version'],
+                                  ['count', '--help'], ['export', '--help'],
+                                  ['import', '--help']])
+def test_help_imports_no_db_code(env, args):
+    """--help and --version are answered by click alone."""
+    modules = imported(args, env)
+    assert 'click' in modules
+    assert sorted(DB_MODULES & set(modules)) == []
+
+
+def test_count_imports_one_db(env):
+    """A command loads the API and the configured db module, no others."""
+    modules = imported(['count'], env)
+    assert {'tasks.api', 'tasks.tasksdb_tinydb'} <= set(modules)
+    assert sorted(set(modules) & {'tasks.tasksdb_pymongo', 'pymongo',
+                                  'tasks.tasksdb_sqlite', 'tasks.tasksdb_log',
+                                  'tasks.tasksdb_mmap'}) == []
+
+
+def best_time(command, env, runs=5):  # type: (list of str, dict) -> float
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL,
+                       check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# Seconds a CLI run may take on top of starting the interpreter.
+HELP_BUDGET = 0.1
+COUNT_BUDGET = 0.25
+
+
+@pytest.mark.bench
+def test_cold_start(env, capsys):
+    """Wall-clock CLI startup, over a bare interpreter."""
+    bare = best_time([sys.executable, '-c', 'pass'], env)
+    help_ = best_time([sys.executable, '-c', RUN_CLI, '--help'], env)
+    count = best_time([sys.executable, '-c', RUN_CLI, 'count'], env)
+    slowest = sorted(imported(['count'], env).items(),
+                     key=lambda item: -item[1])[:10]
+    with capsys.disabled():
+        print('\ninterpreter {:.0f} ms, tasks --help +{:.0f} ms, '
+              'tasks count +{:.0f} ms'.format(bare * 1000,
+                                              (help_ - bare) * 1000,
+                                              (count - bare) * 1000))
+        for name, microseconds in slowest:
+            print('  {:>6.1f} ms  {}'.format(microseconds / 1000, name))
+    assert help_ - bare < HELP_BUDGET
+    assert count - bare < COUNT_BUDGET
@@ -0,0 +1,73 @@
+"""Test the TaskTable columnar data type."""
+
+import pytest
+from tasks import Task, TaskTable
+
+
+@pytest.fixture()
+def table():
+    """A TaskTable with 10 rows, every third one done."""
+    return TaskTable.from_dicts(
+        {'summary': 'task {}'.format(i),
+         'owner': ['brian', 'katie', None][i % 3],
+         'done': i % 3 == 0,
+         'id': i + 1}
+        for i in range(10))
+
+
+def test_len(table):
+    """len() is the number of rows."""
+    assert len(table) == 10
+    assert len(TaskTable()) == 0
+
+
+def test_rows_are_tasks(table):
+    """Indexing a row makes a Task."""
+    assert table[0] == Task('task 0', 'brian', True, 1)
+    assert table[-1] == Task('task 9', 'brian', True, 10)
+    with pytest.raises(IndexError):
+        table[10]
+
+
+def test_iter(table):
+    """Iterating yields a Task per row, in order."""
+    assert [t.id for t in table] == list(range(1, 11))
+
+
+def test_columns(table):
+    """The columns hold the raw values."""
+    assert table.ids.typecode == 'q'
+    assert list(table.ids) == list(range(1, 11))
+    assert table.owners[:3] == ['brian', 'katie', None]
+    assert list(table.done)[:4] == [True, False, False, True]
+
+
+def test_owners_interned():
+    """Equal owner strings share one object."""
+    owner_a = ''.join(['bri', 'an'])
+    owner_b = ''.join(['br', 'ian'])
+    assert owner_a is not owner_b
+    table = TaskTable()
+    table.append('a', owner_a, False, 1)
+    table.append('b', owner_b, False, 2)
+    assert table.owners[0] is table.owners[1]
+
+
+def test_where_done(table):
+    """where_done() keeps rows with a matching done state."""
+    assert list(table.where_done().ids) == [1, 4, 7, 10]
+    assert list(table.where_done(False).ids) == [2, 3, 5, 6, 8, 9]
+
+
+def test_where_owner_in(table):
+    """where_owner_in() keeps rows owned by any of the owners."""
+    assert list(table.where_owner_in({'katie'}).ids) == [2, 5, 8]
+    assert len(table.where_owner_in(['brian', None])) == 7
+    assert len(table.where_owner_in([])) == 0
+
+
+def test_filters_chain(table):
+    """Filters return tables, so they can be combined."""
+    done_brian = table.where_owner_in({'brian'}).where_done()
+    assert [t.summary for t in done_brian] == ['task 0', 'task 3',
+                                               'task 6', 'task 9']
@@ -0,0 +1,148 @@
+"""Test the append-only log db wrapper."""
+
+import json
+
+import pytest
+from tasks.planner import Where
+
+
+def segment_lines(db_dir):
+    """Return every record in every segment file, oldest first."""
+    lines = []
+    for seg in sorted(db_dir.listdir('tasks_log.*.jsonl')):
+        lines.extend(json.loads(line) for line in seg.readlines())
+    return lines
+
+
+@pytest.fixture()
+def reopen(open_db):
+    """Return a function that stops a db and opens a new one on its dir."""
+    def _reopen(db=None, **options):
+        return open_db('log', db, **options)
+    return _reopen
+
+
+def test_each_change_is_one_append(tmpdir, reopen, new_task):
+    """add, update and delete each append a single record."""
+    db = reopen()
+    task_id = db.add(new_task('a'))
+    db.update(task_id, {'done': True})
+    db.delete(task_id)
+    assert [r['op'] for r in segment_lines(tmpdir)] == ['put', 'set', 'del']
+
+
+def test_add_many_one_write(tmpdir, reopen, new_task):
+    """add_many() writes one record per task in a single write."""
+    db = reopen()
+    db.add_many([new_task('a'), new_task('b')])
+    assert [r['id'] for r in segment_lines(tmpdir)] == [1, 2]
+
+
+def test_replay_on_open(reopen, new_task):
+    """Reopening rebuilds the same tasks and ids."""
+    db = reopen()
+    db.add_many([new_task('a', 'brian'), new_task('b'), new_task('c')])
+    db.update(1, {'owner': 'katie'})
+    db.delete(2)
+    db = reopen(db)
+    assert db.list_tasks() == [
+        {'summary': 'a', 'owner': 'katie', 'done': False, 'id': 1},
+        {'summary': 'c', 'owner': None, 'done': False, 'id': 3}]
+    assert [t['id'] for t in db.list_tasks('katie')] == [1]
+    assert db.add(new_task('d')) == 4
+
+
+def test_reserved_ids_survive_reopen(reopen):
+    """Reserved ids are not handed out after reopening."""
+    db = reopen()
+    db.reserve_ids(5)
+    db = reopen(db)
+    assert db.unique_id() == 6
+
+
+def test_torn_tail_ignored(tmpdir, reopen, new_task):
+    """A half-written last record from a crash is skipped."""
+    db = reopen()
+    db.add(new_task('a'))
+    seg = sorted(tmpdir.listdir('tasks_log.*.jsonl'))[-1]
+    seg.write('{"op": "put", "id": 2, "ta', mode='a')
+    db = reopen(db)
+    assert db.count() == 1
+    db.add(new_task('b'))
+    db = reopen(db)
+    assert db.count() == 2
+
+
+def test_compact(tmpdir, reopen, new_task):
+    """compact() leaves a checkpoint plus an empty segment."""
+    db = reopen()
+    db.add_many([new_task('a'), new_task('b')])
+    db.delete(1)
+    db.compact()
+    assert segment_lines(tmpdir) == []
+    assert tmpdir.join('tasks_log.checkpoint.json').check()
+    db.add(new_task('c'))
+    db = reopen(db)
+    assert [t['summary'] for t in db.list_tasks()] == ['b', 'c']
+    assert db.unique_id() == 4
+
+
+def test_versions_survive_compact(tmpdir, reopen, new_task):
+    """The checkpoint keeps versions and tombstones, replay adds to them."""
+    db = reopen()
+    db.add_many([new_task('a'), new_task('b')])
+    db.delete(1)
+    db.compact()
+    db.update(2, {'done': True})
+    before = db.changes_since(0)
+    db = reopen(db)
+    assert db.changes_since(0) == before
+    assert before[1:] == ([1], 4)
+
+
+def test_versions_from_old_checkpoint(tmpdir, reopen, new_task):
+    """A checkpoint from before versions has its tasks at version 1."""
+    db = reopen()
+    db.add_many([new_task('a'), new_task('b')])
+    db.compact()
+    checkpoint = tmpdir.join('tasks_log.checkpoint.json')
+    saved = json.loads(checkpoint.read())
+    del saved['versions']
+    checkpoint.write(json.dumps(saved))
+    db = reopen(db)
+    assert [t['id'] for t in db.changes_since(0)[0]] == [1, 2]
+    assert db.changes_since(1) == ([], [], 1)
+
+
+def test_background_compaction(tmpdir, reopen, new_task):
+    """Compaction starts by itself once enough records are dead."""
+    db = reopen(compact_min=10, compact_ratio=0.5)
+    task_id = db.add(new_task('a'))
+    for i in range(20):
+        db.update(task_id, {'summary': 'a{}'.format(i)})
+    db = reopen(db)
+    assert len(segment_lines(tmpdir)) < 10
+    assert db.get(task_id)['summary'] == 'a19'
+
+
+def test_missing_id(reopen):
+    """Changing a task that isn't there raises ValueError."""
+    db = reopen()
+    with pytest.raises(ValueError):
+        db.delete(1)
+    with pytest.raises(ValueError):
+        db.update(1, {'done': True})
+
+
+def test_many_changes_are_one_record(tmpdir, reopen, new_task):
+    """update_many() and delete_many() append one record each."""
+    db = reopen()
+    task_ids = db.add_many([new_task(str(i), 'brian') for i in range(4)])
+    before = len(segment_lines(tmpdir))
+    assert db.update_many(task_ids[:3], {'done': True}) == 3
+    assert db.delete_many(None, Where(done=True, max_id=task_ids[1])) == 2
+    assert [r['op'] for r in segment_lines(tmpdir)[before:]] == [
+        'set_many', 'del_many']
+    db = reopen(db)
+    assert [(t['id'], t['done']) for t in db.list_tasks()] == [
+        (task_ids[2], True), (task_ids[3], False)]
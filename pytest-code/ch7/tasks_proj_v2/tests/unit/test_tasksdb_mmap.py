@@ -0,0 +1,171 @@
+"""Test the memory-mapped db wrapper."""
+
+import os
+import threading
+import time
+
+import pytest
+from tasks.api import TasksException
+from tasks.tasksdb_mmap import (TasksDB_Mmap, _HEADER, _offset,
+                                write_snapshot)
+from tasks.textindex import TextIndex
+
+
+def test_reopen_keeps_tasks(tmpdir, new_task):
+    """Tasks, count and ids survive closing the db."""
+    db = TasksDB_Mmap(str(tmpdir))
+    db.add_many([new_task('a', 'brian'), new_task('b', done=True),
+                 new_task(u'été', 'okken')])
+    db.delete(1)
+    db.stop_tasks_db()
+    db = TasksDB_Mmap(str(tmpdir))
+    assert db.count() == 2
+    assert db.get(2) == {'id': 2, 'summary': 'b', 'owner': None,
+                         'done': True}
+    assert db.get(3)['summary'] == u'été'
+    assert db.unique_id() == 4
+    db.stop_tasks_db()
+
+
+def test_versions_survive_reopen(tmpdir, new_task):
+    """Deleted records keep their version, as tombstones."""
+    db = TasksDB_Mmap(str(tmpdir))
+    db.add_many([new_task('a'), new_task('b'), new_task('c')])
+    db.delete(2)
+    db.update(1, {'done': True})
+    before = db.changes_since(0)
+    db.stop_tasks_db()
+    db = TasksDB_Mmap(str(tmpdir))
+    assert db.changes_since(0) == before
+    assert [t['id'] for t in before[0]] == [3, 1]
+    assert before[1:] == ([2], 3)
+    db.delete_all()
+    db.add(new_task('d'))
+    db.stop_tasks_db()
+    db = TasksDB_Mmap(str(tmpdir))
+    assert db.changes_since(3) == ([db.get(1)], [3], 5)
+    db.stop_tasks_db()
+
+
+def test_versions_of_old_files(tmpdir, new_task):
+    """Files from before versions have zeros where they go, their
+    tasks are at version 1."""
+    db = TasksDB_Mmap(str(tmpdir))
+    db.add_many([new_task('a'), new_task('b')])
+    db.stop_tasks_db()
+    with open(str(tmpdir.join('tasks_db.idx')), 'r+b') as f:
+        f.seek(_HEADER.size - 8)
+        f.write(b'\0' * 8)
+        for task_id in (1, 2):
+            f.seek(_offset(task_id) + 4)
+            f.write(b'\0' * 4)
+    db = TasksDB_Mmap(str(tmpdir))
+    assert [t['id'] for t in db.changes_since(0)[0]] == [1, 2]
+    assert db.changes_since(1) == ([], [], 1)
+    db.update(2, {'done': True})
+    assert db.changes_since(1) == ([db.get(2)], [], 2)
+    db.stop_tasks_db()
+
+
+def test_index_grows(mmap_db, new_task):
+    """Adding past the end of the index file remaps it."""
+    task_ids = mmap_db.add_many([new_task(str(i)) for i in range(500)])
+    assert mmap_db.get(task_ids[-1])['summary'] == '499'
+    assert mmap_db.count() == 500
+
+
+def test_update_appends_to_heap(mmap_db, new_task):
+    """Changed strings go on the end of the heap, the record is rewritten."""
+    task_id = mmap_db.add(new_task('old', 'brian'))
+    mmap_db.update(task_id, {'summary': 'new', 'done': True})
+    assert mmap_db.get(task_id) == {'id': task_id, 'summary': 'new',
+                                    'owner': 'brian', 'done': True}
+
+
+def test_update_done_leaves_heap(mmap_db, new_task):
+    """Setting done alone rewrites the record, the heap doesn't grow."""
+    task_id = mmap_db.add(new_task('old', 'brian'))
+    heap_end = mmap_db._heap_end
+    mmap_db.update(task_id, {'done': True})
+    assert mmap_db._heap_end == heap_end
+    assert mmap_db.get(task_id)['done'] is True
+
+
+def test_heap_remapped_once_grown(mmap_db, new_task):
+    """Reading a string past the mapped heap remaps it, closing the old
+    map."""
+    old_heap = mmap_db._heap
+    task_id = mmap_db.add(new_task('grown', 'brian'))
+    assert mmap_db.get(task_id)['summary'] == 'grown'
+    assert old_heap.closed
+    assert not mmap_db._heap.closed
+
+
+def test_text_index_built_once(mmap_db, new_task, mocker):
+    """Readers searching at once share one build of the text index."""
+    mmap_db.add_many([new_task('find me'), new_task('not me')])
+    build = TextIndex.build
+
+    def slow_build(tasks):
+        time.sleep(0.05)
+        return build(tasks)
+
+    built = mocker.patch('tasks.tasksdb_mmap.TextIndex.build',
+                         side_effect=slow_build)
+    found = []
+    threads = [threading.Thread(
+        target=lambda: found.append(mmap_db.search(['find'])))
+        for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert built.call_count == 1
+    assert [[t['id'] for t in tasks] for tasks in found] == [[1]] * 4
+
+
+def test_delete_all_keeps_heap(tmpdir, mmap_db, open_db, new_task):
+    """delete_all() leaves the heap file alone, so other maps of it
+    still read."""
+    mmap_db.add_many([new_task('a', 'brian'), new_task('b')])
+    other = open_db('mmap')
+    assert other.get(1)['summary'] == 'a'
+    size = tmpdir.join('tasks_db.heap').size()
+    mmap_db.delete_all()
+    assert tmpdir.join('tasks_db.heap').size() == size
+    assert other._heap_bytes(len(b'TASKHEAP'), 1) == b'a'
+    task_id = mmap_db.add(new_task('c'))
+    assert mmap_db.get(task_id)['summary'] == 'c'
+
+
+def test_missing_ids(mmap_db, new_task):
+    """Ids that were never added, or are past the end, are not found."""
+    mmap_db.add(new_task('a'))
+    assert mmap_db.get(0) is None
+    assert mmap_db.get(1000) is None
+    with pytest.raises(ValueError):
+        mmap_db.update(1000, {'done': True})
+    with pytest.raises(ValueError):
+        mmap_db.delete(1000)
+
+
+def test_snapshot(tmpdir, new_task):
+    """A snapshot holds the same tasks, with gaps in ids kept."""
+    tasks = [{'id': 1, 'summary': 'a', 'owner': 'brian', 'done': False},
+             {'id': 4, 'summary': 'b', 'owner': None, 'done': True}]
+    assert write_snapshot(str(tmpdir), iter([tasks])) == 2
+    assert not [f for f in os.listdir(str(tmpdir)) if f.endswith('.tmp')]
+    db = TasksDB_Mmap(str(tmpdir), read_only=True)
+    assert db.list_tasks() == tasks
+    assert db.list_tasks('brian') == tasks[:1]
+    assert db.get(2) is None
+    assert db.unique_id() == 5
+    with pytest.raises(TasksException):
+        db.add(new_task('c'))
+    db.stop_tasks_db()
+
+
+def test_read_only_needs_snapshot(tmpdir):
+    """read_only doesn't create an empty db."""
+    with pytest.raises(TasksException):
+        TasksDB_Mmap(str(tmpdir), read_only=True)
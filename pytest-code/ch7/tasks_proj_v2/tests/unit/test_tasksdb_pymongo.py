@@ -0,0 +1,277 @@
+"""Test the MongoDB db wrapper against an in-process stand-in server."""
+
+import pytest
+
+pymongo = pytest.importorskip('pymongo')
+mongomock = pytest.importorskip('mongomock')
+
+from tasks import tasksdb_pymongo  # noqa: E402
+from tasks.planner import Where, plan  # noqa: E402
+from tasks.tasksdb_pymongo import TasksDB_MongoDB  # noqa: E402
+
+URI = 'mongodb://localhost:27017/tasks_test'
+
+
+@pytest.fixture()
+def mongo_server():
+    """Make MongoClient talk to mongomock instead of a real server."""
+    with mongomock.patch(servers=(('localhost', 27017),)):
+        tasksdb_pymongo._clients.clear()
+        yield
+        tasksdb_pymongo._clients.clear()
+
+
+@pytest.fixture()
+def mongo_db(mongo_server, open_db):
+    """A TasksDB_MongoDB attached to the stand-in server."""
+    db = open_db('mongo', uri=URI)
+    db.delete_all()
+    return db
+
+
+def test_attach_starts_no_mongod(mongo_db, mocker, new_task):
+    """With a uri, no mongod is started or stopped."""
+    popen = mocker.patch.object(tasksdb_pymongo.subprocess, 'Popen')
+    task_id = mongo_db.add(new_task('attach'))
+    assert mongo_db.get(task_id)['summary'] == 'attach'
+    mongo_db.stop_tasks_db()
+    assert not popen.called
+
+
+def test_db_from_uri(mongo_db):
+    """The db named in the uri is used."""
+    assert mongo_db._db.name == 'tasks_test'
+
+
+def test_client_shared(mongo_server, tmpdir):
+    """Dbs attached to one uri share a pooled client, which stays open."""
+    db_a = TasksDB_MongoDB(str(tmpdir), uri=URI)
+    db_b = TasksDB_MongoDB(str(tmpdir), uri=URI)
+    assert db_a._client is db_b._client
+    client = db_a._client
+    db_a.stop_tasks_db()
+    db_b.stop_tasks_db()
+    assert TasksDB_MongoDB(str(tmpdir), uri=URI)._client is client
+
+
+class FlakyAdmin(object):
+    """A server that answers ping after failing a few times."""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def command(self, name):
+        if self.failures:
+            self.failures -= 1
+            raise pymongo.errors.ConnectionFailure('not yet')
+        return {'ok': 1.0}
+
+
+class FlakyClient(object):
+    def __init__(self, failures):
+        self.admin = FlakyAdmin(failures)
+
+
+def test_ready_backs_off(mocker):
+    """Waiting for mongod doubles the delay between pings."""
+    sleep = mocker.patch.object(tasksdb_pymongo.time, 'sleep')
+    tasksdb_pymongo._wait_until_ready(FlakyClient(4), None, 30.0)
+    delays = [c[0][0] for c in sleep.call_args_list]
+    assert delays == [0.01, 0.02, 0.04, 0.08]
+
+
+def test_ready_times_out(mocker):
+    """A server that never answers fails after the timeout."""
+    mocker.patch.object(tasksdb_pymongo.time, 'sleep')
+    with pytest.raises(pymongo.errors.ConnectionFailure):
+        tasksdb_pymongo._wait_until_ready(FlakyClient(10 ** 6), None, 0.0)
+
+
+def test_ready_gives_up_if_mongod_exits(mocker):
+    """A mongod that exited isn't waited for."""
+    process = mocker.Mock(returncode=48)
+    process.poll.return_value = 48
+    with pytest.raises(RuntimeError):
+        tasksdb_pymongo._wait_until_ready(FlakyClient(1), process, 30.0)
+
+
+def test_started_mongod_gets_default_timeouts(mongo_server, tmpdir, mocker):
+    """Only the readiness probe fails fast, the client kept doesn't."""
+    mocker.patch.object(tasksdb_pymongo.subprocess, 'Popen')
+    mocker.patch.object(tasksdb_pymongo, '_wait_until_ready')
+    clients = mocker.spy(tasksdb_pymongo.pymongo, 'MongoClient')
+    db = TasksDB_MongoDB(str(tmpdir))
+    assert clients.call_args_list == [
+        mocker.call(serverSelectionTimeoutMS=250), mocker.call()]
+    assert db._client is clients.spy_return
+    db.stop_tasks_db()
+
+
+def test_add_many_reserves_a_range(mongo_db, new_task):
+    """add_many() takes one block of ids for the whole list."""
+    mongo_db.add(new_task('first'))
+    task_ids = mongo_db.add_many([new_task(str(i)) for i in range(5)])
+    assert task_ids == [2, 3, 4, 5, 6]
+    assert mongo_db.unique_id() == 7
+
+
+def test_add_and_add_many_store_alike(mongo_db, new_task):
+    """Both leave the caller's dict alone and store no 'id' field."""
+    task = new_task('one', 'brian')
+    mongo_db.add(task)
+    mongo_db.add_many([new_task('two', 'brian')])
+    assert task == new_task('one', 'brian')
+    assert [sorted(d) for d in mongo_db._db.task_list.find()] == [
+        ['_id', 'done', 'owner', 'summary', 'version', 'words']] * 2
+
+
+def test_update_sets_fields(mongo_db, new_task):
+    """update() sets the fields given, the others stay."""
+    task_id = mongo_db.add(new_task('old words', 'brian'))
+    mongo_db.update(task_id, {'summary': 'new words', 'done': True})
+    assert mongo_db.get(task_id) == {'id': task_id, 'summary': 'new words',
+                                     'owner': 'brian', 'done': True}
+    assert mongo_db.search(['new']) == [mongo_db.get(task_id)]
+    assert mongo_db.search(['old']) == []
+    assert mongo_db.count('brian', True) == 1
+
+
+def test_update_missing_id(mongo_db):
+    with pytest.raises(ValueError):
+        mongo_db.update(99, {'done': True})
+
+
+def test_update_many(mongo_db, new_task):
+    """update_many() sets the fields on every listed task."""
+    task_ids = mongo_db.add_many([new_task(str(i)) for i in range(4)])
+    assert mongo_db.update_many(task_ids[:3] + [99], {'done': True}) == 3
+    assert [mongo_db.get(i)['done'] for i in task_ids] == [
+        True, True, True, False]
+
+
+def test_update_many_where(mongo_db, new_task):
+    """A Where narrows update_many() and delete_many() on the server."""
+    task_ids = mongo_db.add_many([new_task('fix a', 'brian'),
+                                  new_task('fix b', 'okken'),
+                                  new_task('write c', 'brian')])
+    assert mongo_db.update_many(None, {'summary': 'fixed'},
+                                Where(owner='brian',
+                                      summary_prefix='fix')) == 1
+    assert mongo_db.search(['fixed']) == [mongo_db.get(task_ids[0])]
+    assert mongo_db.delete_many(task_ids[1:], Where(owner='brian')) == 1
+    assert [t['summary'] for t in mongo_db.list_tasks()] == [
+        'fixed', 'fix b']
+
+
+def test_delete_many(mongo_server, tmpdir, new_task):
+    """delete_many() removes the listed tasks and frees their ids."""
+    db = TasksDB_MongoDB(str(tmpdir), uri=URI, reuse_ids=True)
+    db.delete_all()
+    task_ids = db.add_many([new_task(str(i)) for i in range(4)])
+    assert db.delete_many([task_ids[1], task_ids[2], 99]) == 2
+    assert db.get(task_ids[0])['summary'] == '0'
+    assert db.add(new_task('reused')) in task_ids[1:3]
+    db.stop_tasks_db()
+
+
+def test_list_tasks(mongo_db, new_task):
+    """list_tasks() returns task dicts with id, not the used-up cursor."""
+    mongo_db.add_many([new_task('a', 'brian'), new_task('b', 'okken'),
+                       new_task('c', 'brian', True)])
+    assert mongo_db.list_tasks('brian', batch_size=1) == [
+        {'id': 1, 'summary': 'a', 'owner': 'brian', 'done': False},
+        {'id': 3, 'summary': 'c', 'owner': 'brian', 'done': True}]
+    assert [t['id'] for t in mongo_db.list_tasks()] == [1, 2, 3]
+
+
+def test_count(mongo_db, new_task):
+    """count() with and without a filter."""
+    mongo_db.add_many([new_task('a', 'brian'), new_task('b', 'okken'),
+                       new_task('c', 'brian', True)])
+    assert mongo_db.count() == 3
+    assert mongo_db.count(owner='brian') == 2
+    assert mongo_db.count(owner='brian', done=False) == 1
+    assert mongo_db.count(done=True) == 1
+
+
+def test_counts(mongo_db, new_task):
+    """counts() groups the tasks by owner and done on the server."""
+    mongo_db.add_many([new_task('a', 'brian'), new_task('b', 'brian'),
+                       new_task('c', None, True)])
+    assert sorted(mongo_db.counts(), key=repr) == [
+        ['brian', False, 2], [None, True, 1]]
+    assert mongo_db.rebuild_counts() == []
+
+
+def test_owner_done_index(mongo_db):
+    """An owner+done compound index is made on connect."""
+    keys = [index['key'] for index in
+            mongo_db._db.task_list.index_information().values()]
+    assert [('owner', 1), ('done', 1)] in keys
+
+
+def test_query_pushed_down(mongo_db, mocker, new_task):
+    """query() is one aggregate, filtered and paged on the server."""
+    mongo_db.add_many([new_task('Fix {}'.format(i), 'a' if i % 2 else 'b',
+                                i % 3 == 0) for i in range(1, 21)])
+    where = Where(owner='a', done=False, summary_prefix='Fix 1',
+                  max_id=18)
+    aggregate = mocker.spy(mongo_db._db.task_list, 'aggregate')
+    found = mongo_db.query(plan(where, mongo_db.indexes, 20, 20,
+                                limit=2, offset=1))
+    assert [t['id'] for t in found] == [11, 13]
+    assert aggregate.call_count == 1
+    assert aggregate.call_args[1]['hint'] == [('owner', 1), ('done', 1)]
+
+
+def test_search(mongo_db, new_task):
+    """search() matches stored words, which get() doesn't return."""
+    mongo_db.add_many([new_task('Fix the build', 'brian'),
+                       new_task('fixture work', 'okken')])
+    mongo_db.add(new_task('Write docs', 'brian'))
+    assert [t['id'] for t in mongo_db.search(['fix'])] == [1, 2]
+    assert [t['id'] for t in mongo_db.search(['fix'], owner='okken')] == [2]
+    assert mongo_db.search(['fix', 'doc']) == []
+    assert mongo_db.search(['doc']) == [mongo_db.get(3)]
+    assert 'words' not in mongo_db.get(3)
+
+
+def test_words_added_on_connect(mongo_server, tmpdir):
+    """Tasks stored without words get them when a db connects."""
+    db = TasksDB_MongoDB(str(tmpdir), uri=URI)
+    db.delete_all()
+    db._db.task_list.insert_one({'_id': 1, 'summary': 'Old task',
+                                 'owner': None, 'done': False})
+    db = TasksDB_MongoDB(str(tmpdir), uri=URI)
+    assert [t['id'] for t in db.search(['old'])] == [1]
+
+
+def test_changes_since(mongo_server, tmpdir, new_task):
+    """Versions come from the counter, deletes leave tombstones."""
+    db = TasksDB_MongoDB(str(tmpdir), uri=URI, reuse_ids=True)
+    db.delete_all()
+    start = db.changes_since(0)[2]
+    db.add_many([new_task('a'), new_task('b'), new_task('c')])
+    db.update(1, {'done': True})
+    db.delete_many(None, Where(summary_prefix='b'))
+    assert db.changes_since(start) == (
+        [db.get(3), db.get(1)], [2], start + 3)
+    assert 'version' not in db.get(1)
+    assert db.add(new_task('again')) == 2
+    assert db.changes_since(start)[1] == []
+    db.delete_all()
+    assert sorted(db.changes_since(start + 4)[1]) == [1, 2, 3]
+    db.stop_tasks_db()
+
+
+def test_versions_added_on_connect(mongo_server, tmpdir):
+    """Tasks stored without a version are at version 1."""
+    db = TasksDB_MongoDB(str(tmpdir), uri=URI)
+    db.delete_all()
+    db._db.counters.delete_one({'_id': 'version'})
+    db._db.task_tombstones.drop()
+    db._db.task_list.insert_one({'_id': 1, 'summary': 'Old task',
+                                 'owner': None, 'done': False})
+    db = TasksDB_MongoDB(str(tmpdir), uri=URI)
+    assert db.changes_since(0) == ([db.get(1)], [], 1)
+    db.stop_tasks_db()
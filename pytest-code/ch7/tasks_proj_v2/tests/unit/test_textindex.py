@@ -0,0 +1,109 @@
+"""Test the full-text index in tasks.textindex."""
+
+import random
+import time
+import tracemalloc
+
+import pytest
+from tasks.textindex import TextIndex, words
+
+
+def test_words():
+    """Words are lowercased runs of letters and digits, each once."""
+    assert words("Fix Brian's fix-up, v2!") == ['brian', 'fix', 's', 'up',
+                                                'v2']
+    assert words('Über straße') == ['straße', 'über']
+    assert words('  ...  ') == []
+
+
+@pytest.fixture()
+def index():
+    return TextIndex.build([(1, 'Fix what Brian did'),
+                            (2, 'fixture for Brian'),
+                            (3, 'Write the docs'),
+                            (4, 'Fix the docs')])
+
+
+@pytest.mark.parametrize('terms, expected', [
+    (['fix'], {1, 2, 4}),
+    (['fixt'], {2}),
+    (['fix', 'brian'], {1, 2}),
+    (['fix', 'doc'], {4}),
+    (['the'], {3, 4}),
+    (['brian', 'docs'], set()),
+    (['nothing'], set()),
+])
+def test_and_prefix_search(index, terms, expected):
+    """Each term must start a word of the summary."""
+    assert index.search(terms) == expected
+
+
+def test_remove(index):
+    index.remove(4, 'Fix the docs')
+    assert index.search(['doc']) == {3}
+    assert index.search(['fix']) == {1, 2}
+    assert len(index) == 9  # every word is still used by another task
+
+
+def test_new_words_found(index):
+    """Words added after a search are found by the next one."""
+    assert index.search(['zebra']) == set()
+    index.add(5, 'zebra crossing')
+    index.add(6, 'aardvark')
+    assert index.search(['zeb']) == {5}
+    assert index.search(['aard']) == {6}
+
+
+def test_word_removed_and_added_again(index):
+    index.remove(3, 'Write the docs')
+    assert index.search(['write']) == set()
+    index.add(3, 'Write it again')
+    assert index.search(['write', 'again']) == {3}
+
+
+def test_unused_words_leave_sorted(index):
+    """A word no task uses any more is dropped from the sorted words."""
+    index.search(['fix'])
+    index.remove(2, 'fixture for Brian')
+    assert index._sorted == sorted(index._ids)
+    assert 'fixture' not in index._sorted
+
+
+VOCABULARY = ['fix', 'write', 'review', 'deploy', 'test', 'build', 'docs',
+              'server', 'client', 'database', 'index', 'query', 'cache',
+              'release', 'bug', 'feature', 'api', 'cli', 'config', 'login']
+
+
+@pytest.mark.bench
+def test_million_tasks(capsys):
+    """Build time, memory and search latency for 1M summaries."""
+    n = 1000000
+    rnd = random.Random(1)
+    summaries = [' '.join(rnd.choice(VOCABULARY) for _ in range(4)) +
+                 ' {}'.format(rnd.randrange(100000)) for _ in range(n)]
+
+    start = time.perf_counter()
+    TextIndex.build(enumerate(summaries, 1))
+    build = time.perf_counter() - start
+    # built again to measure memory, tracing slows the build down
+    tracemalloc.start()
+    index = TextIndex.build(enumerate(summaries, 1))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # the first search sorts the words
+    start = time.perf_counter()
+    index.search(['sort'])
+    first = time.perf_counter() - start
+    latencies = {}
+    for text in (['fix', 'deploy'], ['rel', 'bug', 'cli'], ['4242'], ['9']):
+        start = time.perf_counter()
+        found = index.search(text)
+        latencies[' '.join(text)] = (time.perf_counter() - start, len(found))
+    with capsys.disabled():
+        print('\n{} tasks, {} words: built in {:.1f}s, {:.0f} MB'.format(
+            n, len(index), build, memory / 1e6))
+        print('  first search, sorting words: {:.1f} ms'.format(first * 1000))
+        for text, (seconds, hits) in sorted(latencies.items()):
+            print('  search {!r}: {:.1f} ms, {} tasks'.format(
+                text, seconds * 1000, hits))
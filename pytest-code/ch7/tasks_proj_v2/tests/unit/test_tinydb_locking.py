@@ -0,0 +1,83 @@
+"""Test sharing one TinyDB file between processes."""
+
+import multiprocessing
+import os
+
+import pytest
+from tasks.tasksdb_tinydb import AtomicJSONStorage, TasksDB_TinyDB, fcntl
+
+needs_fcntl = pytest.mark.skipif(fcntl is None, reason='needs fcntl')
+
+
+@pytest.fixture()
+def two_dbs(open_db):
+    """Two connections to one tasks_db.json, as two processes would have."""
+    return open_db('tiny'), open_db('tiny')
+
+
+def test_sees_other_writes(two_dbs, new_task):
+    """Changes made through one connection show up in the other."""
+    db_a, db_b = two_dbs
+    task_id = db_a.add(new_task('from a', 'brian'))
+    assert db_b.get(task_id)['summary'] == 'from a'
+    assert [t['id'] for t in db_b.list_tasks('brian')] == [task_id]
+    db_b.update(task_id, {'owner': 'okken'})
+    assert db_a.list_tasks('brian') == []
+    assert db_a.count() == 1
+
+
+def test_ids_not_shared(two_dbs, new_task):
+    """Each connection picks up the ids the other handed out."""
+    db_a, db_b = two_dbs
+    assert db_a.add(new_task('a')) == 1
+    assert db_b.add(new_task('b')) == 2
+    assert db_a.reserve_ids(2) == [3, 4]
+    assert db_b.unique_id() == 5
+
+
+def test_unchanged_file_not_reread(tmpdir, mocker, new_task):
+    """Reads skip parsing the file when nobody else has written it."""
+    db = TasksDB_TinyDB(str(tmpdir))
+    db.add(new_task('a'))
+    read = mocker.spy(AtomicJSONStorage, 'read')
+    for _ in range(5):
+        db.get(1)
+        db.count()
+    assert read.call_count == 0
+    db.stop_tasks_db()
+
+
+def test_write_replaces_file(tmpdir, new_task):
+    """Writes rename a new file into place, leaving no temp files."""
+    db = TasksDB_TinyDB(str(tmpdir))
+    before = os.stat(str(tmpdir.join('tasks_db.json'))).st_ino
+    db.add(new_task('a'))
+    after = os.stat(str(tmpdir.join('tasks_db.json'))).st_ino
+    db.stop_tasks_db()
+    assert before != after
+    assert not [f for f in os.listdir(str(tmpdir)) if f.endswith('.tmp')]
+
+
+def add_tasks(db_path, n, new_task):
+    """Add n tasks from a separate process."""
+    db = TasksDB_TinyDB(db_path)
+    for i in range(n):
+        db.add(new_task(str(i), str(os.getpid())))
+    db.stop_tasks_db()
+
+
+@needs_fcntl
+def test_processes_lose_nothing(tmpdir, new_task):
+    """Processes writing at once each get all their tasks in."""
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=add_tasks,
+                                 args=(str(tmpdir), 25, new_task))
+                 for _ in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    db = TasksDB_TinyDB(str(tmpdir))
+    assert db.count() == 100
+    assert sorted(t['id'] for t in db.list_tasks()) == list(range(1, 101))
+    db.stop_tasks_db()
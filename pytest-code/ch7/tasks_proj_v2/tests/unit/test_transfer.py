@@ -0,0 +1,89 @@
+"""Test the export and import formats in tasks.transfer."""
+
+import gzip
+import io
+
+import pytest
+from tasks import transfer
+
+TASKS = [
+    {'id': 1, 'summary': 'plain', 'owner': 'brian', 'done': False},
+    {'id': 7, 'summary': 'a, "quoted"\nsummary', 'owner': None, 'done': True},
+    {'id': 9, 'summary': u'été', 'owner': u'Ünïcode', 'done': False},
+    {'id': 10, 'summary': '', 'owner': '', 'done': True}]
+
+
+def encoded(fmt, pages):  # type: (str, list of list of dict) -> bytes
+    encoder = transfer.encoder(fmt)
+    return encoder.start + b''.join(encoder.encode(page) for page in pages)
+
+
+def decoded(data, fmt=None):  # type: (bytes, str|None) -> list of tuple
+    with transfer.open_in(io.BytesIO(data)) as stream:
+        return list(transfer.decode(stream, fmt or transfer.sniff(stream)))
+
+
+@pytest.mark.parametrize('fmt', transfer.FORMATS)
+def test_round_trip(fmt):
+    """Tasks come back as written, split over pages or not."""
+    expected = [(t['summary'], t['owner'], t['done']) for t in TASKS]
+    # csv can't tell an empty owner from none
+    if fmt == 'csv':
+        expected[3] = ('', None, True)
+    assert decoded(encoded(fmt, [TASKS])) == expected
+    assert encoded(fmt, [TASKS[:1], TASKS[1:]]) == encoded(fmt, [TASKS])
+
+
+@pytest.mark.parametrize('fmt', transfer.FORMATS)
+def test_sniff(fmt):
+    """The format is found from the data, gzipped or not."""
+    data = encoded(fmt, [TASKS])
+    assert decoded(gzip.compress(data)) == decoded(data, fmt)
+    with transfer.open_in(io.BytesIO(gzip.compress(data))) as stream:
+        assert transfer.sniff(stream) == fmt
+
+
+def test_empty():
+    for fmt in transfer.FORMATS:
+        assert decoded(encoded(fmt, []), fmt) == []
+
+
+@pytest.mark.parametrize('path, fmt', [
+    ('t.jsonl', 'jsonl'), ('t.csv.gz', 'csv'), ('t.bin', 'bin'),
+    ('t.txt', 'jsonl'), ('t.gz', 'jsonl')])
+def test_format_for(path, fmt):
+    assert transfer.format_for(path) == fmt
+
+
+def test_open_out_compress(tmpdir):
+    """Paths ending in .gz are gzipped, files only when asked."""
+    path = str(tmpdir.join('t.jsonl.gz'))
+    with transfer.open_out(path) as stream:
+        stream.write(b'{}')
+    assert gzip.open(path).read() == b'{}'
+    f = io.BytesIO()
+    with transfer.open_out(f, compress=True) as stream:
+        stream.write(b'{}')
+    assert gzip.decompress(f.getvalue()) == b'{}'
+    assert not f.closed
+
+
+@pytest.mark.parametrize('fmt, data', [
+    ('jsonl', b'{"summary": "a", "owner": null, "done": true}\n{"summary"'),
+    ('jsonl', b'{"summary": 3, "owner": null, "done": true}\n'),
+    ('jsonl', b'{"summary": "a", "done": true}\n'),
+    ('csv', b'id,summary,owner,done\r\n1,a,,yes\r\n'),
+    ('csv', b'id,summary,owner,done\r\n1,a\r\n'),
+    ('csv', b'summary,owner,done\r\na,,True\r\n'),
+    ('bin', b'TASKBIN1\x01\x00'),
+    ('bin', b'TASKBIN1\x01\x00\x00\x00\x00\x00\x00\x00\x01'
+            b'\x08\x00\x00\x00\xff\xff\xff\xffshort'),
+    ('bin', b'not tasks')])
+def test_unreadable(fmt, data):
+    with pytest.raises(ValueError):
+        decoded(data, fmt)
+
+
+def test_bad_format():
+    with pytest.raises(ValueError):
+        transfer.encoder('xml')
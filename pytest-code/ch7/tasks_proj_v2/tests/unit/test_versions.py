@@ -0,0 +1,127 @@
+"""Test tasks.versions.TaskVersions."""
+
+import json
+from collections import OrderedDict
+
+from tasks.tasksdb_tinydb import TasksDB_TinyDB
+from tasks.versions import TaskVersions
+
+
+def test_each_write_is_a_version():
+    versions = TaskVersions()
+    assert versions.changed([1, 2]) == 1
+    assert versions.changed([1]) == 2
+    assert versions.deleted([2]) == 3
+    assert versions.version == 3
+
+
+def test_since():
+    """Only what changed after the version, oldest change first."""
+    versions = TaskVersions()
+    versions.changed([1, 2, 3])
+    versions.changed([1])
+    versions.deleted([3])
+    assert versions.since(0) == ([2, 1], [3], 3)
+    assert versions.since(1) == ([1], [3], 3)
+    assert versions.since(3) == ([], [], 3)
+
+
+class CountedReads(OrderedDict):
+    reads = 0
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return super(CountedReads, self).__getitem__(key)
+
+
+def test_since_reads_only_the_changes():
+    """since() stops at the first entry that's old enough."""
+    versions = TaskVersions()
+    versions.changed(range(1, 1001))
+    versions.changed([5])
+    versions._entries = CountedReads(versions._entries)
+    assert versions.since(1) == ([5], [], 2)
+    assert versions._entries.reads == 2
+
+
+def test_added_again_drops_tombstone():
+    versions = TaskVersions()
+    versions.changed([1])
+    versions.deleted([1])
+    versions.changed([1])
+    assert versions.since(0) == ([1], [], 3)
+
+
+def test_state_round_trip():
+    """state() goes through JSON and back to the same versions."""
+    versions = TaskVersions()
+    versions.changed([1, 2])
+    versions.deleted([1])
+    versions.changed([2, 3])
+    copy = TaskVersions(**json.loads(json.dumps(versions.state())))
+    assert copy.since(0) == versions.since(0)
+    assert copy.since(2) == versions.since(2)
+    assert copy.changed([4]) == 4
+
+
+def test_tombstones_pruned(monkeypatch):
+    """Past max_tombstones the oldest go, and since() before them
+    returns every task with deleted as None."""
+    monkeypatch.setattr(TaskVersions, 'max_tombstones', 4)
+    versions = TaskVersions()
+    versions.changed(range(1, 7))
+    for task_id in range(1, 6):
+        versions.deleted([task_id])
+    assert versions.pruned == 4
+    assert list(versions.tombstones()) == [4, 5]
+    assert versions.since(3) == ([6], None, 6)
+    assert versions.since(4) == ([], [4, 5], 6)
+    assert versions.since(0) == ([6], [4, 5], 6)
+    copy = TaskVersions(**json.loads(json.dumps(versions.state())))
+    assert copy.since(3) == versions.since(3)
+
+
+def test_of_old_db():
+    """Tasks from before versions were kept are all at version 1."""
+    versions = TaskVersions.of([3, 1])
+    assert versions.since(0) == ([3, 1], [], 1)
+    assert versions.since(1) == ([], [], 1)
+    assert TaskVersions.of([]).version == 0
+
+
+def test_tinydb_versions_in_meta(tmpdir):
+    """The TinyDB wrapper keeps ids and versions apart in its meta table."""
+    task = {'summary': 'a', 'owner': None, 'done': False, 'id': None}
+    db = TasksDB_TinyDB(str(tmpdir))
+    db.add_many([task, task])
+    db.delete(1)
+    db.stop_tasks_db()
+    with open(str(tmpdir.join('tasks_db.json'))) as f:
+        meta = json.load(f)['meta']
+    assert sorted(meta) == ['1', '2']
+    # only the tombstones, the tasks keep their own versions
+    assert meta['2'] == {'version': 2, 'pruned': 0, 'tombstones': {'1': 2}}
+    db = TasksDB_TinyDB(str(tmpdir))
+    assert db.changes_since(0) == (
+        [{'id': 2, 'summary': 'a', 'owner': None, 'done': False}], [1], 2)
+    db.stop_tasks_db()
+
+
+def test_tinydb_old_db(tmpdir):
+    """A TinyDB file from before versions has its tasks at version 1."""
+    task = {'summary': 'a', 'owner': None, 'done': False, 'id': None}
+    db = TasksDB_TinyDB(str(tmpdir))
+    db.add_many([task, task])
+    db.stop_tasks_db()
+    path = str(tmpdir.join('tasks_db.json'))
+    with open(path) as f:
+        data = json.load(f)
+    del data['meta']['2']
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    db = TasksDB_TinyDB(str(tmpdir))
+    assert [t['id'] for t in db.changes_since(0)[0]] == [1, 2]
+    assert db.changes_since(1) == ([], [], 1)
+    db.update(2, {'done': True})
+    assert db.changes_since(1)[2] == 2
+    db.stop_tasks_db()
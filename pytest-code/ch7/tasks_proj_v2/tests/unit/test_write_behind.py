@@ -0,0 +1,82 @@
+"""Test write-behind caching in the TinyDB wrapper."""
+
+import json
+import time
+
+import pytest
+from tasks.tasksdb_tinydb import TasksDB_TinyDB
+
+
+def on_disk(db_dir):
+    """Return the task dicts currently written to tasks_db.json."""
+    text = db_dir.join('tasks_db.json').read()
+    return json.loads(text)['_default'] if text else {}
+
+
+def test_write_through_by_default(tmpdir, new_task):
+    """With default options, every change is on disk right away."""
+    db = TasksDB_TinyDB(str(tmpdir))
+    db.add(new_task('one'))
+    assert len(on_disk(tmpdir)) == 1
+    db.stop_tasks_db()
+
+
+def test_flush_every(tmpdir, new_task):
+    """Changes are written after every flush_every changes."""
+    db = TasksDB_TinyDB(str(tmpdir), flush_every=3)
+    db.add(new_task('one'))
+    db.add(new_task('two'))
+    assert on_disk(tmpdir) == {}
+    assert db.count() == 2
+    db.add(new_task('three'))
+    assert len(on_disk(tmpdir)) == 3
+    db.stop_tasks_db()
+
+
+def test_explicit_flush(tmpdir, new_task):
+    """flush() writes held changes."""
+    db = TasksDB_TinyDB(str(tmpdir), flush_every=100)
+    db.add(new_task('one'))
+    assert on_disk(tmpdir) == {}
+    db.flush()
+    assert len(on_disk(tmpdir)) == 1
+    db.stop_tasks_db()
+
+
+def test_stop_flushes(tmpdir, new_task):
+    """stop_tasks_db() writes held changes."""
+    db = TasksDB_TinyDB(str(tmpdir), flush_every=100)
+    db.add_many([new_task('one'), new_task('two')])
+    db.stop_tasks_db()
+    assert len(on_disk(tmpdir)) == 2
+
+
+def test_flush_ms(tmpdir, new_task):
+    """Held changes are written flush_ms after the first change."""
+    db = TasksDB_TinyDB(str(tmpdir), flush_every=100, flush_ms=20)
+    db.add(new_task('one'))
+    assert on_disk(tmpdir) == {}
+    deadline = time.time() + 2
+    while not on_disk(tmpdir) and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(on_disk(tmpdir)) == 1
+    db.stop_tasks_db()
+
+
+def test_batch_writes_once_on_exit(tmpdir, new_task):
+    """Inside batch(), nothing is written, even in write-through mode."""
+    db = TasksDB_TinyDB(str(tmpdir))
+    with db.batch():
+        for i in range(5):
+            db.add(new_task('task {}'.format(i)))
+        with db.batch():
+            db.delete(1)
+        assert on_disk(tmpdir) == {}
+    assert len(on_disk(tmpdir)) == 4
+    db.stop_tasks_db()
+
+
+def test_bad_flush_every(tmpdir):
+    """flush_every less than 1 makes no sense."""
+    with pytest.raises(ValueError):
+        TasksDB_TinyDB(str(tmpdir), flush_every=0)